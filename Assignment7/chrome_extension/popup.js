@@ -195,6 +195,9 @@ document.addEventListener('DOMContentLoaded', function() {
               } else {
                 showIndexingResult(true, data.message);
                 fetchStatus();  // Update counts
+                if (data.job_id) {
+                  watchJob(data.job_id);  // Indexing finishes in the background
+                }
               }
             })
             .catch(error => {
@@ -268,6 +271,24 @@ document.addEventListener('DOMContentLoaded', function() {
     }, 3000);
   }
   
+  function watchJob(jobId) {
+    // Poll the indexing job until it finishes, then refresh the counts
+    fetch(`${API_URL}/jobs/${jobId}`)
+      .then(response => response.json())
+      .then(job => {
+        if (job.status === 'done') {
+          fetchStatus();
+        } else if (job.status === 'failed') {
+          showIndexingResult(false, job.error);
+        } else if (!job.error) {
+          setTimeout(() => watchJob(jobId), 1000);
+        }
+      })
+      .catch(error => {
+        console.error('Job status error:', error);
+      });
+  }
+  
   function fetchStatus() {
     fetch(`${API_URL}/status`)
       .then(response => response.json())
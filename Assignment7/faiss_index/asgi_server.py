@@ -0,0 +1,168 @@
+"""ASGI server for the web indexer, an alternative to the Flask dev server.
+
+Handlers are async: searches, highlights and deletes run in the thread pool
+and share the index through its read/write lock, so one slow request does
+not hold up the others. /index only queues the page and returns a job id;
+indexing happens in background workers.
+
+    uvicorn asgi_server:app --host 127.0.0.1 --port 5000
+
+Run a single process: the index lives in memory and in one index directory.
+/metrics serves the stage and request latency histograms for Prometheus.
+"""
+import asyncio
+import time
+from typing import List
+
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field, StrictInt
+
+from html_text import extract_text
+from jobs import IndexingQueue
+from metrics import CONTENT_TYPE, REQUEST_SECONDS, indexer_gauges, render, timed
+from web_indexer import indexer, MAX_BATCH_QUERIES, MAX_SEARCH_K
+
+app = FastAPI()
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+indexing_queue = None
+
+
+class IndexRequest(BaseModel):
+    url: str
+    content: str
+    title: str = ""
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=MAX_BATCH_QUERIES)
+    k: StrictInt = Field(5, ge=1)  # Clamped to MAX_SEARCH_K
+
+
+class HighlightRequest(BaseModel):
+    url: str
+    query: str
+    content: str
+
+
+@app.on_event("startup")
+async def startup():
+    global indexing_queue
+    # Serve right away; the index is memory-mapped in the background
+    indexer.load_in_background()
+    indexing_queue = IndexingQueue(indexer)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await asyncio.to_thread(indexing_queue.close)
+    await asyncio.to_thread(indexer.close)
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    """Observe each request's latency under its route pattern"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.method,
+                                route.path if route is not None else "unmatched", str(status))
+
+
+@app.exception_handler(Exception)
+async def error_response(request: Request, exc: Exception):
+    return JSONResponse({"error": str(exc)}, status_code=500)
+
+
+@app.exception_handler(RequestValidationError)
+async def invalid_request(request: Request, exc: RequestValidationError):
+    """Malformed requests get a 400 and an error message, as from server.py, not FastAPI's 422"""
+    problems = "; ".join(f"{'.'.join(map(str, error['loc'][1:])) or 'body'}: {error['msg']}" for error in exc.errors())
+    return JSONResponse({"error": f"Invalid request: {problems}"}, status_code=400)
+
+
+@app.post("/index", status_code=202)
+async def index_page(page: IndexRequest):
+    """Queue a page from the Chrome extension for indexing"""
+    # Journaled with an fsync before it is acknowledged
+    job = await asyncio.to_thread(indexing_queue.submit, page.url, page.content, page.title)
+    return {"success": True, "message": f"Queued {page.url} for indexing", "job_id": job["id"]}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """State of an indexing job: queued, running, done or failed"""
+    job = indexing_queue.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+    return job
+
+
+@app.delete("/index")
+async def delete_page(request: Request, url: str = None):
+    """Remove a page and all of its chunks from the index"""
+    if url is None:
+        try:
+            url = (await request.json()).get("url")
+        except ValueError:
+            url = None
+    if not url:
+        return JSONResponse({"error": "Missing url"}, status_code=400)
+    deleted = await asyncio.to_thread(indexer.delete_url, url)
+    return {"success": True, "deleted_chunks": deleted}
+
+
+@app.get("/search")
+async def search(q: str = None):
+    """Search the index"""
+    if not q:
+        return JSONResponse({"error": "Missing query parameter"}, status_code=400)
+    results = await asyncio.to_thread(indexer.search, q, 5)
+    with timed("serialize"):
+        return JSONResponse({"results": results})
+
+
+@app.post("/search/batch")
+async def search_batch(batch: BatchSearchRequest):
+    """Search the index for many queries in one request: one result list per query"""
+    results = await asyncio.to_thread(indexer.search_many, batch.queries, min(batch.k, MAX_SEARCH_K))
+    with timed("serialize"):
+        return JSONResponse({"results": results})
+
+
+@app.post("/highlight")
+async def highlight(page: HighlightRequest):
+    """Get text highlights for a specific URL based on query"""
+    text_content = await asyncio.to_thread(extract_text, page.content)
+    highlights = await asyncio.to_thread(indexer.get_highlights, page.query, text_content, url=page.url)
+    with timed("serialize"):
+        return JSONResponse({"highlights": highlights})
+
+
+@app.get("/status")
+async def status():
+    """Get indexer status, including live versus tombstoned vector counts"""
+    stats = await asyncio.to_thread(indexer.stats)
+    stats["queued_jobs"] = indexing_queue.pending()
+    return stats
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage and request latency histograms and index gauges, in the Prometheus text format"""
+    queue = indexing_queue
+    gauges = await asyncio.to_thread(indexer_gauges, indexer, queue.pending if queue is not None else None)
+    return Response(render(gauges), media_type=CONTENT_TYPE)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=5000)
@@ -0,0 +1,154 @@
+"""Benchmark recall@k, latency and memory of the ANN and quantized index modes
+against the flat baseline.
+
+Recall is measured for held-out queries, vectors drawn like the corpus but
+not in it, as real queries are. By default the corpus is synthetic: Gaussian
+clusters, each spread over a low-dimensional subspace of the embedding space
+with a little noise in every direction, which is roughly how text embeddings
+are distributed (a handful of topics, each varying along a few directions).
+--source index takes the vectors of the last snapshot of faiss_index instead
+(the index-N.bin named in checkpoint.json, or the shipped index.bin), holding
+out --queries of them; chunks still in the append log are not included, and
+modes that need more training vectors than the index has are skipped.
+
+Each mode is trained on min_training_vectors() of the corpus, as the server
+trains it once it has that many chunks, and the rest is then added. Training
+PQ takes about two minutes per mode on one core; --modes picks fewer modes.
+The target column is the recall@k each mode should reach at its default
+knobs on this corpus (RECALL_TARGETS); rows at default knobs below it are
+marked. B/vec is the size of each vector's code in the index and "smaller"
+the whole serialized index relative to flat.
+
+    python bench_ann.py --vectors 20000 --k 5
+    python bench_ann.py --source index --modes hnsw sq8
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from index_factory import (DEFAULT_INDEX_PARAMS as INDEX_PARAMS, add_with_ids, build_index, extract_vectors,
+                           min_training_vectors, set_search_params, vector_bytes)
+from index_store import snapshot_index_file
+
+INDEX_DIR = "faiss_index"
+DIMENSION = 768  # nomic-embed-text
+LATENT_DIMS = 16  # Directions each synthetic cluster varies along
+NOISE = 0.1  # Isotropic noise of synthetic vectors, relative to the spread within a cluster
+
+# recall@k at default knobs; a lower figure means a broken or mistuned mode, not a slow one
+RECALL_TARGETS = {
+    "ivf_flat": 0.95,
+    "ivf_pq": 0.45,
+    "hnsw": 0.95,
+    "fp16": 0.99,
+    "sq8": 0.85,
+    "pq": 0.45,
+}
+
+SWEEPS = {
+    "ivf_flat": ("nprobe", [1, 4, 8, 16, 32]),
+    "ivf_pq": ("nprobe", [1, 4, 8, 16, 32]),
+    "hnsw": ("ef_search", [16, 32, 64, 128]),
+    "fp16": (None, [None]),
+    "sq8": (None, [None]),
+    "pq": (None, [None]),
+}
+
+
+def clustered(count: int, dimension: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Vectors from Gaussian clusters, each spread over its own LATENT_DIMS-dimensional subspace"""
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    bases = rng.standard_normal((clusters, LATENT_DIMS, dimension)).astype(np.float32) / np.sqrt(LATENT_DIMS)
+    labels = rng.integers(0, clusters, count)
+    latent = rng.standard_normal((count, 1, LATENT_DIMS)).astype(np.float32)
+    vectors = centers[labels] + (latent @ bases[labels])[:, 0]
+    return (vectors + rng.standard_normal(vectors.shape).astype(np.float32) * NOISE).astype(np.float32)
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def time_queries(index: faiss.Index, queries: np.ndarray, k: int):
+    """Single-query latency, as the server issues them"""
+    found = np.zeros((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for i, query in enumerate(queries):
+        _, found[i] = index.search(query.reshape(1, -1), k)
+    return found, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def trained_index(mode: str, corpus: np.ndarray, params, rng: np.random.Generator) -> faiss.Index:
+    """Index of the corpus, trained on min_training_vectors() of it (all of it for smaller corpora)"""
+    order = rng.permutation(len(corpus))
+    split = max(min_training_vectors(mode, params), 1)
+    index = build_index(mode, corpus[order[:split]], params, order[:split])
+    return add_with_ids(index, corpus[order[split:]], order[split:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=("clustered", "index"), default="clustered",
+                        help="synthetic clustered vectors, or the vectors of a FAISS index")
+    parser.add_argument("--index", help=f"FAISS index to take vectors from (default: the last snapshot in {INDEX_DIR})")
+    parser.add_argument("--vectors", type=int, default=20000, help="clustered corpus size")
+    parser.add_argument("--clusters", type=int, default=200, help="clusters of the clustered corpus")
+    parser.add_argument("--queries", type=int, default=200, help="held-out queries")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", choices=tuple(SWEEPS), default=tuple(SWEEPS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.source == "index":
+        _, vectors = extract_vectors(faiss.read_index(str(args.index or snapshot_index_file(INDEX_DIR))))
+        vectors = vectors[rng.permutation(len(vectors))]
+    else:
+        vectors = clustered(args.vectors + args.queries, DIMENSION, args.clusters, rng)
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    print(f"Corpus: {len(corpus)} {args.source} vectors, {corpus.shape[1]} dims, "
+          f"{len(queries)} held-out queries, k={args.k}\n")
+
+    flat = build_index("flat", corpus, INDEX_PARAMS)
+    truth, flat_ms = time_queries(flat, queries, args.k)
+
+    print(f"{'mode':<10} {'knob':<14} {'recall@k':>9} {'target':>7} {'ms/query':>9} {'speedup':>8} "
+          f"{'build s':>8} {'MB':>8} {'B/vec':>6} {'smaller':>8}")
+    flat_mb = faiss.serialize_index(flat).nbytes / 1e6
+    print(f"{'flat':<10} {'-':<14} {1.0:>9.3f} {'-':>7} {flat_ms:>9.3f} {1.0:>8.1f} {0.0:>8.2f} "
+          f"{flat_mb:>8.1f} {vector_bytes(flat):>6} {1.0:>7.1f}x")
+
+    for mode in args.modes:
+        knob, values = SWEEPS[mode]
+        params = dict(INDEX_PARAMS)
+        # Shrink the IVF cell count so small corpora can still be trained
+        while min_training_vectors(mode, params) > len(corpus) and params["nlist"] > 1:
+            params["nlist"] //= 2
+        if min_training_vectors(mode, params) > len(corpus):
+            print(f"{mode:<10} skipped: needs {min_training_vectors(mode, params)} vectors to train")
+            continue
+
+        start = time.perf_counter()
+        index = trained_index(mode, corpus, params, rng)
+        build_s = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        default = INDEX_PARAMS[knob] if knob else None
+
+        for value in values:
+            if knob:
+                params[knob] = value
+                set_search_params(index, params)
+            found, ms = time_queries(index, queries, args.k)
+            recall = recall_at_k(truth, found)
+            target = f"{RECALL_TARGETS[mode]:.2f}" if value == default else "-"
+            missed = " below target" if value == default and recall < RECALL_TARGETS[mode] else ""
+            print(f"{mode:<10} {f'{knob}={value}' if knob else '-':<14} {recall:>9.3f} {target:>7} "
+                  f"{ms:>9.3f} {flat_ms / ms:>8.1f} {build_s:>8.2f} {size_mb:>8.1f} {vector_bytes(index):>6} "
+                  f"{flat_mb / size_mb:>7.1f}x{missed}")
+
+
+if __name__ == "__main__":
+    main()
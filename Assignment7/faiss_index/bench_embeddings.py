@@ -0,0 +1,118 @@
+"""Benchmark the embedding pipeline against a local stand-in for Ollama.
+
+Starts a small HTTP server that mimics /api/embeddings (one prompt per
+request) and /api/embed (batched input) with configurable latency, then
+reports chunks per second for the old serial loop and the batched client.
+
+    python bench_embeddings.py --chunks 200 --batch-size 32 --workers 4
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+from embedder import EmbeddingClient
+
+
+def fake_embedding(text: str, dimension: int) -> list:
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32).tolist()
+
+
+def make_handler(dimension: int, request_latency: float, item_latency: float, slots: threading.Semaphore):
+    class StandInOllama(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/api/embed":
+                texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                key = "embeddings"
+            elif self.path == "/api/embeddings":
+                texts = [body["prompt"]]
+                key = "embedding"
+            else:
+                self.send_error(404)
+                return
+
+            # The model only runs a limited number of requests at once, like Ollama's OLLAMA_NUM_PARALLEL
+            with slots:
+                time.sleep(request_latency + item_latency * len(texts))
+            vectors = [fake_embedding(text, dimension) for text in texts]
+            payload = json.dumps({key: vectors if key == "embeddings" else vectors[0]}).encode("utf-8")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return StandInOllama
+
+
+def serial_baseline(api_base: str, texts: list, sleep: float) -> float:
+    """The original loop: one blocking request per chunk plus a fixed sleep"""
+    start = time.perf_counter()
+    for i, text in enumerate(texts):
+        response = requests.post(f"{api_base}/embeddings", json={"model": "bench", "prompt": text})
+        response.raise_for_status()
+        np.array(response.json()["embedding"], dtype=np.float32)
+        if i < len(texts) - 1:
+            time.sleep(sleep)
+    return time.perf_counter() - start
+
+
+def batched(api_base: str, texts: list, batch_size: int, workers: int) -> float:
+    client = EmbeddingClient(api_base, "bench", batch_size=batch_size, max_workers=workers, max_in_flight=workers * 2)
+    start = time.perf_counter()
+    embeddings, ok = client.embed_many(texts)
+    elapsed = time.perf_counter() - start
+    client.close()
+    assert ok.all() and len(embeddings) == len(texts)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200, help="number of chunks to embed")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--request-latency-ms", type=float, default=15.0, help="fixed cost per HTTP request")
+    parser.add_argument("--item-latency-ms", type=float, default=2.0, help="model cost per embedded text")
+    parser.add_argument("--server-parallel", type=int, default=4, help="requests the stand-in serves at once")
+    parser.add_argument("--serial-sleep", type=float, default=0.1, help="sleep between chunks in the old loop")
+    args = parser.parse_args()
+
+    slots = threading.Semaphore(args.server_parallel)
+    handler = make_handler(args.dimension, args.request_latency_ms / 1000, args.item_latency_ms / 1000, slots)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{server.server_address[1]}/api"
+
+    texts = [f"chunk {i} " + "lorem ipsum dolor sit amet " * 40 for i in range(args.chunks)]
+
+    try:
+        rows = [
+            ("serial + sleep (old)", serial_baseline(api_base, texts, args.serial_sleep)),
+            ("serial, no sleep", serial_baseline(api_base, texts, 0.0)),
+            (f"batched ({args.batch_size} x {args.workers} workers)", batched(api_base, texts, args.batch_size, args.workers)),
+        ]
+    finally:
+        server.shutdown()
+
+    print(f"\n{args.chunks} chunks, {args.dimension}-dim, stand-in latency "
+          f"{args.request_latency_ms}ms/request + {args.item_latency_ms}ms/text\n")
+    baseline = rows[0][1]
+    for name, elapsed in rows:
+        print(f"{name:<32} {elapsed:8.2f}s  {args.chunks / elapsed:9.1f} chunks/s  {baseline / elapsed:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Throughput of each HTML-to-text backend in html_text.py on a corpus of
+saved HTML pages.
+
+Pages are read from --corpus (*.html, e.g. saved with the browser's "Save
+page as"). If the directory has no pages, a synthetic corpus of typical
+pages (scripts and styles in <head>, navigation, header, article, sidebar,
+footer) is generated there first, in three sizes.
+
+    python bench_html.py --corpus html_corpus --repeat 3
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+from html_text import BACKENDS, extract_text
+
+PAGE_SIZES = {"small": 20, "medium": 200, "large": 2000}  # Approximate KB per page
+PAGES_PER_SIZE = 10
+
+WORDS = ("the index search vector page query embedding chunk server latency model browser content "
+         "highlight result score recall memory thread request worker parser document text network "
+         "cache disk table list link section article history extension semantic").split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+
+def make_page(rng: random.Random, kilobytes: int) -> str:
+    head = ("<head><meta charset='utf-8'><title>Synthetic page</title>"
+            + "".join(f"<script>var config{i} = {{\"key\": \"{sentence(rng, 8)}\"}};</script>" for i in range(5))
+            + "<style>body { font-family: sans-serif } .nav a { margin: 0 4px }</style></head>")
+    nav = "<nav class='nav'>" + "".join(f"<a href='/section/{i}'>{rng.choice(WORDS)}</a>" for i in range(30)) + "</nav>"
+    header = f"<header><div class='logo'>Example</div><div role='banner'>{sentence(rng, 6)}</div></header>"
+    footer = "<footer>" + "".join(f"<p><a href='/about/{i}'>{sentence(rng, 4)}</a></p>" for i in range(10)) + "</footer>"
+    sidebar = "<aside>" + "".join(f"<div class='ad'>{sentence(rng, 10)}</div>" for i in range(8)) + "</aside>"
+
+    body = []
+    size = 0
+    while size < kilobytes * 1024:
+        kind = rng.random()
+        if kind < 0.6:
+            block = "<p>" + " ".join(
+                f"<a href='/p/{rng.randrange(1000)}'>{sentence(rng, 5)}</a>" if rng.random() < 0.2
+                else f"<em>{sentence(rng, 6)}</em>" if rng.random() < 0.1 else sentence(rng, rng.randint(8, 25))
+                for _ in range(rng.randint(2, 6))) + "</p>"
+        elif kind < 0.75:
+            block = "<ul>" + "".join(f"<li>{sentence(rng, 7)}</li>" for _ in range(rng.randint(3, 8))) + "</ul>"
+        elif kind < 0.85:
+            block = ("<table>" + "".join("<tr>" + "".join(f"<td>{rng.choice(WORDS)} {rng.randrange(100)}</td>"
+                                                          for _ in range(4)) + "</tr>" for _ in range(5))
+                     + "</table>")
+        elif kind < 0.92:
+            block = f"<h2>{sentence(rng, 4)}</h2>"
+        elif kind < 0.95:
+            # Words around a removed element, and a stray end tag, which backends must not glue or split
+            block = (f"<p>{sentence(rng, 6)}<img src='/i/{rng.randrange(100)}.png' hidden>{sentence(rng, 6)}"
+                     f"</span>{sentence(rng, 6)}</p>")
+        else:
+            block = f"<div class='widget' aria-hidden='true'><span>{sentence(rng, 5)}</span></div>"
+        body.append(block)
+        size += len(block)
+    article = "<main><article><h1>" + sentence(rng, 6) + "</h1>" + "".join(body) + "</article></main>"
+    return f"<!DOCTYPE html><html>{head}<body>{header}{nav}{article}{sidebar}{footer}</body></html>"
+
+
+def load_corpus(corpus: Path, seed: int):
+    pages = sorted(corpus.glob("*.html"))
+    if not pages:
+        print(f"No pages in {corpus}; generating a synthetic corpus there...")
+        corpus.mkdir(parents=True, exist_ok=True)
+        rng = random.Random(seed)
+        for name, kilobytes in PAGE_SIZES.items():
+            for i in range(PAGES_PER_SIZE):
+                (corpus / f"{name}-{i:02d}.html").write_text(make_page(rng, kilobytes), encoding="utf-8")
+        pages = sorted(corpus.glob("*.html"))
+    return [(path.name, path.read_text(encoding="utf-8", errors="replace")) for path in pages]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=Path("html_corpus"))
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus per backend")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.seed)
+    total_mb = sum(len(content.encode("utf-8")) for _, content in pages) / 1e6
+    print(f"{len(pages)} pages, {total_mb:.1f} MB of HTML\n")
+
+    # Word sequences from the reference parser, to check the others extract the same text
+    reference = {name: extract_text(content, "html.parser").split() for name, content in pages}
+
+    print(f"{'backend':>12} {'pages/s':>9} {'MB/s':>7} {'ms/page':>8} {'same words':>11}")
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            texts = {name: extract_text(content, backend) for name, content in pages}
+        elapsed = (time.perf_counter() - start) / args.repeat
+        same = sum(texts[name].split() == reference[name] for name in texts)
+        print(f"{backend:>12} {len(pages) / elapsed:>9.1f} {total_mb / elapsed:>7.1f} "
+              f"{elapsed / len(pages) * 1000:>8.2f} {same:>5}/{len(pages):<5}")
+
+    print("\nWith boilerplate kept (boilerplate=False):")
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        for _, content in pages:
+            extract_text(content, backend, boilerplate=False)
+        elapsed = time.perf_counter() - start
+        print(f"{backend:>12} {len(pages) / elapsed:>9.1f} {total_mb / elapsed:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
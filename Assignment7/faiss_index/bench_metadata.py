@@ -0,0 +1,96 @@
+"""Memory and snapshot cost of chunk metadata: one dict per chunk saved as
+a JSON array (metadata.json, the old layout) versus the columnar ChunkTable
+saved as chunks-N.npz.
+
+Synthetic metadata is generated for --chunks chunks of --chunks-per-page
+chunks per page, shaped like what the indexer stores (URL, title,
+position, timestamp, chunk_id, hash, text span). Memory is measured with
+tracemalloc on the structure as loaded from its snapshot.
+
+    python bench_metadata.py --chunks 300000
+"""
+import argparse
+import datetime
+import gc
+import json
+import time
+import tracemalloc
+
+from chunk_table import ChunkTable
+from chunker import fingerprint
+
+
+def make_records(chunks: int, per_page: int):
+    now = datetime.datetime.now()
+    records = []
+    offset = 0
+    for chunk_id in range(chunks):
+        page, number = divmod(chunk_id, per_page)
+        url = f"https://docs.example.com/guides/section-{page % 97}/page-{page}.html"
+        start = number * 180
+        length = 1400
+        records.append({
+            "url": url,
+            "position": {"start": start, "end": start + 239},
+            "timestamp": (now + datetime.timedelta(seconds=page, microseconds=number)).isoformat(),
+            "chunk_id": f"{url.replace('://', '_').replace('/', '_').replace('.', '_')}_{start}",
+            "hash": fingerprint(f"{url} {number}"),
+            "title": f"Guide {page}: configuring the example service, part {page % 7}",
+            "id": chunk_id,
+            "text_span": [offset, length],
+        })
+        offset += length
+    return records
+
+
+def measure(build):
+    """(result, bytes allocated by build that are still held, seconds)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, elapsed
+
+
+def timed(call, repeat: int = 3) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=300000)
+    parser.add_argument("--chunks-per-page", type=int, default=20)
+    args = parser.parse_args()
+
+    records = make_records(args.chunks, args.chunks_per_page)
+    json_bytes = json.dumps(records).encode("utf-8")
+    table_bytes = ChunkTable.from_records(records).to_bytes()
+    del records
+
+    dicts, dict_memory, _ = measure(lambda: {record["id"]: record for record in json.loads(json_bytes)})
+    json_load = timed(lambda: json.loads(json_bytes))
+    json_save = timed(lambda: json.dumps(list(dicts.values())).encode("utf-8"))
+    del dicts
+
+    table, table_memory, _ = measure(lambda: ChunkTable.from_bytes(table_bytes))
+    table_load = timed(lambda: ChunkTable.from_bytes(table_bytes))
+    table_save = timed(lambda: table.copy(len(table.flags)).to_bytes())
+
+    print(f"{args.chunks} chunks, {args.chunks // args.chunks_per_page} pages\n")
+    print(f"{'layout':>14} {'memory MB':>10} {'B/chunk':>8} {'file MB':>8} {'save s':>7} {'load s':>7}")
+    for name, memory, size, save, load in (("dicts + JSON", dict_memory, len(json_bytes), json_save, json_load),
+                                           ("ChunkTable", table_memory, len(table_bytes), table_save, table_load)):
+        print(f"{name:>14} {memory / 1e6:>10.1f} {memory / args.chunks:>8.0f} {size / 1e6:>8.1f} "
+              f"{save:>7.2f} {load:>7.2f}")
+    print(f"\nmemory {dict_memory / table_memory:.1f}x smaller, save {json_save / table_save:.1f}x "
+          f"and load {json_load / table_load:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Micro-benchmark of search result post-processing: the per-row Python loop
+(copy metadata, lowercase text, substring keyword check, URL dedup) against
+the array version in ranking.py backed by the term index.
+
+Only the stage after the FAISS call is timed, on a synthetic corpus and
+candidate lists sorted by distance, as FAISS returns them.
+
+    python bench_search.py --chunks 50000 --queries 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ranking import normalized_scores, select_results
+from text_index import TermIndex, tokenize
+
+
+def make_corpus(chunks: int, words_per_chunk: int, vocabulary: int, urls: int, rng: np.random.Generator):
+    # Zipf-distributed words, like natural text
+    words = [f"w{i}" for i in range(vocabulary)]
+    metadata = {}
+    texts = {}
+    for chunk_id in range(chunks):
+        picks = np.minimum(rng.zipf(1.3, words_per_chunk), vocabulary) - 1
+        text = " ".join(words[i] for i in picks)
+        url = f"https://example.com/page/{rng.integers(urls)}"
+        texts[chunk_id] = text
+        metadata[chunk_id] = {"text": text, "url": url, "position": {"start": 0, "end": words_per_chunk - 1},
+                              "timestamp": "2025-05-24T12:00:00", "chunk_id": f"{url}_{chunk_id}", "id": chunk_id}
+    return words, metadata, texts
+
+
+def legacy_postprocess(query: str, distances: np.ndarray, indices: np.ndarray, metadata: dict, k: int):
+    """The loop search() used before ranking.py"""
+    results = []
+    seen_urls = set()
+    max_dist = float(distances.max())
+    min_dist = float(distances.min())
+    dist_range = max(0.001, max_dist - min_dist)
+    for i, idx in enumerate(indices):
+        meta = metadata.get(int(idx))
+        if meta is None:
+            continue
+        dist = float(distances[i])
+        similarity = 1.0 - ((dist - min_dist) / dist_range)
+        if similarity < 0.6:
+            continue
+        result = meta.copy()
+        result["score"] = similarity
+        result["distance"] = dist
+        text_lower = result["text"].lower()
+        query_terms = query.lower().split()
+        if len(query_terms) >= 2 and sum(1 for term in query_terms if term in text_lower) == 0:
+            continue
+        url = result.get("url", "")
+        if url and url not in seen_urls:
+            seen_urls.add(url)
+            results.append(result)
+        if len(results) >= k:
+            break
+    return results
+
+
+def vectorized_postprocess(query: str, distances: np.ndarray, indices: np.ndarray, metadata: dict, texts: dict,
+                           chunk_urls: np.ndarray, terms: TermIndex, k: int):
+    """What search() does now"""
+    scores = normalized_scores(distances)
+    query_terms = tokenize(query)
+    urls = chunk_urls[indices]
+    matches = terms.contains_any(indices, query_terms) if len(query_terms) >= 2 else np.ones(len(indices), dtype=bool)
+    rows, fallback = select_results(scores, urls, matches, k)
+    results = []
+    for row in rows.tolist():
+        result = metadata[int(indices[row])].copy()
+        result["text"] = texts[int(indices[row])]
+        result["score"] = float(scores[row])
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=200, help="words per chunk")
+    parser.add_argument("--vocabulary", type=int, default=30000)
+    parser.add_argument("--urls", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"Building {args.chunks} chunks of {args.words} words...")
+    words, metadata, texts = make_corpus(args.chunks, args.words, args.vocabulary, args.urls, rng)
+
+    url_numbers = {}
+    chunk_urls = np.array([url_numbers.setdefault(metadata[i]["url"], len(url_numbers)) for i in range(args.chunks)],
+                          dtype=np.int32)
+    terms = TermIndex()
+    for chunk_id in range(args.chunks):
+        terms.add(chunk_id, tokenize(texts[chunk_id]))
+    # Search results no longer carry texts in metadata
+    slim = {chunk_id: {key: value for key, value in meta.items() if key != "text"} for chunk_id, meta in metadata.items()}
+
+    queries = [" ".join(words[i] for i in rng.integers(50, 5000, 3)) for _ in range(args.queries)]
+
+    print(f"\n{'k':>4} {'candidates':>10} {'loop us/q':>10} {'arrays us/q':>12} {'speedup':>8}")
+    for k in (5, 20, 100):
+        candidates = k * 5
+        batches = [(np.sort(rng.random(candidates).astype(np.float32) * 400 + 300),
+                    rng.choice(args.chunks, candidates, replace=False).astype(np.int64)) for _ in queries]
+
+        start = time.perf_counter()
+        for query, (distances, indices) in zip(queries, batches):
+            legacy_postprocess(query, distances, indices, metadata, k)
+        loop_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+        start = time.perf_counter()
+        for query, (distances, indices) in zip(queries, batches):
+            vectorized_postprocess(query, distances, indices, slim, texts, chunk_urls, terms, k)
+        arrays_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+        print(f"{k:>4} {candidates:>10} {loop_us:>10.1f} {arrays_us:>12.1f} {loop_us / arrays_us:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
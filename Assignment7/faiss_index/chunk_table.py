@@ -0,0 +1,236 @@
+import io
+import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+PRESENT = 1
+RETIRED = 2
+HASHED = 4  # Chunks from before content hashes were recorded have none
+
+EPOCH = datetime.datetime(1970, 1, 1)
+NO_TIMESTAMP = np.iinfo(np.int64).min
+HASH_BYTES = 16
+
+COLUMNS = (  # name, dtype: one entry per chunk id
+    ("flags", np.uint8),
+    ("url", np.int32),
+    ("title", np.int32),
+    ("start", np.int32),
+    ("end", np.int32),
+    ("timestamp", np.int64),  # Microseconds since EPOCH, in the local time of the ISO string
+    ("text_offset", np.int64),
+    ("text_length", np.int32),
+)
+
+
+class StringTable:
+    """Interned strings: each distinct URL or title is stored once and referred to by number"""
+
+    def __init__(self, strings: Iterable[str] = ()):
+        self.strings: List[str] = list(strings)
+        self.numbers: Dict[str, int] = {string: number for number, string in enumerate(self.strings)}
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def __getitem__(self, number: int) -> str:
+        return self.strings[number]
+
+    def intern(self, string: str) -> int:
+        number = self.numbers.get(string)
+        if number is None:
+            number = self.numbers[string] = len(self.strings)
+            self.strings.append(string)
+        return number
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """UTF-8 blob of all strings and the end offset of each"""
+        encoded = [string.encode("utf-8") for string in self.strings]
+        ends = np.cumsum([len(data) for data in encoded], dtype=np.int64)
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), ends
+
+    @classmethod
+    def from_arrays(cls, blob: np.ndarray, ends: np.ndarray) -> "StringTable":
+        data = blob.tobytes()
+        starts = [0] + ends[:-1].tolist()
+        return cls(data[start:end].decode("utf-8") for start, end in zip(starts, ends.tolist()))
+
+
+class ChunkTable:
+    """Chunk metadata in columns indexed by chunk id, instead of one dict per chunk.
+
+    URLs and titles are interned, positions, timestamps and text spans are
+    integer arrays, content hashes are 16 raw bytes and the chunk_id string is
+    derived from the URL and position when a chunk is read. The texts
+    themselves stay in the store's text file. Reads and writes go through
+    dicts of the same shape as before (table[chunk_id], table[chunk_id] = meta),
+    so the append log and search results are unchanged, and a snapshot is one
+    columnar file (to_bytes()) rather than a JSON array of dicts.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.urls = StringTable()
+        self.titles = StringTable()
+        for name, dtype in COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.hashes = np.zeros((capacity, HASH_BYTES), dtype=np.uint8)
+        self.count = 0  # Chunks present, live or retired
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return 0 <= chunk_id < len(self.flags) and bool(self.flags[chunk_id] & PRESENT)
+
+    def __getitem__(self, chunk_id: int) -> Dict[str, Any]:
+        if chunk_id not in self:
+            raise KeyError(chunk_id)
+        flags = int(self.flags[chunk_id])
+        url = self.urls[self.url[chunk_id]]
+        start = int(self.start[chunk_id])
+        meta = {
+            "url": url,
+            "position": {"start": start, "end": int(self.end[chunk_id])},
+            "chunk_id": f"{url.replace('://', '_').replace('/', '_').replace('.', '_')}_{start}",
+            "title": self.titles[self.title[chunk_id]],
+            "id": chunk_id,
+            "text_span": [int(self.text_offset[chunk_id]), int(self.text_length[chunk_id])],
+        }
+        if self.timestamp[chunk_id] != NO_TIMESTAMP:
+            meta["timestamp"] = (EPOCH + datetime.timedelta(microseconds=int(self.timestamp[chunk_id]))).isoformat()
+        if flags & HASHED:
+            meta["hash"] = self.hashes[chunk_id].tobytes().hex()
+        if flags & RETIRED:
+            meta["retired"] = True
+        return meta
+
+    def get(self, chunk_id: int, default: Any = None) -> Optional[Dict[str, Any]]:
+        return self[chunk_id] if chunk_id in self else default
+
+    def __setitem__(self, chunk_id: int, meta: Dict[str, Any]):
+        """Store a chunk's metadata dict (with "text_span"; other keys than the ones read back are dropped)"""
+        self._grow(chunk_id + 1)
+        if not self.flags[chunk_id] & PRESENT:
+            self.count += 1
+        flags = PRESENT | (RETIRED if meta.get("retired") else 0)
+        digest = bytes.fromhex(meta["hash"]) if meta.get("hash") else b""
+        if len(digest) == HASH_BYTES:
+            self.hashes[chunk_id] = np.frombuffer(digest, dtype=np.uint8)
+            flags |= HASHED
+        timestamp = meta.get("timestamp")
+        self.timestamp[chunk_id] = ((datetime.datetime.fromisoformat(timestamp).replace(tzinfo=None) - EPOCH)
+                                    // datetime.timedelta(microseconds=1) if timestamp else NO_TIMESTAMP)
+        self.url[chunk_id] = self.urls.intern(meta["url"])
+        self.title[chunk_id] = self.titles.intern(meta.get("title") or "")
+        self.start[chunk_id] = meta["position"]["start"]
+        self.end[chunk_id] = meta["position"]["end"]
+        self.text_offset[chunk_id], self.text_length[chunk_id] = meta["text_span"]
+        self.flags[chunk_id] = flags
+
+    def update(self, metas: Dict[int, Dict[str, Any]]):
+        for chunk_id, meta in metas.items():
+            self[chunk_id] = meta
+
+    def pop(self, chunk_id: int, default: Any = None) -> Optional[Dict[str, Any]]:
+        if chunk_id not in self:
+            return default
+        meta = self[chunk_id]
+        self.flags[chunk_id] = 0
+        self.count -= 1
+        return meta
+
+    def retire(self, chunk_id: int):
+        self.flags[chunk_id] |= RETIRED
+
+    def _grow(self, needed: int):
+        if needed <= len(self.flags):
+            return
+        size = len(self.flags)
+        capacity = max(needed, 2 * size)
+        for name, dtype in COLUMNS:
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[:size] = getattr(self, name)
+            setattr(self, name, grown)
+        hashes = np.zeros((capacity, HASH_BYTES), dtype=np.uint8)
+        hashes[:size] = self.hashes
+        self.hashes = hashes
+
+    # ---- vectorized access ----
+
+    def ids(self) -> np.ndarray:
+        """Ids of the chunks present, ascending"""
+        return np.flatnonzero(self.flags & PRESENT)
+
+    def live(self, ids: np.ndarray) -> np.ndarray:
+        """Mask of the given ids that are present and not retired"""
+        ids = np.asarray(ids, dtype=np.int64)
+        flags = np.zeros(len(ids), dtype=np.uint8)
+        inside = (ids >= 0) & (ids < len(self.flags))
+        flags[inside] = self.flags[ids[inside]]
+        return (flags & (PRESENT | RETIRED)) == PRESENT
+
+    def text_bytes(self) -> int:
+        """Bytes of text the chunks present refer to"""
+        return int(self.text_length[self.ids()].sum(dtype=np.int64))
+
+    def retired_ids(self) -> np.ndarray:
+        return np.flatnonzero((self.flags & (PRESENT | RETIRED)) == (PRESENT | RETIRED))
+
+    def live_by_url(self) -> Dict[str, List[int]]:
+        """url → ascending ids of its live chunks"""
+        ids = np.flatnonzero((self.flags & (PRESENT | RETIRED)) == PRESENT)
+        by_url = {}
+        for chunk_id, url in zip(ids.tolist(), self.url[ids].tolist()):
+            by_url.setdefault(url, []).append(chunk_id)
+        return {self.urls[url]: chunk_ids for url, chunk_ids in by_url.items()}
+
+    def positions(self, ids: List[int]) -> np.ndarray:
+        """(start, end) word positions of the given chunks, one row each"""
+        return np.stack([self.start[ids], self.end[ids]], axis=1)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the columns (string tables not included)"""
+        return sum(getattr(self, name).nbytes for name, _ in COLUMNS) + self.hashes.nbytes
+
+    # ---- snapshots ----
+
+    def copy(self, size: int) -> "ChunkTable":
+        """Copy of the first size ids, for serializing a snapshot without holding the indexer's lock"""
+        table = ChunkTable(0)
+        table.urls = StringTable(self.urls.strings)
+        table.titles = StringTable(self.titles.strings)
+        for name, _ in COLUMNS:
+            setattr(table, name, getattr(self, name)[:size].copy())
+        table.hashes = self.hashes[:size].copy()
+        table.count = int(np.count_nonzero(table.flags & PRESENT))
+        return table
+
+    def to_bytes(self) -> bytes:
+        url_blob, url_ends = self.urls.to_arrays()
+        title_blob, title_ends = self.titles.to_arrays()
+        buffer = io.BytesIO()
+        np.savez(buffer, url_blob=url_blob, url_ends=url_ends, title_blob=title_blob, title_ends=title_ends,
+                 hashes=self.hashes, **{name: getattr(self, name) for name, _ in COLUMNS})
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChunkTable":
+        table = cls(0)
+        with np.load(io.BytesIO(data)) as arrays:
+            table.urls = StringTable.from_arrays(arrays["url_blob"], arrays["url_ends"])
+            table.titles = StringTable.from_arrays(arrays["title_blob"], arrays["title_ends"])
+            for name, dtype in COLUMNS:
+                setattr(table, name, arrays[name].astype(dtype, copy=False))
+            table.hashes = arrays["hashes"]
+        table.count = int(np.count_nonzero(table.flags & PRESENT))
+        return table
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "ChunkTable":
+        """Table of metadata dicts that carry their "id" (as in metadata.json)"""
+        table = cls()
+        for record in records:
+            table[record["id"]] = record
+        return table
@@ -0,0 +1,163 @@
+"""Streaming, token-sized chunking of page text.
+
+iter_chunks() yields chunks one at a time, so embedding can start on the
+first chunk while the rest of a large page is still being split. Chunks
+end at sentence or line boundaries (headings and paragraphs when the text
+keeps its line breaks) and are sized by token count rather than words.
+Only a sentence longer than a whole chunk is cut between words.
+
+Which sentence a chunk ends at is decided by the sentence's own content (a
+hash of it), not by how full the chunk is, so an edit near the top of a
+page moves only the chunks around it: later chunks keep their boundaries
+and text, and with it their stored embeddings.
+
+Token counts come from the embedding model's tokenizer when the
+`tokenizers` package is installed and CHUNK_TOKENIZER names a tokenizer
+(a tokenizer.json path or a Hugging Face model name). Otherwise a WordPiece
+estimate is used: one token per punctuation mark, and one per word plus
+one per further 7 characters.
+"""
+import os
+import re
+import datetime
+import hashlib
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "")  # e.g. nomic-ai/nomic-embed-text-v1.5; empty estimates
+
+# A sentence ends at . ! ? before whitespace and a capital, digit, quote or bracket; lines always end one
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])|\s*\n\s*")
+WORD_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# Past CHUNK_MIN_SHARE of max_tokens of new text, a chunk ends after a sentence whose hash
+# selects it, on average once per CHUNK_BOUNDARY_SHARE of max_tokens; a full chunk always ends
+CHUNK_MIN_SHARE = 0.5
+CHUNK_BOUNDARY_SHARE = 0.25
+BOUNDARY_WORDS = 3  # A sentence too long for one chunk is cut after words picked by a hash of the last few
+
+_tokenizer = None
+
+
+def fingerprint(text: str) -> str:
+    """Content hash that is stable across processes (unlike the salted built-in hash)"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate WordPiece token count"""
+    return sum(1 + len(piece) // 7 for piece in WORD_PIECES.findall(text))
+
+
+def count_tokens(text: str) -> int:
+    """Token count of text, from CHUNK_TOKENIZER when available, else estimated"""
+    global _tokenizer
+    if CHUNK_TOKENIZER and Tokenizer is not None and _tokenizer is None:
+        try:
+            _tokenizer = (Tokenizer.from_file(CHUNK_TOKENIZER) if os.path.exists(CHUNK_TOKENIZER)
+                          else Tokenizer.from_pretrained(CHUNK_TOKENIZER))
+        except Exception as e:
+            print(f"Could not load tokenizer {CHUNK_TOKENIZER}, estimating token counts: {e}")
+            _tokenizer = False
+    if _tokenizer:
+        return len(_tokenizer.encode(text, add_special_tokens=False).ids)
+    return estimate_tokens(text)
+
+
+def iter_sentences(text: str) -> Iterator[str]:
+    """Sentences and lines of text, lazily"""
+    start = 0
+    for match in SENTENCE_BREAK.finditer(text):
+        yield text[start:match.start()]
+        start = match.end()
+    yield text[start:]
+
+
+def is_boundary(words: List[str], tokens: int, every: int) -> bool:
+    """Whether a chunk may end after these words (a sentence, or the last few words of one too
+    long for a chunk): true for about tokens/every of them, picked by content so the same
+    words are picked in every version of a page"""
+    digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % every < tokens
+
+
+def _units(text: str, max_tokens: int, every: int,
+           count: Callable[[str], int]) -> Iterator[Tuple[List[str], int, int]]:
+    """(words, token count, index of the first word in the page) of each sentence,
+    with sentences over max_tokens cut into pieces that fit, at content-defined words"""
+    position = 0
+    for sentence in iter_sentences(text):
+        words = sentence.split()
+        if not words:
+            continue
+        tokens = count(" ".join(words))
+        if tokens <= max_tokens:
+            yield words, tokens, position
+        else:
+            piece, piece_tokens, start = [], 0, position
+            for offset, word in enumerate(words):
+                word_tokens = count(word)
+                if piece and piece_tokens + word_tokens > max_tokens:
+                    yield piece, piece_tokens, start
+                    piece, piece_tokens, start = [], 0, position + offset
+                piece.append(word)
+                piece_tokens += word_tokens
+                if is_boundary(words[max(0, offset + 1 - BOUNDARY_WORDS):offset + 1], word_tokens, every):
+                    yield piece, piece_tokens, start
+                    piece, piece_tokens, start = [], 0, position + offset + 1
+            if piece:
+                yield piece, piece_tokens, start
+        position += len(words)
+
+
+def iter_chunks(text: str, url: str, max_tokens: int, overlap_tokens: int,
+                count: Callable[[str], int] = count_tokens) -> Iterator[Dict[str, Any]]:
+    """Chunks of whole sentences of up to max_tokens tokens, with metadata. Each chunk starts
+    with the last sentences of the previous one, up to overlap_tokens of them, and ends at a
+    content-defined boundary (see is_boundary()) once it holds CHUNK_MIN_SHARE of max_tokens
+    of new text, or when the next sentence would not fit.
+    Positions are word indexes in text.split(), as before."""
+    timestamp = datetime.datetime.now().isoformat()
+    prefix = url.replace('://', '_').replace('/', '_').replace('.', '_')
+    min_tokens = int(max_tokens * CHUNK_MIN_SHARE)
+    every = max(1, int(max_tokens * CHUNK_BOUNDARY_SHARE))
+    window = deque()  # Units of the chunk being built
+    size = 0
+    fresh = 0  # Tokens of the units no chunk has yielded yet (the overlap excluded)
+    boundary = False  # The last unit ends the chunk
+
+    for unit in _units(text, max_tokens, every, count):
+        if fresh and (boundary or size + unit[1] > max_tokens):
+            yield _chunk(window, url, prefix, timestamp)
+            # Carry the tail over as overlap, as far as it fits next to the new unit
+            kept, kept_tokens = deque(), 0
+            while window and kept_tokens + window[-1][1] <= min(overlap_tokens, max_tokens - unit[1]):
+                kept_tokens += window[-1][1]
+                kept.appendleft(window.pop())
+            window, size, fresh = kept, kept_tokens, 0
+        window.append(unit)
+        size += unit[1]
+        fresh += unit[1]
+        boundary = fresh >= min_tokens and is_boundary(unit[0], unit[1], every)
+
+    if fresh:
+        yield _chunk(window, url, prefix, timestamp)
+
+
+def _chunk(units, url: str, prefix: str, timestamp: str) -> Dict[str, Any]:
+    words = [word for unit in units for word in unit[0]]
+    start = units[0][2]
+    text = " ".join(words)
+    return {
+        "text": text,
+        "url": url,
+        "position": {"start": start, "end": start + len(words) - 1},
+        "timestamp": timestamp,
+        "chunk_id": f"{prefix}_{start}",
+        "hash": fingerprint(text),
+    }
@@ -0,0 +1,196 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from embedding_cache import EmbeddingCache
+from metrics import timed
+
+
+class EmbeddingClient:
+    """Batched client for Ollama's embedding API.
+
+    Texts are sent in batches over one pooled HTTP session. A bounded worker
+    pool keeps a limited number of batches in flight, so a slow or overloaded
+    server pushes back on the producer instead of queueing unbounded work.
+    With a cache, texts embedded before (queries, unchanged chunks) are
+    answered from it and only the misses are sent to the server.
+    """
+
+    def __init__(
+        self,
+        api_base: str,
+        model: str,
+        batch_size: int = 32,
+        max_workers: int = 4,
+        max_in_flight: int = 8,
+        max_retries: int = 3,
+        retry_delay: float = 2.0,
+        timeout: float = 60.0,
+        cache: Optional[EmbeddingCache] = None,
+    ):
+        self.api_base = api_base.rstrip("/")
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_in_flight = max(self.max_workers, max_in_flight)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Older Ollama builds only expose the single-prompt /api/embeddings route
+        self._legacy_api = False
+        # Shared cool-down set when the server signals overload (429/503)
+        self._backoff_until = 0.0
+        self._backoff_lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text"""
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed one batch of texts, returning a (n, dim) array"""
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        vectors = self.cache.get_many(self.model, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Repeated texts within the batch are only sent once
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            embedded = self._embed_uncached(unique)
+            self.cache.put_many(self.model, unique, embedded)
+            by_text = dict(zip(unique, embedded))
+            for i in missing:
+                vectors[i] = by_text[texts[i]]
+        return np.stack(vectors)
+
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        """Embed texts with retries"""
+        with timed("embed"):
+            for attempt in range(self.max_retries):
+                self._wait_for_backoff()
+                try:
+                    if self._legacy_api:
+                        return np.stack([self._post_legacy(text) for text in texts])
+                    return self._post_batch(texts)
+                except Exception as e:
+                    print(f"Embedding error (attempt {attempt+1}/{self.max_retries}, batch of {len(texts)}): {e}")
+                    if attempt < self.max_retries - 1:
+                        time.sleep(self.retry_delay * (attempt + 1))  # Exponential backoff
+                    else:
+                        raise
+
+    def embed_many(self, texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Embed an iterable of texts concurrently.
+
+        Returns the embeddings and a boolean mask of rows that succeeded.
+        Rows of batches that failed after all retries are left as zeros.
+        The iterable is consumed lazily, one batch at a time.
+        """
+        results = {}
+        in_flight = {}
+        total = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for start, batch in self._batches(texts):
+                total = start + len(batch)
+                # Backpressure: block until a slot frees up before submitting more
+                while len(in_flight) >= self.max_in_flight:
+                    self._collect(wait(in_flight, return_when=FIRST_COMPLETED).done, in_flight, results)
+                in_flight[pool.submit(self.embed_batch, batch)] = (start, len(batch))
+
+            while in_flight:
+                self._collect(wait(in_flight, return_when=FIRST_COMPLETED).done, in_flight, results)
+
+        if not results:
+            return np.zeros((total, 0), dtype=np.float32), np.zeros(total, dtype=bool)
+
+        dimension = next(iter(results.values())).shape[1]
+        embeddings = np.zeros((total, dimension), dtype=np.float32)
+        ok = np.zeros(total, dtype=bool)
+        for start, vectors in results.items():
+            embeddings[start:start + len(vectors)] = vectors
+            ok[start:start + len(vectors)] = True
+        return embeddings, ok
+
+    def close(self):
+        self.session.close()
+
+    def _batches(self, texts: Iterable[str]):
+        batch = []
+        start = 0
+        for text in texts:
+            batch.append(text)
+            if len(batch) == self.batch_size:
+                yield start, batch
+                start += len(batch)
+                batch = []
+        if batch:
+            yield start, batch
+
+    def _collect(self, done, in_flight, results):
+        for future in done:
+            start, size = in_flight.pop(future)
+            try:
+                results[start] = future.result()
+            except Exception as e:
+                print(f"Dropping batch at chunk {start} ({size} chunks): {e}")
+
+    def _post_batch(self, texts: List[str]) -> np.ndarray:
+        response = self.session.post(
+            f"{self.api_base}/embed",
+            json={"model": self.model, "input": texts},
+            timeout=self.timeout,
+        )
+        if response.status_code == 404:
+            print("Ollama /api/embed not available, falling back to /api/embeddings")
+            self._legacy_api = True
+            return np.stack([self._post_legacy(text) for text in texts])
+        self._check_overload(response)
+        response.raise_for_status()
+
+        embeddings = response.json().get("embeddings")
+        if not embeddings or len(embeddings) != len(texts):
+            raise ValueError("No embeddings returned from Ollama API")
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def _post_legacy(self, text: str) -> np.ndarray:
+        response = self.session.post(
+            f"{self.api_base}/embeddings",
+            json={"model": self.model, "prompt": text},
+            timeout=self.timeout,
+        )
+        self._check_overload(response)
+        response.raise_for_status()
+
+        embedding = response.json().get("embedding")
+        if not embedding:
+            raise ValueError("No embedding returned from Ollama API")
+        return np.asarray(embedding, dtype=np.float32)
+
+    def _check_overload(self, response: requests.Response):
+        """Make every worker pause when the server says it is overloaded"""
+        if response.status_code not in (429, 503):
+            return
+        try:
+            delay = float(response.headers.get("Retry-After", self.retry_delay))
+        except ValueError:
+            delay = self.retry_delay
+        with self._backoff_lock:
+            self._backoff_until = max(self._backoff_until, time.monotonic() + delay)
+
+    def _wait_for_backoff(self):
+        delay = self._backoff_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,137 @@
+import io
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from index_store import atomic_write
+
+
+def normalize(text: str) -> str:
+    """Collapse whitespace so the same text re-extracted from a page hits the cache"""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """Bounded in-memory embedding cache with LRU and TTL eviction.
+
+    Entries are keyed by a digest of (model, normalized text), so long chunk
+    texts cost a fixed 16 bytes per key. The least recently used entry is
+    evicted once max_entries is reached, and entries older than ttl seconds
+    are treated as misses. With a path the cache can be saved to and loaded
+    from disk, keeping each entry's original expiry.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400.0, path: Optional[Path] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.path = Path(path) if path is not None else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key → (expires_at, vector)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        return hashlib.blake2b(f"{model}\0{normalize(text)}".encode("utf-8"), digest_size=16).digest()
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        return self.get_many(model, [text])[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for the texts, None where there is no live entry"""
+        keys = [self.key(model, text) for text in texts]
+        now = time.time()
+        found = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] < now:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    found.append(entry[1])
+        return found
+
+    def put(self, model: str, text: str, vector: np.ndarray):
+        self.put_many(model, [text], [vector])
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[np.ndarray]):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(model, text)
+                self._entries[key] = (expires_at, np.asarray(vector, dtype=np.float32))
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    # ---- persistence ----
+
+    def load(self) -> int:
+        """Load unexpired entries saved by save(), returning how many were loaded"""
+        if self.path is None or not self.path.exists():
+            return 0
+        try:
+            with np.load(self.path) as data:
+                keys, expires, offsets, flat = data["keys"], data["expires"], data["offsets"], data["vectors"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable embedding cache {self.path}: {e}")
+            return 0
+
+        now = time.time()
+        with self._lock:
+            # Saved oldest first, so the LRU order survives the round trip
+            for i, key in enumerate(keys):
+                if expires[i] >= now:
+                    self._entries[key.tobytes()] = (float(expires[i]), flat[offsets[i]:offsets[i + 1]].copy())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return len(self._entries)
+
+    def save(self):
+        """Write the live entries to the cache file"""
+        if self.path is None:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [(key, expires_at, vector) for key, (expires_at, vector) in self._entries.items() if expires_at >= now]
+
+        # Models differ in dimension, so vectors are stored flat with offsets
+        offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+        np.cumsum([len(vector) for _, _, vector in entries], out=offsets[1:])
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            keys=np.frombuffer(b"".join(key for key, _, _ in entries), dtype=np.uint8).reshape(-1, 16),
+            expires=np.array([expires_at for _, expires_at, _ in entries], dtype=np.float64),
+            offsets=offsets,
+            vectors=np.concatenate([vector for _, _, vector in entries]) if entries else np.zeros(0, dtype=np.float32),
+        )
+        atomic_write(self.path, buffer.getvalue())
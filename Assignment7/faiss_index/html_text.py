@@ -0,0 +1,235 @@
+"""HTML-to-text extraction for indexing and highlighting.
+
+The parser is pluggable (HTML_BACKEND): selectolax and lxml parse in C and
+are used when installed, BeautifulSoup's pure-Python html.parser is the
+fallback, and "stream" feeds the page through a streaming parser that
+never builds a tree, which bounds memory on very large pages. In auto mode
+pages over STREAM_THRESHOLD characters are streamed.
+
+All backends produce the same words: the stripped text nodes joined by
+spaces, with boilerplate left out (scripts and styles, <head>,
+navigation, asides, and page headers and footers outside the main content).
+Text nodes are those of the document tree, so text on either side of a
+removed element stays apart, while a stray end tag (closing no open
+element) is ignored, as browsers do.
+"""
+import os
+from html.parser import HTMLParser
+from typing import Callable, Dict, List
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+    from lxml import etree
+    UTF8_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+except ImportError:
+    lxml = None
+
+from bs4 import BeautifulSoup
+
+from metrics import timed
+
+HTML_BACKEND = os.getenv("HTML_BACKEND", "auto")  # auto, selectolax, lxml, html.parser or stream
+STREAM_THRESHOLD = 8 * 1024 * 1024  # Pages larger than this (characters) are streamed in auto mode
+STREAM_CHUNK = 64 * 1024  # Characters fed to the streaming parser at a time
+
+NON_TEXT_TAGS = ("script", "style", "template")  # Never text, even without boilerplate removal
+BOILERPLATE_TAGS = NON_TEXT_TAGS + ("noscript", "svg", "iframe", "head", "nav", "aside")
+PAGE_CHROME_TAGS = ("header", "footer")  # Boilerplate unless inside the main content
+CONTENT_TAGS = ("article", "main")
+BOILERPLATE_ROLES = ("navigation", "banner", "contentinfo")
+VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source",
+                       "track", "wbr"))
+
+BOILERPLATE_SELECTOR = ", ".join(
+    BOILERPLATE_TAGS + tuple(f'[role="{role}"]' for role in BOILERPLATE_ROLES) + ('[aria-hidden="true"]', "[hidden]"))
+BOILERPLATE_XPATH = " | ".join(
+    [f"//{tag}" for tag in BOILERPLATE_TAGS]
+    + [f"//{tag}[not({' or '.join(f'ancestor::{parent}' for parent in CONTENT_TAGS)})]" for tag in PAGE_CHROME_TAGS]
+    + [f"//*[@role='{role}']" for role in BOILERPLATE_ROLES]
+    + ["//*[@aria-hidden='true']", "//*[@hidden]"])
+
+
+def _join(strings) -> str:
+    return " ".join(s for s in (s.strip() for s in strings) if s)
+
+
+def _is_boilerplate(tag: str, attrs: Dict[str, str], in_content: bool) -> bool:
+    return (tag in BOILERPLATE_TAGS
+            or (tag in PAGE_CHROME_TAGS and not in_content)
+            or attrs.get("role") in BOILERPLATE_ROLES
+            or attrs.get("aria-hidden") == "true"
+            or "hidden" in attrs)
+
+
+def _extract_selectolax(content: str, boilerplate: bool) -> str:
+    tree = LexborHTMLParser(content)
+    if boilerplate:
+        nodes = tree.css(BOILERPLATE_SELECTOR)
+        for node in tree.css(", ".join(PAGE_CHROME_TAGS)):
+            parent = node.parent
+            while parent is not None and parent.tag not in CONTENT_TAGS:
+                parent = parent.parent
+            if parent is None:
+                nodes.append(node)
+        # Nodes inside another removed node go with it
+        removed = {node.mem_id for node in nodes}
+        for node in nodes:
+            parent = node.parent
+            while parent is not None and parent.mem_id not in removed:
+                parent = parent.parent
+            if parent is None:
+                node.decompose()
+    else:
+        tree.strip_tags(list(NON_TEXT_TAGS))
+    return tree.root.text(separator=" ", strip=True) if tree.root is not None else ""
+
+
+def _extract_lxml(content: str, boilerplate: bool) -> str:
+    try:
+        try:
+            root = lxml.html.document_fromstring(content)
+        except ValueError:
+            # lxml refuses str input that carries an XML encoding declaration
+            root = lxml.html.document_fromstring(content.encode("utf-8"), parser=UTF8_PARSER)
+    except etree.ParserError:
+        return ""  # Nothing to parse
+    xpath = BOILERPLATE_XPATH if boilerplate else " | ".join(f"//{tag}" for tag in NON_TEXT_TAGS)
+    # Document order reversed: descendants go before their ancestors
+    for element in reversed(root.xpath(xpath)):
+        if element.tail:
+            # drop_tree() keeps the tail but merges it into the text before the element
+            element.tail = " " + element.tail
+        element.drop_tree()
+    return _join(root.itertext())
+
+
+def _extract_bs4(content: str, boilerplate: bool) -> str:
+    soup = BeautifulSoup(content, "html.parser")
+    soup.smooth()  # One string for the text around a stray end tag, as tree builders make it
+    if boilerplate:
+        for element in soup.select(BOILERPLATE_SELECTOR):
+            element.decompose()
+        for element in soup.find_all(PAGE_CHROME_TAGS):
+            if not element.find_parent(CONTENT_TAGS):
+                element.decompose()
+    return soup.get_text(separator=" ", strip=True)
+
+
+class TextStream(HTMLParser):
+    """Streaming HTML-to-text: feed the page in pieces, then read text().
+
+    Only the text and a little tag state are kept, never a document tree.
+    With a limit, parsing stops once that many characters of text have been
+    collected (see done), so callers can stop reading the page early.
+    """
+
+    def __init__(self, boilerplate: bool = True, limit: int = None):
+        super().__init__(convert_charrefs=True)
+        self.boilerplate = boilerplate
+        self.limit = limit
+        self.done = False
+        self._parts: List[str] = []
+        self._pending: List[str] = []  # Pieces of the current text node, split across feeds
+        self._length = 0
+        self._content_depth = 0  # Open <article>/<main> elements
+        self._open: Dict[str, int] = {}  # Open elements by tag, to ignore end tags that close none
+        self._skip_tag = None  # Tag of the boilerplate element being skipped...
+        self._skip_depth = 0  # ...and how many of them are open
+
+    def feed(self, data: str):
+        if not self.done:
+            super().feed(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def text(self) -> str:
+        return " ".join(self._parts)
+
+    def _flush(self):
+        """Complete the text node collected since the last tag"""
+        data = "".join(self._pending).strip()
+        self._pending.clear()
+        if data and not self.done:
+            self._parts.append(data)
+            self._length += len(data) + 1
+            if self.limit is not None and self._length >= self.limit:
+                self.done = True
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in VOID_TAGS:
+            return
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag in CONTENT_TAGS:
+            self._content_depth += 1
+        if self.boilerplate:
+            skip = _is_boilerplate(tag, {name: value or "" for name, value in attrs}, self._content_depth > 0)
+        else:
+            skip = tag in NON_TEXT_TAGS
+        if skip:
+            self._skip_tag = tag
+            self._skip_depth = 1
+        else:
+            self._open[tag] = self._open.get(tag, 0) + 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()  # Self-closing tags hold no text
+
+    def handle_endtag(self, tag):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+            return
+        if not self._open.get(tag):
+            return  # Closes no open element: the text around it is one node
+        self._open[tag] -= 1
+        self._flush()
+        if tag in CONTENT_TAGS and self._content_depth:
+            self._content_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_tag is None and not self.done:
+            self._pending.append(data)
+
+
+def _extract_stream(content: str, boilerplate: bool) -> str:
+    stream = TextStream(boilerplate)
+    for start in range(0, len(content), STREAM_CHUNK):
+        stream.feed(content[start:start + STREAM_CHUNK])
+    stream.close()
+    return stream.text()
+
+
+BACKENDS: Dict[str, Callable[[str, bool], str]] = {"html.parser": _extract_bs4, "stream": _extract_stream}
+if lxml is not None:
+    BACKENDS["lxml"] = _extract_lxml
+if LexborHTMLParser is not None:
+    BACKENDS["selectolax"] = _extract_selectolax
+
+
+def fastest_backend() -> str:
+    """The fastest installed tree-building backend"""
+    return next(name for name in ("selectolax", "lxml", "html.parser") if name in BACKENDS)
+
+
+def extract_text(content: str, backend: str = None, boilerplate: bool = True) -> str:
+    """Visible text of an HTML page, as indexed and highlighted"""
+    backend = backend or HTML_BACKEND
+    if backend == "auto":
+        backend = "stream" if len(content) > STREAM_THRESHOLD else fastest_backend()
+    elif backend not in BACKENDS:
+        raise ValueError(f"Unknown or uninstalled HTML backend {backend!r}; available: {', '.join(BACKENDS)}")
+    with timed("parse"):
+        return BACKENDS[backend](content, boilerplate)
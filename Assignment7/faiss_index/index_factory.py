@@ -0,0 +1,272 @@
+import faiss
+import numpy as np
+from typing import Dict, Any, List, Tuple
+
+INDEX_MODES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "fp16", "sq8", "pq")
+LOSSY_MODES = ("ivf_pq", "sq8", "pq")  # Vectors read back are approximations of the ones added
+INDEX_METRICS = ("cosine", "l2")  # cosine: inner product over L2-normalized vectors
+
+DEFAULT_INDEX_PARAMS = {
+    "nlist": 64,  # IVF cells
+    "nprobe": 8,  # IVF cells scanned per query (recall vs latency)
+    "hnsw_m": 32,  # HNSW graph degree
+    "ef_construction": 40,
+    "ef_search": 64,  # HNSW candidate list size per query (recall vs latency)
+    "pq_m": 48,  # PQ sub-quantizers, must divide the dimension
+    "pq_nbits": 8,
+    "metric": "cosine",
+}
+
+# k-means in FAISS wants at least this many training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+# SQ8 learns each dimension's value range from its training vectors; later vectors outside it are clipped
+MIN_SQ8_TRAINING = 1000
+
+
+def factory_string(mode: str, params: Dict[str, Any]) -> str:
+    """FAISS index_factory description for an index mode"""
+    if mode == "flat":
+        return "Flat"
+    if mode == "ivf_flat":
+        return f"IVF{params['nlist']},Flat"
+    if mode == "hnsw":
+        return f"HNSW{params['hnsw_m']}"
+    if mode == "ivf_pq":
+        return f"IVF{params['nlist']},PQ{params['pq_m']}x{params['pq_nbits']}"
+    if mode == "fp16":
+        return "SQfp16"
+    if mode == "sq8":
+        return "SQ8"
+    if mode == "pq":
+        return f"PQ{params['pq_m']}x{params['pq_nbits']}"
+    raise ValueError(f"Unknown index mode '{mode}', expected one of {INDEX_MODES}")
+
+
+def min_training_vectors(mode: str, params: Dict[str, Any]) -> int:
+    """Number of vectors needed before an index of this mode can be trained"""
+    if mode == "ivf_flat":
+        return params["nlist"] * MIN_POINTS_PER_CENTROID
+    if mode == "ivf_pq":
+        return max(params["nlist"], 2 ** params["pq_nbits"]) * MIN_POINTS_PER_CENTROID
+    if mode == "sq8":
+        return MIN_SQ8_TRAINING
+    if mode == "pq":
+        return 2 ** params["pq_nbits"] * MIN_POINTS_PER_CENTROID
+    return 0
+
+
+def can_train(mode: str, count: int, params: Dict[str, Any]) -> bool:
+    """Whether count vectors can train an index of this mode at all, if not as well as
+    min_training_vectors() of them: k-means needs a point per centroid, SQ8 a value range"""
+    needed = {"ivf_flat": params["nlist"], "ivf_pq": max(params["nlist"], 2 ** params["pq_nbits"]),
+              "pq": 2 ** params["pq_nbits"], "sq8": 1}
+    return count >= needed.get(mode, 0)
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """The ANN index underneath the id mapping layer"""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_mode(index: faiss.Index) -> str:
+    """Detect the mode of an index loaded from disk"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        qtype = index.sq.qtype
+        if qtype == faiss.ScalarQuantizer.QT_fp16:
+            return "fp16"
+        if qtype == faiss.ScalarQuantizer.QT_8bit:
+            return "sq8"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    return type(index).__name__
+
+
+def index_metric(index: faiss.Index) -> str:
+    """The metric of an index: "cosine" for inner product (over normalized vectors), else "l2" """
+    return "cosine" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+
+
+def faiss_metric(metric: str) -> int:
+    if metric not in INDEX_METRICS:
+        raise ValueError(f"Unknown index metric '{metric}', expected one of {INDEX_METRICS}")
+    return faiss.METRIC_INNER_PRODUCT if metric == "cosine" else faiss.METRIC_L2
+
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length copy of the rows, as stored in and queried against cosine indexes"""
+    vectors = np.array(vectors, dtype=np.float32, order="C")
+    if len(vectors):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def set_search_params(index: faiss.Index, params: Dict[str, Any]):
+    """Apply the recall/latency knobs (nprobe, efSearch) to an index"""
+    index = base_index(index)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = params["nprobe"]
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params["ef_search"]
+
+
+def search_parameters(index: faiss.Index, params: Dict[str, Any], selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Per-query parameters that restrict a search to the ids accepted by the selector.
+    Carries nprobe/efSearch along, since explicit parameters override the index's own."""
+    index = base_index(index)
+    if faiss.try_extract_index_ivf(index) is not None:
+        search_params = faiss.SearchParametersIVF()
+        search_params.nprobe = params["nprobe"]
+    elif isinstance(index, faiss.IndexHNSW):
+        search_params = faiss.SearchParametersHNSW()
+        search_params.efSearch = params["ef_search"]
+    else:
+        search_params = faiss.SearchParameters()
+    search_params.sel = selector
+    return search_params
+
+
+def selects_in_search(index: faiss.Index) -> bool:
+    """Whether index.search() honours the id selector of its search parameters. IndexPQ's
+    does not ("selector not supported"), though its range_search() does."""
+    return not isinstance(base_index(index), faiss.IndexPQ)
+
+
+def knn_search(index: faiss.Index, queries: np.ndarray, k: int, params: faiss.SearchParameters = None,
+               excluded: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """index.search() restricted to the ids the selector in params accepts. Indexes whose search()
+    cannot take a selector fetch len(excluded) more neighbours instead and drop the excluded ids,
+    padding short rows with -1 ids as FAISS does."""
+    if params is None or selects_in_search(index):
+        return index.search(queries, k=k, params=params)
+    fetch = min(k + len(excluded), max(k, index.ntotal))
+    distances, ids = index.search(queries, k=fetch)
+    dropped = np.isin(ids, excluded)
+    # Stable sort moves the dropped ids behind the kept ones, which stay nearest first
+    order = np.argsort(dropped, axis=1, kind="stable")[:, :k]
+    distances = np.take_along_axis(distances, order, axis=1)
+    ids = np.take_along_axis(ids, order, axis=1)
+    padding = np.take_along_axis(dropped, order, axis=1)
+    ids[padding] = -1
+    distances[padding] = np.inf if index_metric(index) == "l2" else -np.inf
+    return distances, ids
+
+
+def build_index(mode: str, vectors: np.ndarray, params: Dict[str, Any], ids: np.ndarray = None) -> faiss.Index:
+    """Create an id-mapped index of the given mode, train it on the vectors and add them.
+    Ids default to the vector positions."""
+    dimension = vectors.shape[1]
+    index = faiss.index_factory(dimension, factory_string(mode, params), faiss_metric(params["metric"]))
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = params["ef_construction"]
+    if not index.is_trained:
+        # Cosine indexes hold the normalized vectors (see add_with_ids()), so train on those
+        index.train(normalized(vectors) if params["metric"] == "cosine" else vectors)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Lets stored vectors be read back by id (reconstruct), e.g. for highlights
+        ivf.make_direct_map(True)
+    set_search_params(index, params)
+    return add_with_ids(faiss.IndexIDMap2(index), vectors, ids)
+
+
+def add_with_ids(index: faiss.Index, vectors: np.ndarray, ids: np.ndarray = None) -> faiss.Index:
+    """Add vectors under the given ids; cosine indexes store them normalized"""
+    if ids is None:
+        ids = np.arange(len(vectors), dtype=np.int64)
+    if index_metric(index) == "cosine":
+        vectors = normalized(vectors)
+    if len(vectors):
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    return index
+
+
+def extract_vectors(index: faiss.Index, start: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Read ids and vectors back out of an index, from insertion position start on
+    (lossy for PQ indexes). Plain indexes without an id mapping use positions as ids."""
+    base = base_index(index)
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    count = base.ntotal - start
+    if count <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, base.d), dtype=np.float32)
+    vectors = base.reconstruct_n(start, count)
+    if base is index:
+        return np.arange(start, base.ntotal, dtype=np.int64), vectors
+    return faiss.vector_to_array(index.id_map)[start:].astype(np.int64), vectors
+
+
+def vector_bytes(index: faiss.Index) -> int:
+    """Bytes each stored vector takes in the index's codes (graph links and id maps not included)"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    return index.sa_code_size()
+
+
+def owned_copy(index: faiss.Index) -> faiss.Index:
+    """In-memory copy of an index, e.g. of one read memory-mapped, which cannot be modified in place"""
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def refill_index(base: faiss.Index, ids: np.ndarray, vectors: np.ndarray) -> faiss.Index:
+    """Empty a (cloned) base index, keeping its training, and refill it with the given vectors"""
+    base.reset()
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        ivf.make_direct_map(True)
+    return add_with_ids(faiss.IndexIDMap2(base), vectors, ids)
+
+
+def can_migrate(index: faiss.Index, mode: str, params: Dict[str, Any]) -> bool:
+    """Whether the index should be rebuilt in the configured mode or metric now"""
+    return ((index_mode(index) != mode and index.ntotal >= min_training_vectors(mode, params))
+            or index_metric(index) != params["metric"])
+
+
+def threshold_search(index: faiss.Index, queries: np.ndarray, min_similarity: float, limit: int,
+                     fallback: int, params: faiss.SearchParameters = None,
+                     excluded: np.ndarray = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Range search of a cosine index: per query, the cosine distances (1 - similarity) and ids
+    of at most limit vectors with similarity above min_similarity, nearest first. Queries
+    with no such vector get their fallback nearest ones instead, so callers can still
+    offer the closest matches. excluded are the ids params rejects (see knn_search())."""
+    queries = normalized(queries)
+    limits, similarities, ids = index.range_search(queries, min_similarity, params=params)
+    rows = []
+    for start, end in zip(limits[:-1].tolist(), limits[1:].tolist()):
+        order = np.argsort(-similarities[start:end], kind="stable")[:limit] + start
+        rows.append((1.0 - similarities[order], ids[order]))
+    empty = [row for row, (_, row_ids) in enumerate(rows) if not len(row_ids)]
+    if empty and fallback:
+        nearest, nearest_ids = knn_search(index, queries[empty], fallback, params, excluded)
+        for row, row_similarities, row_ids in zip(empty, nearest, nearest_ids):
+            rows[row] = (1.0 - row_similarities, row_ids)
+    return rows
+
+
+def migration_mode(index: faiss.Index, mode: str, params: Dict[str, Any]) -> str:
+    """Mode to rebuild an index in: the configured one once there is enough data to train it,
+    otherwise (for a change of metric only) the index's current mode"""
+    if index.ntotal >= min_training_vectors(mode, params):
+        return mode
+    current = index_mode(index)
+    return current if current in INDEX_MODES else "flat"
+
+
+def migrate_index(index: faiss.Index, mode: str, params: Dict[str, Any]) -> faiss.Index:
+    """Rebuild an index in another mode or metric, keeping the vector ids"""
+    ids, vectors = extract_vectors(index)
+    return build_index(migration_mode(index, mode, params), vectors, params, ids)
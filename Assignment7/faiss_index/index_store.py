@@ -0,0 +1,460 @@
+import os
+import json
+import mmap
+import struct
+import faiss
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+from chunk_table import ChunkTable
+from index_factory import add_with_ids, extract_vectors, owned_copy, refill_index
+
+WAL_MAGIC = b"WIVS"
+WAL_HEADER = struct.Struct("<4sI")  # magic, dimension
+
+
+def snapshot_index_file(index_dir: Path, legacy_file: Optional[Path] = None) -> Path:
+    """The index file of the last checkpoint in index_dir (named in checkpoint.json),
+    or the index.bin of a snapshot from before checkpoints"""
+    index_dir = Path(index_dir)
+    manifest_file = index_dir / "checkpoint.json"
+    if manifest_file.exists():
+        manifest = json.loads(manifest_file.read_text())
+        if "index_file" in manifest:
+            return index_dir / manifest["index_file"]
+    return Path(legacy_file) if legacy_file is not None else index_dir / "index.bin"
+
+
+def atomic_write(path: Path, data: bytes):
+    """Write a file so readers see either the old or the new contents"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class IndexStore:
+    """Append-only persistence for the web index.
+
+    Indexing a page appends its vectors to a segment file (wal-N.vec) and its
+    metadata to an append log (wal-N.jsonl), so the cost is proportional to the
+    page rather than the corpus. A checkpoint periodically folds the logs into
+    the snapshot files and deletes the log generations it covered. On startup
+    the snapshot is loaded and any logs written after it are replayed.
+
+    Chunk texts live in an append-only file (texts.bin) and metadata only
+    records their byte span, so they are read on demand rather than held in
+    RAM. Texts of deleted chunks stay in it until compact_texts() copies the
+    ones still referenced to a new file (texts-N.bin, named in checkpoint.json)
+    at a checkpoint. Metadata is held in a columnar ChunkTable and snapshotted as one
+    columnar file (chunks-N.npz); a metadata.json from older snapshots is
+    read once and replaced at the next checkpoint. Snapshot indexes are written under a new name per checkpoint
+    (index-N.bin, named in checkpoint.json) and memory-mapped on load, which
+    keeps startup cheap and lets the OS page vectors in as queries touch them.
+    The indexer's term index is saved alongside (terms-N.npz).
+
+    Every chunk has a stable integer id that is never reused. Log records
+    refer to chunks by id, which makes replay idempotent: chunks already in
+    the snapshot, or deleted and compacted away before it, are skipped.
+    """
+
+    def __init__(self, index_dir: Path, index_file: Path, metadata_file: Path, cache_file: Path, texts_file: Path,
+                 fsync: bool = True):
+        self.index_dir = Path(index_dir)
+        self.index_file = Path(index_file)  # Snapshot name from before checkpoint.json named one
+        self.metadata_file = Path(metadata_file)
+        self.cache_file = Path(cache_file)
+        self.texts_file = Path(texts_file)  # The current one: texts.bin until compact_texts() replaces it
+        self.legacy_texts_file = Path(texts_file)
+        self.manifest_file = self.index_dir / "checkpoint.json"
+        self.fsync = fsync
+        self.generation = 0
+        self.pending = 0  # log records appended since the last checkpoint
+        self.mapped = False  # The loaded index is a read-only view of the snapshot file
+        self._log = None
+        self._vec = None
+        self._texts = None
+        self._text_map = None
+        self._dimension = None
+
+    # ---- loading and recovery ----
+
+    def load(self, dimension: int) -> Tuple[Optional[faiss.Index], ChunkTable, Dict[str, Any], int]:
+        """Load the last snapshot and replay the append logs written after it.
+        Returns the id-mapped index, the chunk metadata table, the URL cache and the next free id."""
+        index = None
+        metadata = ChunkTable()
+        moved = 0  # Chunk texts moved out of the metadata into the text file
+        url_cache = {}
+        next_id = 0
+        manifest = {}
+        self.terms_file = None
+
+        if self.cache_file.exists():
+            with open(self.cache_file, 'r') as f:
+                url_cache = json.load(f)
+        if self.manifest_file.exists():
+            with open(self.manifest_file, 'r') as f:
+                manifest = json.load(f)
+            next_id = manifest["next_id"]
+            # Keeps snapshot index names increasing across restarts
+            self.generation = manifest.get("generation", 0)
+            if "terms_file" in manifest:
+                self.terms_file = self.index_dir / manifest["terms_file"]
+            if "texts_file" in manifest:
+                self.texts_file = self.index_dir / manifest["texts_file"]
+        index_file = snapshot_index_file(self.index_dir, self.index_file)
+        chunks_file = self.index_dir / manifest["chunks_file"] if "chunks_file" in manifest else None
+
+        if (chunks_file or self.metadata_file).exists() and index_file.exists():
+            if chunks_file:
+                metadata = ChunkTable.from_bytes(chunks_file.read_bytes())
+            else:
+                with open(self.metadata_file, 'r') as f:
+                    records = json.load(f)
+                # Snapshots from before chunk ids existed use positions as ids
+                for position, record in enumerate(records):
+                    record.setdefault("id", position)
+                moved += self._move_inline_texts(records)
+                metadata = ChunkTable.from_records(records)
+                del records
+            index = self._read_index(index_file)
+            if not isinstance(index, faiss.IndexIDMap2):
+                index = self._owned(index)
+                ids, vectors = extract_vectors(index)
+                index = refill_index(index, ids, vectors)
+
+            # A crash between the snapshot renames can leave index and metadata out of step
+            index_ids = faiss.vector_to_array(index.id_map)
+            lost = np.setdiff1d(metadata.ids(), index_ids).tolist()
+            if lost:
+                print(f"⚠️ {len(lost)} chunks have no vector in the snapshot, dropping them")
+                for chunk_id in lost:
+                    # Forget the page hash so the page gets indexed again
+                    url_cache.pop(metadata.pop(chunk_id)["url"], None)
+            # Vectors without metadata are never returned and go away at the next compaction
+            next_id = max([next_id, int(metadata.ids().max(initial=-1)) + 1, int(index_ids.max(initial=-1)) + 1])
+
+        snapshot_next_id = next_id
+        replay_ids = []
+        replay_vectors = []
+        for generation in self._generations():
+            self.generation = generation
+            vectors, records = self._read_generation(generation)
+            row = 0
+            for record in records:
+                op = record["op"]
+                if op == "url":
+                    url_cache[record["url"]] = record["hash"]
+                    continue
+                if op == "forget":
+                    url_cache.pop(record["url"], None)
+                    continue
+
+                chunk_id = record.get("id", record.get("seq"))
+                if op in ("update", "retire"):
+                    # Always refers to an earlier add, so it is idempotent to re-apply
+                    if chunk_id in metadata:
+                        if op == "update":
+                            moved += self._move_inline_texts([record["meta"]])
+                            metadata[chunk_id] = record["meta"]
+                        else:
+                            metadata.retire(chunk_id)
+                    continue
+
+                vector = vectors[row]
+                row += 1
+                # Already in the snapshot, or deleted and compacted away before it was taken
+                if chunk_id in metadata or chunk_id < snapshot_next_id:
+                    continue
+                record["meta"].setdefault("id", chunk_id)
+                moved += self._move_inline_texts([record["meta"]])
+                metadata[chunk_id] = record["meta"]
+                replay_ids.append(chunk_id)
+                replay_vectors.append(vector)
+                next_id = max(next_id, chunk_id + 1)
+
+            self.pending += len(records)
+
+        if replay_ids:
+            if index is None:
+                index = faiss.IndexIDMap2(faiss.IndexFlatL2(len(replay_vectors[0])))
+            index = self._owned(index)
+            add_with_ids(index, np.stack(replay_vectors), np.array(replay_ids, dtype=np.int64))
+            print(f"Replayed {len(replay_ids)} chunks from append log")
+
+        if moved:
+            self._sync(self._texts)
+            self.pending += moved
+            print(f"Moved {moved} chunk texts to {self.texts_file.name}")
+
+        self._dimension = index.d if index is not None else dimension
+        self.generation += 1
+        return index, metadata, url_cache, next_id
+
+    def _move_inline_texts(self, records: List[Dict[str, Any]]) -> int:
+        """Snapshots and logs from before the text file kept chunk texts inline"""
+        inline = [record for record in records if "text" in record]
+        if inline:
+            self._append_texts(inline)
+        return len(inline)
+
+    def _read_index(self, path: Path) -> faiss.Index:
+        if path == self.index_file:
+            return faiss.read_index(str(path))
+        try:
+            index = faiss.read_index(str(path), faiss.IO_FLAG_MMAP_IFC)
+        except RuntimeError:
+            # FAISS builds without mmap support read the file into memory
+            return faiss.read_index(str(path))
+        self.mapped = True
+        return index
+
+    def _owned(self, index: faiss.Index) -> faiss.Index:
+        """An index that can be modified: adding to a memory-mapped one aborts the process"""
+        if not self.mapped:
+            return index
+        self.mapped = False
+        return owned_copy(index)
+
+    def _generations(self) -> List[int]:
+        generations = []
+        for path in self.index_dir.glob("wal-*.jsonl"):
+            try:
+                generations.append(int(path.stem.split("-", 1)[1]))
+            except ValueError:
+                continue
+        return sorted(generations)
+
+    def _paths(self, generation: int) -> Tuple[Path, Path]:
+        return (self.index_dir / f"wal-{generation:06d}.jsonl",
+                self.index_dir / f"wal-{generation:06d}.vec")
+
+    def _read_generation(self, generation: int) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Read one log generation, truncating any torn tail left by a crash"""
+        log_path, vec_path = self._paths(generation)
+
+        vectors = np.zeros((0, 0), dtype=np.float32)
+        row_bytes = 0
+        if vec_path.exists() and vec_path.stat().st_size >= WAL_HEADER.size:
+            with open(vec_path, 'rb') as f:
+                magic, dimension = WAL_HEADER.unpack(f.read(WAL_HEADER.size))
+                if magic == WAL_MAGIC:
+                    row_bytes = dimension * 4
+                    data = f.read()
+                    rows = len(data) // row_bytes
+                    vectors = np.frombuffer(data[:rows * row_bytes], dtype=np.float32).reshape(rows, dimension)
+
+        records = []
+        good_bytes = 0
+        adds = 0
+        with open(log_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                if record["op"] == "add":
+                    if adds >= len(vectors):
+                        break  # Metadata written but its vector never made it to disk
+                    adds += 1
+                records.append(record)
+                good_bytes += len(line)
+
+        # Drop the torn tail so new appends start from a consistent point
+        if log_path.stat().st_size != good_bytes:
+            with open(log_path, 'r+b') as f:
+                f.truncate(good_bytes)
+        if row_bytes and vec_path.stat().st_size != WAL_HEADER.size + adds * row_bytes:
+            with open(vec_path, 'r+b') as f:
+                f.truncate(WAL_HEADER.size + adds * row_bytes)
+
+        return vectors[:adds], records
+
+    # ---- chunk texts ----
+
+    def text(self, record: Dict[str, Any]) -> str:
+        """The text of a chunk, read from the text file by its span"""
+        if "text" in record:
+            return record["text"]
+        offset, length = record["text_span"]
+        text_map = self._text_map
+        if text_map is None or offset + length > len(text_map):
+            text_map = self._map_texts()
+        return text_map[offset:offset + length].decode("utf-8")
+
+    def _map_texts(self) -> mmap.mmap:
+        # Remapped as the file grows; readers still holding an older map keep a valid view
+        with open(self.texts_file, 'rb') as f:
+            self._text_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._text_map
+
+    def _append_texts(self, records: List[Dict[str, Any]]):
+        """Move each record's text to the end of the text file, leaving its span behind"""
+        if self._texts is None:
+            self._texts = open(self.texts_file, 'ab')
+        offset = self._texts.seek(0, os.SEEK_END)
+        for record in records:
+            data = record.pop("text").encode("utf-8")
+            self._texts.write(data)
+            record["text_span"] = [offset, len(data)]
+            offset += len(data)
+
+    def texts_size(self) -> int:
+        """Bytes in the text file, the texts of deleted chunks included"""
+        try:
+            return self.texts_file.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def compact_texts(self, metadata: ChunkTable, generation: int) -> int:
+        """Copy the texts the table refers to into a new text file (texts-N.bin) and point the
+        table's spans at it; later appends and reads use the new file. Returns the bytes dropped.
+
+        Log records written from now on refer to the new file, so call with the indexer's lock
+        held until the checkpoint of this generation has named it; the old file is deleted then."""
+        ids = metadata.ids()
+        offsets = metadata.text_offset[ids]
+        lengths = metadata.text_length[ids].astype(np.int64)
+        before = self.texts_size()
+        source = self._map_texts() if before else None
+        path = self.index_dir / f"texts-{generation:06d}.bin"
+        temporary = path.with_name(path.name + ".tmp")
+        with open(temporary, 'wb') as f:
+            for offset, length in zip(offsets.tolist(), lengths.tolist()):
+                f.write(source[offset:offset + length])
+            self._sync(f)
+        os.replace(temporary, path)
+
+        if self._texts is not None:
+            self._texts.close()
+            self._texts = None
+        self._text_map = None
+        self.texts_file = path
+        metadata.text_offset[ids] = np.cumsum(lengths) - lengths
+        return before - int(lengths.sum())
+
+    # ---- appending ----
+
+    def append(self, vectors: np.ndarray, records: List[Dict[str, Any]],
+               updates: Optional[Dict[int, Dict[str, Any]]] = None, retired: List[int] = (),
+               url: Optional[str] = None, content_hash: Any = None, forget: bool = False):
+        """Append one page worth of changes to the log: new chunks (with their
+        "id" and "text" set), metadata updates for unchanged chunks, retired chunk
+        ids and the page's cache entry (or, with forget, its removal).
+        New chunk texts are moved to the text file and replaced by their spans."""
+        self._open()
+        if records and vectors.shape[1] != self._dimension:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self._dimension}")
+
+        # Texts and vectors first: a log record only counts once they are on disk
+        if records:
+            self._append_texts(records)
+            self._vec.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            self._sync(self._texts)
+            self._sync(self._vec)
+
+        lines = [json.dumps({"op": "add", "id": record["id"], "meta": record}) for record in records]
+        lines += [json.dumps({"op": "update", "id": chunk_id, "meta": meta}) for chunk_id, meta in (updates or {}).items()]
+        lines += [json.dumps({"op": "retire", "id": chunk_id}) for chunk_id in retired]
+        if url is not None:
+            if forget:
+                lines.append(json.dumps({"op": "forget", "url": url}))
+            else:
+                lines.append(json.dumps({"op": "url", "url": url, "hash": content_hash}))
+        if not lines:
+            return
+        self._log.write(("\n".join(lines) + "\n").encode("utf-8"))
+        self._sync(self._log)
+        self.pending += len(lines)
+
+    def _open(self):
+        if self._log is not None:
+            return
+        log_path, vec_path = self._paths(self.generation)
+        new_segment = not vec_path.exists()
+        self._vec = open(vec_path, 'ab')
+        if new_segment:
+            self._vec.write(WAL_HEADER.pack(WAL_MAGIC, self._dimension))
+        self._log = open(log_path, 'ab')
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def set_dimension(self, dimension: int):
+        """Reset the segment dimension for an index that is still empty"""
+        self._dimension = dimension
+
+    # ---- checkpointing ----
+
+    def rotate(self) -> int:
+        """Close the active log generation and start a new one.
+        Returns the first generation not covered by a checkpoint taken now."""
+        self._close_files()
+        self.generation += 1
+        self.pending = 0
+        return self.generation
+
+    def read_terms(self) -> Optional[bytes]:
+        """The serialized term index of the loaded snapshot, if it has one"""
+        if self.terms_file is None or not self.terms_file.exists():
+            return None
+        return self.terms_file.read_bytes()
+
+    def checkpoint(self, index_bytes: bytes, chunks_bytes: bytes, url_cache: Dict[str, Any],
+                   next_id: int, keep_from: int, terms_bytes: Optional[bytes] = None):
+        """Write a snapshot (chunks_bytes from ChunkTable.to_bytes()) and delete the log
+        generations it covers. Safe to call without holding the indexer's lock."""
+        # A fresh name each time: the previous snapshot index may still be mapped by a reader
+        index_file = self.index_dir / f"index-{keep_from:06d}.bin"
+        manifest = {"next_id": next_id, "index_file": index_file.name, "generation": keep_from,
+                    "chunks_file": f"chunks-{keep_from:06d}.npz", "texts_file": self.texts_file.name}
+        atomic_write(self.index_dir / manifest["chunks_file"], chunks_bytes)
+        atomic_write(index_file, index_bytes)
+        if terms_bytes is not None:
+            manifest["terms_file"] = f"terms-{keep_from:06d}.npz"
+            atomic_write(self.index_dir / manifest["terms_file"], terms_bytes)
+        atomic_write(self.cache_file, json.dumps(url_cache).encode("utf-8"))
+        atomic_write(self.manifest_file, json.dumps(manifest).encode("utf-8"))
+
+        for generation in self._generations():
+            if generation < keep_from:
+                for path in self._paths(generation):
+                    path.unlink(missing_ok=True)
+        for path in [self.index_file, *self.index_dir.glob("index-*.bin")]:
+            if path != index_file:
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError:
+                    pass  # Still mapped (Windows); retried at the next checkpoint
+        for path in self.index_dir.glob("terms-*.npz"):
+            if path.name != manifest.get("terms_file"):
+                path.unlink(missing_ok=True)
+        for path in [self.metadata_file, *self.index_dir.glob("chunks-*.npz")]:
+            if path.name != manifest["chunks_file"]:
+                path.unlink(missing_ok=True)
+        for path in [self.legacy_texts_file, *self.index_dir.glob("texts-*.bin")]:
+            if path != self.texts_file:
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError:
+                    pass  # Still mapped (Windows); retried at the next checkpoint
+
+    def close(self):
+        self._close_files()
+        if self._texts is not None:
+            self._texts.close()
+            self._texts = None
+
+    def _close_files(self):
+        for f in (self._log, self._vec):
+            if f is not None:
+                f.close()
+        self._log = None
+        self._vec = None
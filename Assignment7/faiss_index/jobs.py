@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from html_text import extract_text
+from index_store import atomic_write
+
+JOBS_FILE = Path("faiss_index") / "jobs.jsonl"  # Job journal, next to the index
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "2"))  # Pages indexed at once
+KEEP_FINISHED_JOBS = 1000  # Finished jobs remembered for status lookups
+
+
+class IndexingQueue:
+    """Durable background indexing for the /index endpoint.
+
+    Submitting a page only journals the job and returns its id; a pool of
+    worker threads cleans the HTML and indexes pages afterwards, so the
+    request returns in constant time however large the page is.
+
+    Jobs are appended to a journal (jobs.jsonl) before they are acknowledged,
+    and every state change is journaled after it. On startup the journal is
+    replayed and jobs that never finished are queued again, so a crash or
+    restart loses no submitted page. The journal is rewritten, keeping only
+    unfinished jobs and the most recent finished ones, once it has grown past
+    a few times that size.
+
+    Submitting a URL that already has a queued job updates that job with the
+    newer content instead of adding another, and two jobs for the same URL
+    never run at once: a job whose URL is being indexed waits until that
+    finishes.
+    """
+
+    def __init__(self, indexer, path: Path = JOBS_FILE, workers: int = INDEX_WORKERS, fsync: bool = True):
+        self.indexer = indexer
+        self.path = Path(path)
+        self.fsync = fsync
+        self.jobs = OrderedDict()  # job id → job state, oldest first
+        self._contents = {}  # job id → (content, title) of unfinished jobs
+        self._queued = {}  # url → id of its job that has not started yet
+        self._running = set()  # urls being indexed
+        self._deferred = {}  # url → ids of jobs waiting for the running job of that url
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closing = False
+        self._journal_records = 0
+
+        self._replay()
+        self._journal = open(self.path, "ab")
+        self._workers = [threading.Thread(target=self._work, name=f"indexing-worker-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close)
+
+    def submit(self, url: str, content: str, title: str = "") -> Dict[str, Any]:
+        """Queue a page, or refresh the queued job for the same URL; returns the job"""
+        with self._lock:
+            job_id = self._queued.get(url)
+            if job_id is not None:
+                self._contents[job_id] = (content, title)
+                self.jobs[job_id]["coalesced"] += 1
+                self._write({"op": "update", "id": job_id, "content": content, "title": title})
+                return dict(self.jobs[job_id])
+
+            job = {"id": uuid.uuid4().hex, "url": url, "status": "queued", "error": None, "coalesced": 0,
+                   "submitted_at": time.time(), "finished_at": None}
+            self._write({"op": "submit", "id": job["id"], "url": url, "content": content, "title": title,
+                         "submitted_at": job["submitted_at"]})
+            self.jobs[job["id"]] = job
+            self._contents[job["id"]] = (content, title)
+            self._queued[url] = job["id"]
+        self._queue.put(job["id"])
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def pending(self) -> int:
+        """Jobs queued or running"""
+        with self._lock:
+            return len(self._contents)
+
+    def close(self):
+        """Stop the workers after their current job; queued jobs resume on the next start"""
+        if self._closing:
+            return
+        self._closing = True
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        with self._lock:
+            self._journal.close()
+
+    # ---- workers ----
+
+    def _work(self):
+        while not self._closing:
+            job_id = self._queue.get()
+            if job_id is None or self._closing:
+                break
+            with self._lock:
+                job = self.jobs[job_id]
+                url = job["url"]
+                if url in self._running:
+                    # Picked up again by whichever worker finishes this url
+                    self._deferred.setdefault(url, []).append(job_id)
+                    continue
+                self._running.add(url)
+                if self._queued.get(url) == job_id:
+                    del self._queued[url]
+                content, title = self._contents[job_id]
+                job["status"] = "running"
+            try:
+                self.indexer.index_webpage(url, extract_text(content), title)
+                self._finish(job_id, "done")
+            except Exception as e:
+                print(f"Indexing job {job_id} for {url} failed: {e}")
+                self._finish(job_id, "failed", str(e))
+
+    def _finish(self, job_id: str, status: str, error: str = None):
+        with self._lock:
+            job = self.jobs[job_id]
+            job.update(status=status, error=error, finished_at=time.time())
+            self._contents.pop(job_id, None)
+            self._running.discard(job["url"])
+            waiting = self._deferred.pop(job["url"], [])
+            self._write({"op": "finish", "id": job_id, "status": status, "error": error,
+                         "finished_at": job["finished_at"]})
+            self._forget_finished()
+            if self._journal_records > 2 * KEEP_FINISHED_JOBS + len(self._contents):
+                self._rewrite()
+        for waiting_id in waiting:
+            self._queue.put(waiting_id)
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["finished_at"]]
+        for job_id in finished[:max(0, len(finished) - KEEP_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    # ---- journal ----
+
+    def _write(self, record: Dict[str, Any]):
+        self._journal.write((json.dumps(record) + "\n").encode("utf-8"))
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._journal_records += 1
+
+    def _records(self):
+        """Journal records that recreate the current jobs"""
+        for job_id, job in self.jobs.items():
+            if job_id in self._contents:
+                content, title = self._contents[job_id]
+                yield {"op": "submit", "id": job_id, "url": job["url"], "content": content, "title": title,
+                       "submitted_at": job["submitted_at"]}
+            else:
+                yield {"op": "finish", "id": job_id, "url": job["url"], "status": job["status"],
+                       "error": job["error"], "submitted_at": job["submitted_at"],
+                       "finished_at": job["finished_at"]}
+
+    def _rewrite(self):
+        """Replace the journal with one record per remembered job"""
+        lines = [json.dumps(record) for record in self._records()]
+        self._journal.close()
+        atomic_write(self.path, "".join(line + "\n" for line in lines).encode("utf-8"))
+        self._journal = open(self.path, "ab")
+        self._journal_records = len(lines)
+
+    def _replay(self):
+        """Rebuild the jobs from the journal and queue the unfinished ones again"""
+        if not self.path.exists():
+            return
+        good_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                good_bytes += len(line)
+                self._journal_records += 1
+                job_id = record["id"]
+                if record["op"] == "submit":
+                    self.jobs[job_id] = {"id": job_id, "url": record["url"], "status": "queued", "error": None,
+                                         "coalesced": 0, "submitted_at": record["submitted_at"], "finished_at": None}
+                    self._contents[job_id] = (record["content"], record["title"])
+                elif job_id not in self.jobs and record["op"] == "finish" and "url" in record:
+                    # A finished job carried over by a rewrite
+                    self.jobs[job_id] = {"id": job_id, "url": record["url"], "status": record["status"],
+                                         "error": record["error"], "coalesced": 0,
+                                         "submitted_at": record["submitted_at"], "finished_at": record["finished_at"]}
+                elif job_id not in self.jobs:
+                    continue
+                elif record["op"] == "update":
+                    self._contents[job_id] = (record["content"], record["title"])
+                    self.jobs[job_id]["coalesced"] += 1
+                elif record["op"] == "finish":
+                    self.jobs[job_id].update(status=record["status"], error=record["error"],
+                                             finished_at=record["finished_at"])
+                    self._contents.pop(job_id, None)
+
+        # Drop a torn tail so new records start on a line of their own
+        if self.path.stat().st_size != good_bytes:
+            with open(self.path, "r+b") as f:
+                f.truncate(good_bytes)
+        self._forget_finished()
+
+        for job_id in self._contents:
+            self._queued[self.jobs[job_id]["url"]] = job_id
+            self._queue.put(job_id)
+        if self._contents:
+            print(f"Resuming {len(self._contents)} unfinished indexing jobs")
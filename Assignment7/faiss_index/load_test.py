@@ -0,0 +1,81 @@
+"""Load test for a running indexer server: concurrent clients send a mix of
+/search and /index requests, and latency percentiles and throughput are
+reported per endpoint.
+
+Run it against the Flask server and the ASGI server in turn to compare them:
+
+    python server.py                  # or: python asgi_server.py
+    python load_test.py --clients 16 --requests 400 --index-ratio 0.1
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+QUERIES = [
+    "vector similarity search", "how to train a neural network", "python asyncio tutorial",
+    "faiss index types", "chrome extension content scripts", "embedding models comparison",
+    "web page indexing", "approximate nearest neighbour recall", "flask rest api", "text chunking",
+]
+
+WORDS = ("index search vector page query embedding chunk server latency model browser "
+         "content highlight result score recall memory thread request worker").split()
+
+
+def make_page(i: int, rng: random.Random) -> dict:
+    paragraphs = "".join(f"<p>{' '.join(rng.choices(WORDS, k=60))}</p>" for _ in range(8))
+    return {"url": f"https://loadtest.example.com/page/{i}", "title": f"Load test page {i}",
+            "content": f"<html><body><h1>Page {i}</h1>{paragraphs}</body></html>"}
+
+
+def run_request(session: requests.Session, base_url: str, kind: str, payload):
+    start = time.perf_counter()
+    if kind == "search":
+        response = session.get(f"{base_url}/search", params={"q": payload}, timeout=120)
+    else:
+        response = session.post(f"{base_url}/index", json=payload, timeout=120)
+    return kind, time.perf_counter() - start, response.ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=400, help="total requests")
+    parser.add_argument("--index-ratio", type=float, default=0.1, help="share of requests that index a page")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    work = [("index", make_page(i, rng)) if rng.random() < args.index_ratio else ("search", rng.choice(QUERIES))
+            for i in range(args.requests)]
+    sessions = [requests.Session() for _ in range(args.clients)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        futures = [pool.submit(run_request, sessions[i % args.clients], args.url, kind, payload)
+                   for i, (kind, payload) in enumerate(work)]
+        outcomes = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for kind, latency, ok in outcomes:
+        latencies[kind].append(latency * 1000)
+        errors[kind] += not ok
+
+    print(f"{len(outcomes)} requests from {args.clients} clients in {elapsed:.1f}s "
+          f"({len(outcomes) / elapsed:.1f} req/s)\n")
+    print(f"{'endpoint':>8} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>7}")
+    for kind in sorted(latencies):
+        p50, p95, p99 = np.percentile(latencies[kind], [50, 95, 99])
+        print(f"{kind:>8} {len(latencies[kind]):>6} {errors[kind]:>6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} "
+              f"{len(latencies[kind]) / elapsed:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
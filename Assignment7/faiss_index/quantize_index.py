@@ -0,0 +1,96 @@
+"""Re-encode the saved web index in another index mode, offline (stop the server first).
+
+The quantized modes keep each vector in fewer bytes than the 4 per dimension of
+a flat index: fp16 in 2, sq8 (8-bit scalar quantization) in 1, and pq (product
+quantization) in INDEX_PQ_M bytes per vector in all. The chunks' vectors are
+read back and the index is retrained and rebuilt in the new mode, then a
+recall report compares it with exact search over the same vectors.
+
+    python quantize_index.py sq8
+    python quantize_index.py flat --reembed    # back to full precision from sq8/pq
+
+Vectors read back from a lossy index (ivf_pq, sq8, pq) are approximations;
+--reembed embeds the chunk texts again instead (Ollama must be running).
+Start the server with INDEX_MODE set to the new mode afterwards, or it
+migrates the index back to its configured mode on load.
+"""
+import argparse
+import os
+import sys
+
+import faiss
+import numpy as np
+
+from index_factory import (INDEX_MODES, LOSSY_MODES, can_train, extract_vectors, index_metric, index_mode,
+                           min_training_vectors, normalized, vector_bytes)
+
+
+def snapshot(shard):
+    """Live ids and vectors of a loaded shard"""
+    with shard.lock, shard.index_lock.write():
+        ids, vectors = extract_vectors(shard.index)
+        live = shard.metadata.live(ids)
+    return ids[live], vectors[live]
+
+
+def recall(shard, ids: np.ndarray, vectors: np.ndarray, k: int, queries: int, seed: int) -> float:
+    """recall@k of the shard's index against exact search over the given vectors, queried with a sample of them"""
+    metric = index_metric(shard.index)
+    exact = faiss.IndexIDMap2(faiss.IndexFlat(vectors.shape[1], shard.index.metric_type))
+    exact.add_with_ids(normalized(vectors) if metric == "cosine" else vectors, ids)
+    sample = vectors[np.random.default_rng(seed).permutation(len(vectors))[:queries]]
+    if metric == "cosine":
+        sample = normalized(sample)
+    k = min(k, len(ids))
+    _, truth = exact.search(sample, k)
+    _, found = shard.index.search(sample, k)
+    return sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist())) / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=INDEX_MODES)
+    parser.add_argument("--reembed", action="store_true", help="embed the chunk texts again instead of "
+                                                               "reading the vectors back from the index")
+    parser.add_argument("--k", type=int, default=10, help="k of the recall report")
+    parser.add_argument("--queries", type=int, default=500, help="chunk vectors used as report queries")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ["INDEX_MODE"] = args.mode  # Before web_indexer reads its configuration
+    import web_indexer
+
+    indexer = web_indexer.indexer
+    indexer.ensure_loaded()
+    shards = getattr(indexer, "shards", [indexer])
+    print(f"{'shard':<28} {'vectors':>8} {'from':>8} {'to':>8} {'B/vec':>12} {'MB':>14} {f'recall@{args.k}':>9}")
+    for shard in shards:
+        source = index_mode(shard.index)
+        if source in LOSSY_MODES and not args.reembed:
+            print(f"⚠️ {shard.index_dir} is {source}: re-encoding its approximate vectors "
+                  f"(--reembed embeds the texts again)", file=sys.stderr)
+        before_bytes = vector_bytes(shard.index)
+        before_mb = faiss.serialize_index(shard.index).nbytes / 1e6
+        ids, vectors = snapshot(shard)  # What exact search is measured on, as stored before
+        needed = min_training_vectors(args.mode, web_indexer.INDEX_PARAMS)
+        if not can_train(args.mode, len(ids), web_indexer.INDEX_PARAMS):
+            print(f"⚠️ {shard.index_dir}: {len(ids)} vectors are too few to train {args.mode}, left as {source}",
+                  file=sys.stderr)
+            continue
+        if len(ids) < needed:
+            print(f"⚠️ {shard.index_dir}: training {args.mode} on {len(ids)} vectors, {needed} are recommended",
+                  file=sys.stderr)
+        shard.rebuild(args.mode, args.reembed)
+        if args.reembed:  # From the embedding cache the rebuild filled
+            vectors, _ = shard.get_embeddings(shard.store.text(shard.metadata[chunk_id]) for chunk_id in ids.tolist())
+        after_mb = faiss.serialize_index(shard.index).nbytes / 1e6
+        score = recall(shard, ids, vectors, args.k, args.queries, args.seed) if len(ids) else float("nan")
+        print(f"{str(shard.index_dir):<28} {len(ids):>8} {source:>8} {index_mode(shard.index):>8} "
+              f"{f'{before_bytes} -> {vector_bytes(shard.index)}':>12} {f'{before_mb:.2f} -> {after_mb:.2f}':>14} "
+              f"{score:>9.3f}")
+    indexer.close()
+    print(f"\nStart the server with INDEX_MODE={args.mode} to keep this mode.")
+
+
+if __name__ == "__main__":
+    main()
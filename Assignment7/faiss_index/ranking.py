@@ -0,0 +1,132 @@
+import numpy as np
+
+RELEVANCE_THRESHOLD = 0.6  # Minimum min-max normalized similarity for a search result (L2 indexes)
+MIN_SIMILARITY = 0.5  # Minimum cosine similarity for a search result (cosine indexes)
+FALLBACK_CANDIDATES = 5  # When nothing passes the filters, the closest few are considered...
+FALLBACK_RESULTS = 2  # ...and this many returned
+
+
+def normalized_scores(distances: np.ndarray) -> np.ndarray:
+    """Min-max scale one query's L2 distances to similarities, 1.0 for the closest"""
+    if distances.size == 0:
+        return distances.astype(np.float32)
+    min_dist = distances.min()
+    dist_range = max(0.001, float(distances.max() - min_dist))  # Avoid division by zero
+    return 1.0 - (distances - min_dist) / dist_range
+
+
+def similarity_scores(distances: np.ndarray, metric: str) -> np.ndarray:
+    """Similarities to rank and filter one query's candidates by. Cosine distances (1 - cosine)
+    give absolute, calibrated cosine similarities; L2 distances can only be min-max
+    normalized within the candidate set, so their scores are relative to it."""
+    if metric == "cosine":
+        return (1.0 - distances).astype(np.float32)
+    return normalized_scores(distances)
+
+
+def relevance_threshold(metric: str) -> float:
+    return MIN_SIMILARITY if metric == "cosine" else RELEVANCE_THRESHOLD
+
+
+def first_per_group(groups: np.ndarray, limit: int) -> np.ndarray:
+    """Positions of the first row of each group, in row order, at most limit of them"""
+    if groups.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    _, first = np.unique(groups, return_index=True)
+    return np.sort(first)[:limit]
+
+
+def select_results(scores: np.ndarray, urls: np.ndarray, matches: np.ndarray, k: int,
+                   threshold: float = RELEVANCE_THRESHOLD):
+    """Pick result rows from candidates sorted by distance.
+
+    scores are similarities (see similarity_scores()), urls the URL number of
+    each candidate (negative for chunks that are no longer live) and matches
+    the keyword filter. Returns the selected rows, at most one per URL, and
+    whether they come from the fallback because nothing passed the threshold
+    and filter.
+    """
+    live = urls >= 0
+    passed = np.flatnonzero(live & (scores >= threshold) & matches)
+    rows = passed[first_per_group(urls[passed], k)]
+    if rows.size or not urls.size:
+        return rows, False
+
+    # Nothing relevant enough: fall back to the closest couple of pages
+    head = np.flatnonzero(live[:FALLBACK_CANDIDATES])
+    return head[first_per_group(urls[head], FALLBACK_RESULTS)], True
+
+
+RRF_K = 60  # Reciprocal-rank fusion damping: larger values flatten the gap between ranks
+
+
+def top_n(ids: np.ndarray, scores: np.ndarray, n: int):
+    """The n highest scoring ids, best first"""
+    if len(ids) > n:
+        picked = np.argpartition(-scores, n - 1)[:n]
+        ids, scores = ids[picked], scores[picked]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+def reciprocal_rank_fusion(*rankings: np.ndarray):
+    """Fuse ranked id lists (best first): each id scores the sum of
+    1 / (RRF_K + rank) over the lists it appears in. Returns ids and fused
+    scores, best first, with scores scaled so an id ranked first everywhere gets 1.0."""
+    rankings = [np.asarray(ranking, dtype=np.int64) for ranking in rankings]
+    ids = np.concatenate(rankings)
+    if not ids.size:
+        return ids, np.zeros(0, dtype=np.float32)
+    ranks = np.concatenate([np.arange(1, len(ranking) + 1) for ranking in rankings])
+    unique, inverse = np.unique(ids, return_inverse=True)
+    fused = np.bincount(inverse, weights=1.0 / (RRF_K + ranks)) * (RRF_K + 1) / len(rankings)
+    order = np.argsort(-fused, kind="stable")
+    return unique[order], fused[order].astype(np.float32)
+
+
+# No candidates: ids, scores or distances, URL numbers and keyword matches
+EMPTY_CANDIDATES = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64),
+                    np.zeros(0, dtype=bool))
+
+
+def rank_query(lexical, vector, k: int, metric: str = "l2"):
+    """Final ranking of one query's candidates.
+
+    lexical is (ids, BM25 scores, URL numbers), best first. vector is
+    (ids, distances, URL numbers, keyword matches) sorted by distance, or
+    None when the query is answered by BM25 alone. Distances are L2, or
+    1 - cosine similarity with metric "cosine". URL numbers are negative
+    for chunks that are no longer live. With BM25 candidates, the vector
+    candidates above the relevance threshold are fused with them by
+    reciprocal rank; otherwise, or when that leaves nothing, select_results
+    applies the threshold, keyword filter and fallback.
+
+    Returns the chosen ids and their scores, plus the raw distances and BM25
+    scores by id (distances is None for the fallback).
+    """
+    lexical_ids, bm25, lexical_urls = lexical
+    bm25_by_id = dict(zip(lexical_ids.tolist(), bm25.tolist()))
+    if vector is None:
+        rows = first_per_group(lexical_urls, k)
+        if not rows.size:
+            return lexical_ids[:0], bm25[:0], None, None
+        return lexical_ids[rows], bm25[rows] / float(bm25[0]), None, bm25_by_id
+
+    ids, distances, urls, matches = vector
+    scores = similarity_scores(distances, metric)
+    threshold = relevance_threshold(metric)
+    if len(lexical_ids):
+        # Vector candidates above the relevance threshold, fused with the BM25 ranking
+        relevant = (urls >= 0) & (scores >= threshold)
+        fused_ids, fused = reciprocal_rank_fusion(ids[relevant], lexical_ids)
+        keys = np.concatenate([ids[relevant], lexical_ids]).astype(np.int64)
+        groups = np.concatenate([urls[relevant], lexical_urls])
+        unique, first = np.unique(keys, return_index=True)
+        rows = first_per_group(groups[first][np.searchsorted(unique, fused_ids)], k)
+        if rows.size:
+            return fused_ids[rows], fused[rows], dict(zip(ids.tolist(), distances.tolist())), bm25_by_id
+
+    # Threshold, keyword filter and one result per URL, all on arrays
+    rows, fallback = select_results(scores, urls, matches, k, threshold)
+    distance = None if fallback else dict(zip(ids.tolist(), distances.tolist()))
+    return ids[rows], scores[rows], distance, None
@@ -1,15 +1,43 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+import os
 import json
-from web_indexer import indexer
-from bs4 import BeautifulSoup
+import time
+import threading
+from web_indexer import indexer, MAX_BATCH_QUERIES, MAX_SEARCH_K
+from html_text import extract_text
+from jobs import IndexingQueue
+from metrics import CONTENT_TYPE, REQUEST_SECONDS, indexer_gauges, render, timed
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+indexing_queue = None
+_queue_lock = threading.Lock()
+
+def get_indexing_queue():
+    """The indexing queue, started on first use so only the serving process runs workers"""
+    global indexing_queue
+    with _queue_lock:
+        if indexing_queue is None:
+            indexing_queue = IndexingQueue(indexer)
+        return indexing_queue
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    """Observe the request's latency under its route pattern (not the raw path, which would explode the series)"""
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, request.method, route, str(response.status_code))
+    return response
+
 @app.route('/index', methods=['POST'])
 def index_page():
-    """Endpoint to receive and index page content from Chrome extension"""
+    """Endpoint to receive page content from Chrome extension and queue it for indexing"""
     data = request.json
     if not data or 'url' not in data or 'content' not in data:
         return jsonify({"error": "Missing required fields"}), 400
@@ -18,14 +46,32 @@ def index_page():
     content = data['content']
     title = data.get('title', '')
     
-    # Clean HTML content with BeautifulSoup
+    # HTML cleaning and indexing happen in the queue's workers
+    try:
+        job = get_indexing_queue().submit(url, content, title)
+        return jsonify({"success": True, "message": f"Queued {url} for indexing", "job_id": job["id"]}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """State of an indexing job: queued, running, done or failed"""
+    job = get_indexing_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route('/index', methods=['DELETE'])
+def delete_page():
+    """Remove a page and all of its chunks from the index"""
+    data = request.get_json(silent=True) or {}
+    url = data.get('url') or request.args.get('url')
+    if not url:
+        return jsonify({"error": "Missing url"}), 400
+    
     try:
-        soup = BeautifulSoup(content, 'html.parser')
-        # Extract text content
-        text_content = soup.get_text(separator=' ', strip=True)
-        # Index the cleaned content
-        indexer.index_webpage(url, text_content, title)
-        return jsonify({"success": True, "message": f"Indexed {url}"})
+        deleted = indexer.delete_url(url)
+        return jsonify({"success": True, "deleted_chunks": deleted})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -38,7 +84,28 @@ def search():
     
     try:
         results = indexer.search(query, k=5)
-        return jsonify({"results": results})
+        with timed("serialize"):
+            return jsonify({"results": results})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """Endpoint to search the index for many queries in one request"""
+    data = request.get_json(silent=True) or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) for q in queries):
+        return jsonify({"error": "Missing or invalid queries"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}), 400
+    k = data.get('k', 5)
+    if not isinstance(k, int) or isinstance(k, bool) or k < 1:
+        return jsonify({"error": "k must be a positive integer"}), 400
+    
+    try:
+        results = indexer.search_many(queries, k=min(k, MAX_SEARCH_K))
+        with timed("serialize"):
+            return jsonify({"results": results})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -55,22 +122,33 @@ def highlight():
     
     try:
         # Clean HTML content
-        soup = BeautifulSoup(content, 'html.parser')
-        text_content = soup.get_text(separator=' ', strip=True)
+        text_content = extract_text(content)
         
         # Get highlights
-        highlights = indexer.get_highlights(query, text_content)
-        return jsonify({"highlights": highlights})
+        highlights = indexer.get_highlights(query, text_content, url=url)
+        with timed("serialize"):
+            return jsonify({"highlights": highlights})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/status', methods=['GET'])
 def status():
-    """Get indexer status"""
-    return jsonify({
-        "total_chunks": len(indexer.metadata),
-        "total_urls": len(set(item["url"] for item in indexer.metadata)) if indexer.metadata else 0
-    })
+    """Get indexer status, including live versus tombstoned vector counts"""
+    stats = indexer.stats()
+    stats["queued_jobs"] = get_indexing_queue().pending()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage and request latency histograms and index gauges, in the Prometheus text format"""
+    queue = indexing_queue
+    gauges = indexer_gauges(indexer, queue.pending if queue is not None else None)
+    return Response(render(gauges), content_type=CONTENT_TYPE)
 
 if __name__ == '__main__':
+    if os.environ.get('WERKZEUG_RUN_MAIN'):
+        # Only the reloader's child process serves and owns the index. The watching parent must
+        # not load it too, or both would checkpoint, truncate logs and append texts in one directory
+        indexer.load_in_background()  # Serve right away; the index is memory-mapped in the background
+        get_indexing_queue()  # Resume unfinished jobs right away
     app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
@@ -0,0 +1,280 @@
+import hashlib
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from metrics import timed
+from ranking import EMPTY_CANDIDATES, rank_query
+from text_index import tokenize
+
+SHARD_KEYS = ("url", "domain")
+SHARD_BITS = 32  # Result keys are shard number << SHARD_BITS | chunk id within the shard
+LOCAL_MASK = (1 << SHARD_BITS) - 1
+
+
+def shard_dirs(index_dir: Path, count: int) -> List[Path]:
+    """Directories of the shards of a count-way sharded index"""
+    return [Path(index_dir) / "shards" / f"{number:02d}-of-{count:02d}" for number in range(count)]
+
+
+def shard_of(url: str, count: int, by: str = "url") -> int:
+    """Shard holding a page: by a stable hash of the whole URL, or of its domain so a site stays together"""
+    key = urlsplit(url).netloc.lower() if by == "domain" else url
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") % count
+
+
+def _global(number: int, ids: np.ndarray, urls: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Chunk ids and URL numbers of one shard as keys unique across shards (URLs stay negative when dead)"""
+    base = np.int64(number) << SHARD_BITS
+    return ids.astype(np.int64) | base, np.where(urls >= 0, urls.astype(np.int64) | base, -1)
+
+
+class ShardedIndexer:
+    """The web index split into independent shards, each a WebPageIndexer with its own
+    directory, FAISS index, metadata, term index and checkpointer.
+
+    Pages are routed to a shard by URL hash (or domain), so indexing different pages
+    runs on different locks and a shard can be rebuilt while the others keep serving.
+    Searches fan out to all shards on a thread pool (FAISS releases the GIL while it
+    searches) and the candidates are merged before the usual ranking: vector
+    candidates by distance, BM25 candidates scored with collection-wide statistics,
+    so results match what one index over the whole corpus would return.
+
+    open_index(path) opens one shard; shards share one embedder, owned here, and
+    keyword_query(terms, doc_count, document_frequency) decides which queries skip
+    the embedding call, as in WebPageIndexer. On first
+    load an empty shard set is filled from an unsharded index in index_dir, or from a
+    shard set of another size, which are left in place.
+    """
+
+    def __init__(self, index_dir: Path, count: int, open_index: Callable[[Path], Any], embedder,
+                 keyword_query: Callable[[List[str], int, Dict[str, int]], bool],
+                 by: str = "url", search_mode: str = "hybrid"):
+        if by not in SHARD_KEYS:
+            raise ValueError(f"Unknown SHARD_BY '{by}', expected one of {SHARD_KEYS}")
+        self.index_dir = Path(index_dir)
+        self.by = by
+        self.search_mode = search_mode
+        self.keyword_query = keyword_query
+        self.embedder = embedder
+        self._open_index = open_index
+        self.shards = [open_index(path) for path in shard_dirs(self.index_dir, count)]
+        self._pool = ThreadPoolExecutor(max_workers=count, thread_name_prefix="shard")
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._closing = False
+        atexit.register(self.close)
+
+    def shard(self, url: str):
+        return self.shards[shard_of(url, len(self.shards), self.by)]
+
+    def _fan_out(self, call: Callable[[Any], Any]) -> List[Any]:
+        """call(shard) for every shard in parallel, results in shard order"""
+        return list(self._pool.map(call, self.shards))
+
+    # ---- loading ----
+
+    def ensure_loaded(self):
+        """Load every shard (in parallel) and the embedding cache, once"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self.embedder.cache.load()
+            self._fan_out(lambda shard: shard.ensure_loaded())
+            if all(shard.next_id == 0 for shard in self.shards):
+                self._import_unsharded()
+            self._loaded = True
+
+    def load_in_background(self):
+        """Start loading without waiting for it; requests block until the load is done"""
+        threading.Thread(target=self.ensure_loaded, name="index-loader", daemon=True).start()
+
+    def _source_dirs(self) -> List[Path]:
+        """Index directories to fill new shards from: the unsharded index and other shard sets"""
+        own = {shard.index_dir for shard in self.shards}
+        candidates = [self.index_dir] + sorted((self.index_dir / "shards").glob("*-of-*"))
+        return [path for path in candidates if path not in own and
+                any(any(path.glob(pattern)) for pattern in ("checkpoint.json", "index*.bin", "wal-*.jsonl"))]
+
+    def _import_unsharded(self):
+        """Distribute the pages of existing indexes over the new shards, reusing their vectors"""
+        for path in self._source_dirs():
+            source = self._open_index(path)
+            source.ensure_loaded()
+            urls = list(source.url_ids)
+            if urls:
+                print(f"Distributing {len(urls)} pages from {path} over {len(self.shards)} shards")
+            for url in urls:
+                with source.lock:
+                    ids = list(source.url_ids.get(url, []))
+                    chunks = [dict(source.metadata[chunk_id], text=source.store.text(source.metadata[chunk_id]))
+                              for chunk_id in ids]
+                    content_hash = source.url_cache.get(url)
+                try:
+                    with source.index_lock.read():
+                        vectors = source.index.reconstruct_batch(np.array(ids, dtype=np.int64))
+                except RuntimeError:
+                    # IVF index saved without a direct map: embed the texts again
+                    vectors, ok = source.get_embeddings(chunk["text"] for chunk in chunks)
+                    if not ok.all():
+                        print(f"⚠️ Could not move {url}: embedding failed")
+                        continue
+                self.shard(url).add_chunks(url, chunks, vectors, content_hash)
+            source.close()
+        for shard in self.shards:
+            if shard.next_id:
+                shard.save()
+
+    # ---- indexing ----
+
+    def index_webpage(self, url: str, content: str, title: str = ""):
+        self.ensure_loaded()
+        self.shard(url).index_webpage(url, content, title)
+
+    def delete_url(self, url: str) -> int:
+        self.ensure_loaded()
+        return self.shard(url).delete_url(url)
+
+    def rebuild_shard(self, number: int, mode: str = None, reembed: bool = False):
+        """Retrain and rebuild one shard's index (see WebPageIndexer.rebuild()); the other shards are not touched"""
+        self.ensure_loaded()
+        self.shards[number].rebuild(mode, reembed)
+
+    def set_search_params(self, nprobe: int = None, ef_search: int = None):
+        self.ensure_loaded()
+        for shard in self.shards:
+            shard.set_search_params(nprobe, ef_search)
+
+    # ---- search ----
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Search all shards (see WebPageIndexer.search())"""
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Search all shards for several queries: each stage fans out to the shards once
+        for the whole batch, and candidates are merged before ranking"""
+        self.ensure_loaded()
+        results = [[] for _ in queries]
+        try:
+            live = sum(shard.stats()["live_vectors"] for shard in self.shards)
+            if not queries or live == 0:
+                return results
+
+            metric = self.shards[0].metric
+            max_results = self.shards[0].max_candidates(k, live)
+            query_terms = [tokenize(query) for query in queries]
+
+            # Collection-wide BM25 statistics, so shard scores are comparable
+            all_terms = {term for terms in query_terms for term in terms}
+            statistics = self._fan_out(lambda shard: shard.term_statistics(all_terms))
+            collection = (sum(doc_count for doc_count, _, _ in statistics),
+                          sum(total_length for _, total_length, _ in statistics),
+                          {term: sum(frequencies[term] for _, _, frequencies in statistics) for term in all_terms})
+
+            per_shard = self._fan_out(lambda shard: [shard.lexical_candidates(terms, max_results, collection)
+                                                     for terms in query_terms])
+            lexical = [self._merge_lexical([candidates[position] for candidates in per_shard], max_results)
+                       for position in range(len(queries))]
+
+            vector = {}
+            positions = [position for position in range(len(queries))
+                         if self.search_mode != "lexical"
+                         and not (len(lexical[position][0])
+                                  and self.keyword_query(query_terms[position], collection[0], collection[2]))]
+            if positions:
+                # One embedding call for the batch, shared by every shard
+                embeddings, ok = self.shards[0].embed_queries([queries[position] for position in positions])
+                searched = [position for position, good in zip(positions, ok) if good]
+                searched_terms = [query_terms[position] for position in searched]
+                per_shard = self._fan_out(lambda shard: shard.vector_candidates(embeddings[ok], max_results,
+                                                                                searched_terms))
+                for row, position in enumerate(searched):
+                    vector[position] = self._merge_vector([candidates[row] for candidates in per_shard], max_results)
+                for position in positions:
+                    vector.setdefault(position, EMPTY_CANDIDATES)  # Embedding failed: BM25 only
+
+            with timed("post_filter"):
+                for position in range(len(queries)):
+                    results[position] = self._results(*rank_query(lexical[position], vector.get(position), k, metric))
+            return results
+
+        except Exception as e:
+            print(f"Search error: {e}")
+            return [[] for _ in queries]
+
+    def _merge_lexical(self, candidates: List[Tuple[np.ndarray, np.ndarray, np.ndarray]], max_results: int):
+        """Best BM25 candidates over all shards, best first"""
+        keys, urls = zip(*(_global(number, ids, shard_urls) for number, (ids, _, shard_urls) in enumerate(candidates)))
+        keys, urls = np.concatenate(keys), np.concatenate(urls)
+        bm25 = np.concatenate([scores for _, scores, _ in candidates]).astype(np.float32)
+        order = np.argsort(-bm25, kind="stable")[:max_results]
+        return keys[order], bm25[order], urls[order]
+
+    def _merge_vector(self, candidates: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]], max_results: int):
+        """Nearest vector candidates over all shards, by distance"""
+        keys, urls = zip(*(_global(number, ids, shard_urls)
+                           for number, (ids, _, shard_urls, _) in enumerate(candidates)))
+        keys, urls = np.concatenate(keys), np.concatenate(urls)
+        distances = np.concatenate([distances for _, distances, _, _ in candidates]).astype(np.float32)
+        matches = np.concatenate([matches for _, _, _, matches in candidates])
+        order = np.argsort(distances, kind="stable")[:max_results]
+        return keys[order], distances[order], urls[order], matches[order]
+
+    def _results(self, keys: np.ndarray, scores: np.ndarray, distance: Dict[int, float] = None,
+                 bm25: Dict[int, float] = None) -> List[Dict[str, Any]]:
+        """Result dicts for the chosen chunks, each read from its shard, in ranking order"""
+        keys = np.asarray(keys, dtype=np.int64)
+        numbers, local = keys >> SHARD_BITS, keys & LOCAL_MASK
+        found = {}
+        for number in np.unique(numbers).tolist():
+            rows = np.flatnonzero(numbers == number)
+            chosen = keys[rows].tolist()
+            shard_distance = {key & LOCAL_MASK: distance[key] for key in chosen if key in distance} if distance else None
+            shard_bm25 = {key & LOCAL_MASK: bm25[key] for key in chosen if key in bm25} if bm25 else None
+            for result in self.shards[number]._results(local[rows], scores[rows], shard_distance, shard_bm25):
+                found[(number << SHARD_BITS) | result["id"]] = result
+        return [found[key] for key in keys.tolist() if key in found]
+
+    def get_highlights(self, query: str, text: str, window_size: int = 100, url: str = None) -> List[Dict[str, Any]]:
+        """Highlights from the shard that holds the page (see WebPageIndexer.get_highlights())"""
+        self.ensure_loaded()
+        shard = self.shard(url) if url is not None else self.shards[0]
+        return shard.get_highlights(query, text, window_size, url=url)
+
+    # ---- status and persistence ----
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts summed over the shards, with each shard's own counts under "shards" """
+        self.ensure_loaded()
+        shards = self._fan_out(lambda shard: shard.stats())
+        totals = {key: sum(shard[key] for shard in shards)
+                  for key in ("total_chunks", "total_urls", "live_vectors", "dead_vectors")}
+        for shard in shards:
+            shard.pop("embedding_cache", None)
+        return dict(totals, embedding_cache=self.embedder.cache.stats(), shards=shards)
+
+    def save(self):
+        self.ensure_loaded()
+        self._fan_out(lambda shard: shard.save())
+
+    def close(self):
+        """Close every shard (each takes its final checkpoint) and save the embedding cache.
+        Shards close one after another: at interpreter exit the thread pool may already be
+        shut down and refuse new work."""
+        if self._closing or not self._loaded:
+            return
+        self._closing = True
+        try:
+            for shard in self.shards:
+                shard.close()
+        finally:
+            self._pool.shutdown(wait=False)
+            self.embedder.cache.save()
@@ -0,0 +1,30 @@
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# The modules live next to this directory, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_embeddings import make_handler  # noqa: E402
+from embedder import EmbeddingClient  # noqa: E402
+from embedding_cache import EmbeddingCache  # noqa: E402
+
+DIMENSION = 64  # Small stand-in embeddings keep the indexes quick to build
+
+
+@pytest.fixture(scope="session")
+def ollama():
+    """Base URL of a stand-in Ollama embedding server (deterministic vectors, no latency)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(DIMENSION, 0.0, 0.0, threading.Semaphore(8)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api"
+    server.shutdown()
+
+
+@pytest.fixture
+def embedder(ollama, tmp_path):
+    """An embedding client against the stand-in server, caching to a file under tmp_path"""
+    return EmbeddingClient(ollama, "stand-in", cache=EmbeddingCache(path=tmp_path / "embedding_cache.npz"))
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from chunker import estimate_tokens, iter_chunks
+
+MAX_TOKENS = 320
+OVERLAP_TOKENS = 40
+WORDS = "index vector search query cosine shard page chunk token model server cache crawler ranking".split()
+
+
+def sentences(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))).capitalize() + "." for _ in range(count)]
+
+
+def hashes(text):
+    return [chunk["hash"] for chunk in iter_chunks(text, "https://example.com", MAX_TOKENS, OVERLAP_TOKENS,
+                                                   estimate_tokens)]
+
+
+def reused(before, after):
+    """Share of the chunks after an edit that were already indexed before it"""
+    known = set(hashes(before))
+    after = hashes(after)
+    return sum(chunk in known for chunk in after) / len(after)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_sentence_inserted_early_keeps_later_chunks(seed):
+    page = sentences(400, seed)
+    edited = page[:3] + ["A new sentence near the top."] + page[3:]
+    assert reused(" ".join(page), " ".join(edited)) >= 0.9
+
+
+def test_uniform_sentences_keep_later_chunks():
+    page = [f"Sentence number {n} is exactly as long as every other one." for n in range(300)]
+    edited = page[:2] + ["Inserted."] + page[2:]
+    assert reused(" ".join(page), " ".join(edited)) >= 0.9
+
+
+def test_word_inserted_into_text_without_sentence_breaks_keeps_later_chunks():
+    rng = random.Random(0)
+    text = " ".join(rng.choice(WORDS) for _ in range(5000))
+    assert reused(text, "inserted " + text) >= 0.9
+
+
+def test_chunks_fit_and_cover_the_text():
+    text = " ".join(sentences(200))
+    chunks = list(iter_chunks(text, "https://example.com", MAX_TOKENS, OVERLAP_TOKENS, estimate_tokens))
+    assert all(estimate_tokens(chunk["text"]) <= MAX_TOKENS for chunk in chunks)
+    assert chunks[0]["position"]["start"] == 0
+    assert chunks[-1]["position"]["end"] == len(text.split()) - 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # Consecutive chunks overlap or touch, so no words are lost between them
+        assert chunk["position"]["start"] <= previous["position"]["end"] + 1
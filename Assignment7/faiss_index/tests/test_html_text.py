@@ -0,0 +1,25 @@
+import pytest
+
+from html_text import BACKENDS, extract_text
+
+# (page, text with boilerplate removed, text with it kept)
+PAGES = [
+    # Words either side of a removed element stay apart...
+    ("<p>a<img hidden>b</p>", "a b", "a b"),
+    ("<p>before<span hidden>secret</span>after</p>", "before after", "before secret after"),
+    ("<p>one<script>var x = 1;</script>two</p>", "one two", "one two"),
+    # ...while a stray end tag closes nothing and splits no word, as in browsers
+    ("<div>x</span>y</div>", "xy", "xy"),
+    ("<div>a</div></div>b", "a b", "a b"),
+    ("<p>a<b>c</b>d</p>", "a c d", "a c d"),
+    ("<html><head><title>T</title></head><body><nav>menu</nav><main><header>h</header>m</main>"
+     "<footer>f</footer><div aria-hidden='true'>z</div>ok</body></html>", "h m ok", "T menu h m f z ok"),
+    ("<p>unclosed <b>bold", "unclosed bold", "unclosed bold"),
+]
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+@pytest.mark.parametrize("page, text, kept", PAGES)
+def test_backends_extract_the_same_words(backend, page, text, kept):
+    assert extract_text(page, backend) == text
+    assert extract_text(page, backend, boilerplate=False) == kept
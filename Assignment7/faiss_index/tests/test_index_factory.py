@@ -0,0 +1,75 @@
+import faiss
+import numpy as np
+import pytest
+
+from index_factory import (DEFAULT_INDEX_PARAMS, build_index, knn_search, normalized, search_parameters,
+                           threshold_search)
+
+PARAMS = dict(DEFAULT_INDEX_PARAMS, nlist=4, pq_m=4, pq_nbits=4)
+
+
+def retire(index, params, ids):
+    """Search parameters skipping ids, as WebPageIndexer builds them for tombstoned chunks"""
+    dead = faiss.IDSelectorBatch(ids)
+    not_dead = faiss.IDSelectorNot(dead)
+    return search_parameters(index, params, not_dead), (dead, not_dead)
+
+
+@pytest.mark.parametrize("mode", ["flat", "ivf_flat", "hnsw", "sq8", "pq", "ivf_pq"])
+@pytest.mark.parametrize("metric", ["l2", "cosine"])
+def test_knn_search_skips_retired_ids(mode, metric):
+    params = dict(PARAMS, metric=metric)
+    vectors = np.random.default_rng(0).standard_normal((400, 16)).astype(np.float32)
+    index = build_index(mode, vectors, params)
+    queries = vectors[:3]
+    _, nearest = index.search(queries, k=10)
+    retired = np.unique(nearest[:, :2])
+
+    search_params, _selectors = retire(index, params, retired)
+    _, found = knn_search(index, queries, 5, search_params, retired)
+
+    assert found.shape == (3, 5)
+    assert not np.isin(found, retired).any()
+    assert (found >= 0).all()
+
+
+@pytest.mark.parametrize("metric", ["l2", "cosine"])
+def test_pq_search_pads_rows_when_too_few_ids_remain(metric):
+    params = dict(PARAMS, metric=metric)
+    vectors = np.random.default_rng(1).standard_normal((300, 16)).astype(np.float32)
+    index = build_index("pq", vectors, params)
+    retired = np.arange(297, dtype=np.int64)
+
+    search_params, _selectors = retire(index, params, retired)
+    _, found = knn_search(index, vectors[:1], 5, search_params, retired)
+
+    assert sorted(found[0, :3]) == [297, 298, 299]
+    assert (found[0, 3:] == -1).all()
+
+
+def test_pq_threshold_search_fallback_skips_retired_ids():
+    params = dict(PARAMS, metric="cosine")
+    vectors = np.random.default_rng(2).standard_normal((300, 16)).astype(np.float32)
+    index = build_index("pq", vectors, params)
+    retired = np.array([0], dtype=np.int64)
+
+    search_params, _selectors = retire(index, params, retired)
+    # No similarity exceeds 1, so every query takes the k-NN fallback
+    rows = threshold_search(index, vectors[:2], 1.01, 5, 3, search_params, retired)
+
+    for _, ids in rows:
+        assert len(ids) == 3 and 0 not in ids
+
+
+@pytest.mark.parametrize("mode", ["sq8", "pq", "ivf_pq"])
+def test_cosine_indexes_are_trained_on_the_normalized_vectors_they_store(mode):
+    params = dict(PARAMS, metric="cosine", pq_m=8)
+    # Embeddings are not unit length; a quantizer trained on their raw range cannot tell unit vectors apart
+    vectors = np.random.default_rng(3).standard_normal((1000, 16)).astype(np.float32) * 50
+    index = build_index(mode, vectors, params)
+    flat = build_index("flat", vectors, params)
+
+    _, truth = flat.search(normalized(vectors[:50]), k=1)
+    _, found = index.search(normalized(vectors[:50]), k=1)
+
+    assert (found == truth).mean() >= 0.8
@@ -0,0 +1,64 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import asgi_server
+import server
+from web_indexer import MAX_SEARCH_K
+
+
+class Recorder:
+    """Stands in for the indexer's search_many(), recording the k it is asked for"""
+
+    def __init__(self):
+        self.calls = []
+
+    def search_many(self, queries, k=5):
+        self.calls.append(k)
+        return [[] for _ in queries]
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def post(request, monkeypatch):
+    """POST /search/batch to either server, returning the status and JSON body, with the
+    indexer recording its calls"""
+    recorder = Recorder()
+    if request.param == "flask":
+        monkeypatch.setattr(server, "indexer", recorder)
+        client = server.app.test_client()
+        send = lambda body: (lambda response: (response.status_code, response.get_json()))(
+            client.post("/search/batch", json=body))
+    else:
+        monkeypatch.setattr(asgi_server, "indexer", recorder)
+        client = TestClient(asgi_server.app)  # Not entered, so the index is not loaded
+        send = lambda body: (lambda response: (response.status_code, response.json()))(
+            client.post("/search/batch", json=body))
+    send.calls = recorder.calls
+    return send
+
+
+@pytest.mark.parametrize("body", [
+    {"queries": ["a"], "k": "5"},
+    {"queries": ["a"], "k": 2.5},
+    {"queries": ["a"], "k": True},
+    {"queries": ["a"], "k": 0},
+    {"queries": ["a"], "k": -3},
+    {"queries": []},
+    {"queries": "a"},
+    {"queries": ["a", 1]},
+    {},
+])
+def test_invalid_batches_get_400(post, body):
+    status, reply = post(body)
+    assert status == 400
+    assert "error" in reply
+    assert not post.calls
+
+
+def test_k_is_clamped(post):
+    assert post({"queries": ["a", "b"], "k": MAX_SEARCH_K * 100}) == (200, {"results": [[], []]})
+    assert post.calls == [MAX_SEARCH_K]
+
+
+def test_k_defaults_to_5(post):
+    assert post({"queries": ["a"]})[0] == 200
+    assert post.calls == [5]
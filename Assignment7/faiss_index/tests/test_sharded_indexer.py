@@ -0,0 +1,27 @@
+from sharded_indexer import ShardedIndexer
+from web_indexer import WebPageIndexer, is_keyword_query
+
+PAGES = {f"https://example.com/{n}": f"Page {n} is about topic {n}. It has a second sentence." for n in range(6)}
+
+
+def sharded(tmp_path, embedder, count=2):
+    return ShardedIndexer(tmp_path / "index", count, lambda path: WebPageIndexer(path, embedder), embedder,
+                          is_keyword_query)
+
+
+def test_close_after_pool_shutdown_saves_shards_and_cache(tmp_path, embedder):
+    indexer = sharded(tmp_path, embedder)
+    for url, content in PAGES.items():
+        indexer.index_webpage(url, content)
+    # At interpreter exit the executor's own atexit hook may run before close()
+    indexer._pool.shutdown()
+
+    indexer.close()
+
+    assert (tmp_path / "embedding_cache.npz").exists()
+    assert all(not shard.store.pending for shard in indexer.shards)
+
+    reopened = sharded(tmp_path, embedder)
+    reopened.ensure_loaded()
+    assert sum(shard.stats()["total_chunks"] for shard in reopened.shards) == len(PAGES)
+    reopened.close()
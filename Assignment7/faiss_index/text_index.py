@@ -0,0 +1,187 @@
+import io
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+BM25_K1 = 1.2  # Term frequency saturation
+BM25_B = 0.75  # Document length normalization
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, used for both chunk texts and queries"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TermIndex:
+    """Inverted index over chunk texts for keyword filtering and BM25 ranking.
+
+    Each term maps to the ids of the chunks containing it and the term's
+    frequency in each. Chunk ids only ever grow, so appending keeps every
+    posting list sorted and membership tests are binary searches. Retired
+    chunks are taken out of the document statistics right away but stay in
+    the postings until the next compaction; callers filter results by
+    liveness themselves.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, array] = {}  # term → ascending int32 chunk ids
+        self.frequencies: Dict[str, array] = {}  # term → int32 count per posting
+        self.lengths = array("i")  # chunk id → token count, 0 for retired or unused ids
+        self.doc_count = 0
+        self.total_length = 0
+        self.covered = 0  # Chunk ids below this are indexed (when loaded from a snapshot)
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+    def add(self, chunk_id: int, tokens: List[str]):
+        """Index a chunk by its tokens (see tokenize()); ids must be added in ascending order"""
+        for term, count in Counter(tokens).items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = array("i")
+                self.frequencies[term] = array("i")
+            posting.append(chunk_id)
+            self.frequencies[term].append(count)
+        if chunk_id >= len(self.lengths):
+            self.lengths.extend([0] * (chunk_id + 1 - len(self.lengths)))
+        self.lengths[chunk_id] = len(tokens)
+        self.doc_count += 1
+        self.total_length += len(tokens)
+
+    def remove(self, ids: Iterable[int]):
+        """Take retired chunks out of the document statistics"""
+        for chunk_id in ids:
+            if chunk_id < len(self.lengths) and self.lengths[chunk_id]:
+                self.doc_count -= 1
+                self.total_length -= self.lengths[chunk_id]
+                self.lengths[chunk_id] = 0
+
+    def posting(self, term: str) -> np.ndarray:
+        """Zero-copy view of a posting list. Appending to the list fails while a view
+        is alive, so only use it under the lock that serializes add()."""
+        posting = self.postings.get(term)
+        if posting is None:
+            return np.zeros(0, dtype=np.int32)
+        return np.frombuffer(posting, dtype=np.int32)
+
+    def document_frequency(self, term: str) -> int:
+        posting = self.postings.get(term)
+        return len(posting) if posting is not None else 0
+
+    def contains_any(self, ids: np.ndarray, terms: Iterable[str]) -> np.ndarray:
+        """Mask of the chunk ids that contain at least one of the terms (see posting())"""
+        ids = np.asarray(ids, dtype=np.int32)
+        found = np.zeros(len(ids), dtype=bool)
+        for term in set(terms):
+            posting = self.posting(term)
+            if not len(posting):
+                continue
+            positions = np.minimum(np.searchsorted(posting, ids), len(posting) - 1)
+            found |= posting[positions] == ids
+        return found
+
+    def bm25(self, terms: Iterable[str], collection: Tuple[int, int, Dict[str, int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 scores of every chunk containing a query term, unordered (see posting()).
+        Retired chunks not yet compacted are included. collection is (document count, total
+        length, document frequency by term) of a larger collection this index is part of, so
+        that the scores of several shards are comparable; by default this index's own."""
+        ids = []
+        scores = []
+        doc_count, total_length, frequencies = collection or (self.doc_count, self.total_length, None)
+        if self.doc_count and doc_count:
+            lengths = np.frombuffer(self.lengths, dtype=np.int32)
+            average_length = total_length / doc_count
+            for term in set(terms):
+                posting = self.posting(term)
+                if not len(posting):
+                    continue
+                frequency = np.frombuffer(self.frequencies[term], dtype=np.int32).astype(np.float32)
+                df = frequencies.get(term, len(posting)) if frequencies is not None else len(posting)
+                idf = np.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[posting] / average_length)
+                ids.append(posting.copy())
+                scores.append(idf * frequency * (BM25_K1 + 1.0) / (frequency + norm))
+        if not ids:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        # Sum the per-term scores of chunks matching several terms
+        unique, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        return unique, np.bincount(inverse, weights=np.concatenate(scores)).astype(np.float32)
+
+    # ---- compaction and persistence ----
+
+    def sizes(self) -> Dict[str, int]:
+        """Posting lengths, marking a point in time: entries after it belong to newer chunks"""
+        return {term: len(posting) for term, posting in self.postings.items()}
+
+    def compacted(self, keep: np.ndarray, sizes: Dict[str, int]) -> "TermIndex":
+        """Copy of the postings as of sizes, restricted to the sorted chunk ids in keep.
+        Safe to call while add() runs in another thread."""
+        compacted = TermIndex()
+        for term, size in sizes.items():
+            # Slicing copies, so no view pins the live arrays
+            posting = np.frombuffer(self.postings[term][:size], dtype=np.int32)
+            frequency = np.frombuffer(self.frequencies[term][:size], dtype=np.int32)
+            kept = np.isin(posting, keep, assume_unique=True)
+            if kept.any():
+                compacted.postings[term] = array("i", posting[kept].tobytes())
+                compacted.frequencies[term] = array("i", frequency[kept].tobytes())
+        return compacted
+
+    def catch_up(self, newer: "TermIndex", sizes: Dict[str, int]):
+        """Append the entries newer gained after sizes was taken and adopt its document statistics"""
+        for term, posting in newer.postings.items():
+            start = sizes.get(term, 0)
+            if start < len(posting):
+                self.postings.setdefault(term, array("i")).extend(posting[start:])
+                self.frequencies.setdefault(term, array("i")).extend(newer.frequencies[term][start:])
+        self.lengths = array("i", newer.lengths)
+        self.doc_count = newer.doc_count
+        self.total_length = newer.total_length
+
+    def to_bytes(self, keep: np.ndarray, sizes: Dict[str, int], covered: int) -> bytes:
+        """Serialize the postings as of sizes, keeping only the sorted chunk ids in keep.
+        covered is the first chunk id the snapshot does not account for."""
+        snapshot = self.compacted(keep, sizes)
+        terms = list(snapshot.postings)
+        current = np.frombuffer(self.lengths[:covered], dtype=np.int32)
+        kept = keep[keep < len(current)]
+        lengths = np.zeros(covered, dtype=np.int32)
+        lengths[kept] = current[kept]
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+            counts=np.array([len(snapshot.postings[term]) for term in terms], dtype=np.int64),
+            ids=np.frombuffer(b"".join(snapshot.postings[term].tobytes() for term in terms), dtype=np.int32),
+            frequencies=np.frombuffer(b"".join(snapshot.frequencies[term].tobytes() for term in terms), dtype=np.int32),
+            lengths=lengths,
+            covered=np.array(covered, dtype=np.int64),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TermIndex":
+        index = cls()
+        with np.load(io.BytesIO(data)) as arrays:
+            if "frequencies" not in arrays:
+                return index  # Snapshot without BM25 statistics: rebuilt from the texts
+            terms = arrays["terms"].tobytes().decode("utf-8").split("\n") if arrays["counts"].size else []
+            ids = arrays["ids"]
+            frequencies = arrays["frequencies"]
+            start = 0
+            for term, count in zip(terms, arrays["counts"].tolist()):
+                index.postings[term] = array("i", ids[start:start + count].tobytes())
+                index.frequencies[term] = array("i", frequencies[start:start + count].tobytes())
+                start += count
+            lengths = arrays["lengths"]
+            index.lengths = array("i", lengths.tobytes())
+            index.doc_count = int(np.count_nonzero(lengths))
+            index.total_length = int(lengths.sum())
+            index.covered = int(arrays["covered"])
+        return index
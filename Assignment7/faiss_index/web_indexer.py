@@ -1,13 +1,26 @@
 import os
-import json
 import faiss
 import numpy as np
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
 from dotenv import load_dotenv
-import time
-import datetime
-import requests
+import threading
+import atexit
+from collections import OrderedDict
+from contextlib import ExitStack
+from chunk_table import ChunkTable
+from chunker import fingerprint, iter_chunks
+from embedder import EmbeddingClient
+from embedding_cache import EmbeddingCache
+from index_store import IndexStore
+from metrics import timed, timed_iter
+from rwlock import ReadWriteLock
+from ranking import EMPTY_CANDIDATES, FALLBACK_CANDIDATES, MIN_SIMILARITY, rank_query, top_n
+from text_index import TermIndex, tokenize
+from index_factory import (DEFAULT_INDEX_PARAMS, INDEX_MODES, add_with_ids, base_index, build_index, can_migrate,
+                           can_train, extract_vectors, index_metric, index_mode, knn_search, migration_mode,
+                           min_training_vectors, owned_copy, refill_index, search_parameters, set_search_params,
+                           threshold_search, vector_bytes)
 
 load_dotenv()
 
@@ -16,265 +29,691 @@ INDEX_DIR = Path("faiss_index")
 METADATA_FILE = INDEX_DIR / "metadata.json"
 INDEX_FILE = INDEX_DIR / "index.bin"
 CACHE_FILE = INDEX_DIR / "url_cache.json"
-CHUNK_SIZE = 200
-CHUNK_OVERLAP = 50
+TEXTS_FILE = INDEX_DIR / "texts.bin"
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "320"))  # Chunk size in tokenizer tokens (see chunker.py)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))  # Whole sentences carried into the next chunk
 MAX_RETRIES = 3
 RETRY_DELAY = 2
 OLLAMA_API_BASE = "http://localhost:11434/api"
 EMBEDDING_MODEL = "nomic-embed-text"
 DEFAULT_DIMENSION = 768  # Default embedding dimension for nomic-embed-text
+EMBED_BATCH_SIZE = 32  # Chunks sent per embedding request
+EMBED_WORKERS = 4  # Concurrent embedding requests
+EMBED_MAX_IN_FLIGHT = 8  # Batches queued before the chunk producer blocks
+EMBED_CACHE_SIZE = 20000  # Embeddings kept for repeated queries and unchanged chunks
+EMBED_CACHE_TTL = 24 * 3600  # Seconds before a cached embedding is recomputed
+EMBED_CACHE_FILE = INDEX_DIR / "embedding_cache.npz"  # Saved on shutdown; None keeps the cache in memory only
+CHECKPOINT_EVERY = 1000  # Log records that trigger a background checkpoint
+CHECKPOINT_INTERVAL = 300  # Seconds between periodic checkpoints
+COMPACT_DEAD_RATIO = 0.2  # Compact once this share of the index is tombstoned...
+COMPACT_MIN_DEAD = 100  # ...and at least this many vectors are
+COMPACT_TEXTS_MIN_BYTES = 1 << 20  # Rewrite texts.bin once COMPACT_DEAD_RATIO of it, and this many bytes, are dead
+# One of INDEX_MODES: flat, ivf_flat, hnsw, ivf_pq, or the quantized flat modes fp16, sq8 and pq
+INDEX_MODE = os.getenv("INDEX_MODE", "flat")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")  # hybrid (BM25 + vector), vector or lexical
+# Candidates fetched per requested result, to survive filtering and one-result-per-URL. Cosine scores
+# are absolute, so candidates below MIN_SIMILARITY are cut inside FAISS and fewer are needed.
+CANDIDATES_PER_RESULT = {"l2": 5, "cosine": 3}
+KEYWORD_QUERY_MAX_TERMS = 3  # Queries of up to this many terms...
+KEYWORD_MAX_DF = 0.02  # ...each in at most this share of chunks skip the embedding call
+HIGHLIGHT_THRESHOLD = 0.5  # Minimum cosine similarity of a highlighted window
+HIGHLIGHT_LEXICAL_WEIGHT = 0.3  # Share of query term overlap in the score of windows of indexed pages
+HIGHLIGHT_CACHE_PAGES = 32  # Pages whose window embeddings are kept for repeated /highlight calls
+MAX_BATCH_QUERIES = 1000  # Queries accepted by one /search/batch request
+MAX_SEARCH_K = 100  # Results per query a request may ask for; larger k are clamped to it
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))  # Independent index shards; 1 keeps a single index in INDEX_DIR
+SHARD_BY = os.getenv("SHARD_BY", "url")  # Shard key: url (hash of the whole URL) or domain
+INDEX_PARAMS = dict(
+    DEFAULT_INDEX_PARAMS,
+    nlist=int(os.getenv("INDEX_NLIST", DEFAULT_INDEX_PARAMS["nlist"])),
+    nprobe=int(os.getenv("INDEX_NPROBE", DEFAULT_INDEX_PARAMS["nprobe"])),
+    ef_search=int(os.getenv("INDEX_EF_SEARCH", DEFAULT_INDEX_PARAMS["ef_search"])),
+    pq_m=int(os.getenv("INDEX_PQ_M", DEFAULT_INDEX_PARAMS["pq_m"])),  # Bytes per vector with 8-bit codes
+    pq_nbits=int(os.getenv("INDEX_PQ_NBITS", DEFAULT_INDEX_PARAMS["pq_nbits"])),
+    metric=os.getenv("INDEX_METRIC", DEFAULT_INDEX_PARAMS["metric"]),  # cosine or l2
+)
 
 # Ensure index directory exists
 os.makedirs(INDEX_DIR, exist_ok=True)
 
+def create_embedder() -> EmbeddingClient:
+    return EmbeddingClient(
+        OLLAMA_API_BASE,
+        EMBEDDING_MODEL,
+        batch_size=EMBED_BATCH_SIZE,
+        max_workers=EMBED_WORKERS,
+        max_in_flight=EMBED_MAX_IN_FLIGHT,
+        max_retries=MAX_RETRIES,
+        retry_delay=RETRY_DELAY,
+        cache=EmbeddingCache(EMBED_CACHE_SIZE, EMBED_CACHE_TTL, EMBED_CACHE_FILE),
+    )
+
+def is_keyword_query(query_terms: List[str], doc_count: int, document_frequency: Dict[str, int]) -> bool:
+    """Short queries made only of rare terms (names, identifiers, error codes) are exact-match lookups"""
+    if len(query_terms) > KEYWORD_QUERY_MAX_TERMS:
+        return False
+    rare = KEYWORD_MAX_DF * doc_count
+    return all(0 < document_frequency.get(term, 0) <= rare for term in query_terms)
+
 class WebPageIndexer:
-    def __init__(self):
-        self.metadata = []
+    """Loads its index on first use (or in the background via load_in_background),
+    so creating the instance at import time costs nothing.
+
+    index_dir holds the index files (one directory per shard when sharded). An
+    embedder passed in is shared with other indexers and its cache is loaded
+    and saved by its owner."""
+
+    def __init__(self, index_dir: Path = INDEX_DIR, embedder: EmbeddingClient = None):
+        self.index_dir = Path(index_dir)
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.metadata = ChunkTable()  # chunk id → chunk metadata, stored in columns
         self.index = None
+        self.next_id = 0
         self.dimension = DEFAULT_DIMENSION
-        self.load_or_create_index()
-        self.url_cache = self.load_cache()
-    
-    def load_cache(self) -> Dict[str, int]:
-        """Load URL processing cache"""
-        if CACHE_FILE.exists():
-            with open(CACHE_FILE, 'r') as f:
-                return json.load(f)
-        return {}
-    
-    def save_cache(self):
-        """Save URL processing cache"""
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(self.url_cache, f)
-    
+        self._owns_embedder = embedder is None
+        self.embedder = embedder or create_embedder()
+        self.store = IndexStore(self.index_dir, self.index_dir / INDEX_FILE.name, self.index_dir / METADATA_FILE.name,
+                                self.index_dir / CACHE_FILE.name, self.index_dir / TEXTS_FILE.name)
+        self.url_cache = {}
+        # Guards index/metadata/url_cache against the background checkpointer
+        self.lock = threading.RLock()
+        # FAISS indexes are not safe to search while vectors are added: searches share the
+        # read side, adds take the write side. Taken after self.lock, never before it.
+        self.index_lock = ReadWriteLock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._checkpoint_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()  # One of migrate_index, compact and rebuild at a time
+        self._checkpoint_due = threading.Event()
+        self._checkpointer = None
+        self._closing = False
+        self._window_cache = OrderedDict()  # (url, content hash, window size) → (embeddings, ok)
+        self._window_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def ensure_loaded(self):
+        """Load the index and start the checkpointer, once"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self.load_or_create_index()
+            self._checkpointer = threading.Thread(target=self._checkpoint_loop, name="index-checkpointer", daemon=True)
+            self._checkpointer.start()
+            self._loaded = True
+
+    def load_in_background(self):
+        """Start loading without waiting for it; requests block until the load is done"""
+        threading.Thread(target=self.ensure_loaded, name="index-loader", daemon=True).start()
+
     def load_or_create_index(self):
-        """Load existing index or create a new one"""
-        if METADATA_FILE.exists() and INDEX_FILE.exists():
-            # Load existing metadata
-            with open(METADATA_FILE, 'r') as f:
-                self.metadata = json.load(f)
-            
-            # Load existing index
-            self.index = faiss.read_index(str(INDEX_FILE))
+        """Load the last checkpoint plus the append log, or create a new index"""
+        index, self.metadata, self.url_cache, self.next_id = self.store.load(self.dimension)
+        if self._owns_embedder:
+            self.embedder.cache.load()
+        self._index_mapped = self.store.mapped
+        self.url_ids = self.metadata.live_by_url()  # url → ids of its live chunks
+        self.dead_ids = set(self.metadata.retired_ids().tolist())  # tombstoned chunks still present in the index
+        self._selector = None
+
+        # URL number of every chunk id, -1 for retired or unused ids, so search filters on arrays
+        self.url_numbers = {}
+        self.chunk_urls = np.full(max(self.next_id, 1024), -1, dtype=np.int32)
+        for url, ids in self.url_ids.items():
+            self._set_chunk_urls(ids, url)
+        self._load_terms()
+
+        if index is not None:
+            self.index = index
             self.dimension = self.index.d
-            print(f"Loaded existing index with {len(self.metadata)} chunks")
+            set_search_params(self.index, INDEX_PARAMS)
+            print(f"Loaded existing {index_mode(self.index)} index with {len(self.metadata) - len(self.dead_ids)} chunks")
+            if can_migrate(self.index, INDEX_MODE, INDEX_PARAMS) or self.needs_compaction() or self.store.pending:
+                self._checkpoint_due.set()
         else:
             # Create new index
-            self.index = faiss.IndexFlatL2(self.dimension)
-            print("Created new FAISS index")
+            self.index = self.create_index(self.dimension)
+            print(f"Created new FAISS {index_mode(self.index)} index")
+
+    def _set_chunk_urls(self, ids: List[int], url: str):
+        if not len(ids):
+            return
+        number = self.url_numbers.setdefault(url, len(self.url_numbers))
+        needed = max(ids) + 1
+        if needed > len(self.chunk_urls):
+            grown = np.full(max(needed, 2 * len(self.chunk_urls)), -1, dtype=np.int32)
+            grown[:len(self.chunk_urls)] = self.chunk_urls
+            self.chunk_urls = grown
+        self.chunk_urls[ids] = number
+
+    def _load_terms(self):
+        """Load the term index of the snapshot and add the chunks indexed after it"""
+        data = self.store.read_terms()
+        self.terms = TermIndex.from_bytes(data) if data else TermIndex()
+        # Ascending ids keep the posting lists sorted
+        missing = sorted(chunk_id for chunk_ids in self.url_ids.values() for chunk_id in chunk_ids
+                         if chunk_id >= self.terms.covered)
+        for chunk_id in missing:
+            self.terms.add(chunk_id, tokenize(self.store.text(self.metadata[chunk_id])))
+        # Chunks retired after the snapshot was taken
+        self.terms.remove(self.dead_ids)
+        if missing:
+            print(f"Added {len(missing)} chunks to the term index")
+            if data is None:
+                self._checkpoint_due.set()
+
+    def create_index(self, dimension: int) -> faiss.Index:
+        """Empty index in INDEX_MODE, or a flat index until there is enough data to train it"""
+        if INDEX_MODE not in INDEX_MODES:
+            raise ValueError(f"Unknown INDEX_MODE '{INDEX_MODE}', expected one of {INDEX_MODES}")
+        mode = INDEX_MODE if min_training_vectors(INDEX_MODE, INDEX_PARAMS) == 0 else "flat"
+        return build_index(mode, np.zeros((0, dimension), dtype=np.float32), INDEX_PARAMS)
+
+    def _own_index(self):
+        """Copy a memory-mapped snapshot index into RAM before it is modified. Call with the lock held."""
+        if self._index_mapped:
+            self.index = owned_copy(self.index)
+            self._index_mapped = False
+
+    def set_search_params(self, nprobe: int = None, ef_search: int = None):
+        """Tune recall against latency for IVF (nprobe) and HNSW (efSearch) indexes"""
+        self.ensure_loaded()
+        if nprobe is not None:
+            INDEX_PARAMS["nprobe"] = nprobe
+        if ef_search is not None:
+            INDEX_PARAMS["ef_search"] = ef_search
+        with self.lock, self.index_lock.write():
+            set_search_params(self.index, INDEX_PARAMS)
+
+    def migrate_index(self) -> bool:
+        """Rebuild the index in INDEX_MODE once there are enough vectors to train it, or in
+        the configured metric (an L2 index from before cosine indexes is normalized).
+        Training runs without the lock; chunks added meanwhile are copied over at the swap."""
+        with self._rebuild_lock:
+            with self.lock:
+                if not can_migrate(self.index, INDEX_MODE, INDEX_PARAMS):
+                    return False
+                old_mode = f"{index_mode(self.index)}/{index_metric(self.index)}"
+                mode = migration_mode(self.index, INDEX_MODE, INDEX_PARAMS)
+                self._own_index()
+                with self.index_lock.write():  # Can build the IVF direct map
+                    ids, vectors = extract_vectors(self.index)
+
+            new_index = build_index(mode, vectors, INDEX_PARAMS, ids)
+
+            with self.lock:
+                with self.index_lock.write():
+                    added_ids, added_vectors = extract_vectors(self.index, start=len(ids))
+                add_with_ids(new_index, added_vectors, added_ids)
+                self.index = new_index
+                self._selector = None
+        print(f"Migrated index from {old_mode} to {mode}/{INDEX_PARAMS['metric']} with {new_index.ntotal} vectors")
+        return True
+
+    def delete_url(self, url: str) -> int:
+        """Remove every chunk of a page. Vectors are tombstoned and dropped at the next compaction."""
+        self.ensure_loaded()
+        with self.lock:
+            ids = self.url_ids.pop(url, [])
+            if not ids and url not in self.url_cache:
+                return 0
+            self.store.append(None, [], retired=ids, url=url, forget=True)
+            self._retire(ids)
+            self.url_cache.pop(url, None)
+            if self.needs_compaction():
+                self._checkpoint_due.set()
+        print(f"🗑️ Deleted {len(ids)} chunks of {url}")
+        return len(ids)
+
+    def _retire(self, ids: List[int]):
+        for chunk_id in ids:
+            self.metadata.retire(chunk_id)
+        self.dead_ids.update(ids)
+        self.chunk_urls[list(ids)] = -1
+        self.terms.remove(ids)
+        self._selector = None
+
+    def needs_compaction(self) -> bool:
+        dead = self.index.ntotal - (len(self.metadata) - len(self.dead_ids)) if self.index is not None else 0
+        return dead >= COMPACT_MIN_DEAD and dead >= COMPACT_DEAD_RATIO * max(1, self.index.ntotal)
+
+    def needs_text_compaction(self) -> bool:
+        size = self.store.texts_size()
+        dead = size - self.metadata.text_bytes()
+        return dead >= COMPACT_TEXTS_MIN_BYTES and dead >= COMPACT_DEAD_RATIO * size
+
+    def compact(self) -> bool:
+        """Drop tombstoned vectors from the index and their metadata.
+        The rebuild runs without the lock; chunks added meanwhile are copied over at the swap."""
+        with self._rebuild_lock:
+            with self.lock:
+                if not self.needs_compaction():
+                    return False
+                self._own_index()
+                base = faiss.clone_index(base_index(self.index))
+            # Keeps the trained quantizer: only the stored vectors change
+            dropped, new_index = self._replace_index(lambda ids, vectors: refill_index(base, ids, vectors))
+        print(f"Compacted index: dropped {dropped} dead vectors, {new_index.ntotal} remain")
+        return True
+
+    def rebuild(self, mode: str = None, reembed: bool = False):
+        """Rebuild the index from its live vectors in INDEX_MODE, retraining it, and checkpoint.
+        Searches and indexing continue meanwhile; chunks added are copied over at the swap.
+
+        An explicit mode is trained on however many vectors there are, as when re-encoding
+        offline (quantize_index.py). With reembed the chunk texts are embedded again instead
+        of reading the vectors back, which a lossy index (LOSSY_MODES) only has approximately."""
+        self.ensure_loaded()
+        target = mode or INDEX_MODE
+
+        def build(ids, vectors):
+            if reembed:
+                with self.lock:
+                    texts = [self.store.text(self.metadata[chunk_id]) for chunk_id in ids.tolist()]
+                vectors, ok = self.get_embeddings(texts)
+                if not ok.all():
+                    raise RuntimeError(f"Could not embed {int((~ok).sum())} of {len(ids)} chunks again")
+            trainable = (can_train(target, len(ids), INDEX_PARAMS) if mode
+                         else len(ids) >= min_training_vectors(target, INDEX_PARAMS))
+            return build_index(target if trainable else "flat", vectors, INDEX_PARAMS, ids)
+
+        with self._rebuild_lock:
+            dropped, new_index = self._replace_index(build)
+        print(f"Rebuilt {index_mode(new_index)} index with {new_index.ntotal} vectors, dropped {dropped} dead vectors")
+        self.save()
+
+    def _replace_index(self, build) -> Tuple[int, faiss.Index]:
+        """Swap in build(ids, vectors) of the live vectors, dropping tombstoned chunks.
+        Call with the rebuild lock held. Returns the number of chunks dropped and the new index."""
+        with self.lock:
+            self._own_index()
+            with self.index_lock.write():  # Can build the IVF direct map
+                ids, vectors = extract_vectors(self.index)
+            live = self.metadata.live(ids)
+            dropped = set(ids[~live].tolist())
+            term_sizes = self.terms.sizes()
+
+        new_index = build(ids[live], vectors[live])
+        new_terms = self.terms.compacted(np.sort(ids[live]).astype(np.int32), term_sizes)
+
+        with self.lock:
+            with self.index_lock.write():
+                added_ids, added_vectors = extract_vectors(self.index, start=len(ids))
+            add_with_ids(new_index, added_vectors, added_ids)
+            self.index = new_index
+            new_terms.catch_up(self.terms, term_sizes)
+            self.terms = new_terms
+            for chunk_id in dropped:
+                self.metadata.pop(chunk_id, None)
+            self.dead_ids -= dropped
+            self._selector = None
+        return len(dropped), new_index
+
+    def stats(self) -> Dict[str, Any]:
+        """Live and dead (tombstoned, not yet compacted) vector counts, the index mode and size of
+        its vector codes, and embedding cache counters"""
+        self.ensure_loaded()
+        with self.lock:
+            live = len(self.metadata) - len(self.dead_ids)
+            return {
+                "total_chunks": live,
+                "total_urls": len(self.url_ids),
+                "live_vectors": live,
+                "dead_vectors": self.index.ntotal - live,
+                "next_id": self.next_id,
+                "index_mode": index_mode(self.index),
+                "bytes_per_vector": vector_bytes(self.index),
+                "embedding_cache": self.embedder.cache.stats(),
+            }
+
+    def _search_params(self) -> Tuple[Any, Optional[np.ndarray]]:
+        """Search parameters that skip tombstoned vectors inside FAISS, and the tombstoned ids
+        (for indexes that cannot skip them in a k-NN search, see knn_search())"""
+        if not self.dead_ids:
+            return None, None
+        if self._selector is None:
+            dead_ids = np.fromiter(self.dead_ids, dtype=np.int64)
+            dead = faiss.IDSelectorBatch(dead_ids)
+            not_dead = faiss.IDSelectorNot(dead)
+            # Keep the selectors alive alongside the parameters that point at them
+            self._selector = (search_parameters(self.index, INDEX_PARAMS, not_dead), dead_ids, not_dead, dead)
+        return self._selector[:2]
     
-    def chunk_text(self, text: str, url: str) -> List[Dict[str, Any]]:
-        """Split text into chunks with metadata"""
-        words = text.split()
-        chunks_data = []
-        
-        for i in range(0, len(words), CHUNK_SIZE - CHUNK_OVERLAP):
-            chunk_words = words[i:i + CHUNK_SIZE]
-            if not chunk_words:
-                continue
-                
-            chunk_text = " ".join(chunk_words)
-            start_pos = i
-            end_pos = i + len(chunk_words) - 1
-            
-            chunks_data.append({
-                "text": chunk_text,
-                "url": url,
-                "position": {
-                    "start": start_pos,
-                    "end": end_pos
-                },
-                "timestamp": datetime.datetime.now().isoformat(),
-                "chunk_id": f"{url.replace('://', '_').replace('/', '_').replace('.', '_')}_{start_pos}"
-            })
-            
-        return chunks_data
+    def chunk_text(self, text: str, url: str) -> Iterator[Dict[str, Any]]:
+        """Split text into chunks with metadata, lazily: sentence-aligned chunks of up to
+        CHUNK_TOKENS tokens overlapping by up to CHUNK_OVERLAP_TOKENS (see chunker.py)"""
+        return iter_chunks(text, url, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
     
     def get_embedding(self, text: str) -> np.ndarray:
-        """Get embedding for text using Ollama's API"""
-        for attempt in range(MAX_RETRIES):
-            try:
-                response = requests.post(
-                    f"{OLLAMA_API_BASE}/embeddings",
-                    json={
-                        "model": EMBEDDING_MODEL,
-                        "prompt": text
-                    }
-                )
-                response.raise_for_status()
-                embedding = response.json().get("embedding")
-                
-                if not embedding:
-                    raise ValueError("No embedding returned from Ollama API")
-                    
-                return np.array(embedding, dtype=np.float32)
-                
-            except Exception as e:
-                print(f"Embedding error (attempt {attempt+1}/{MAX_RETRIES}): {e}")
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(RETRY_DELAY * (attempt + 1))  # Exponential backoff
-                else:
-                    raise
+        """Get embedding for text using Ollama's API, or the embedding cache"""
+        return self.embedder.embed(text)
+    
+    def get_embeddings(self, texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Get embeddings for many texts in batched, concurrent requests.
+        Returns the embeddings and a mask of the rows that succeeded."""
+        return self.embedder.embed_many(texts)
     
     def index_webpage(self, url: str, content: str, title: str = ""):
-        """Index a webpage's content"""
+        """Index a webpage's content, replacing its previous version.
+        Only chunks whose text changed are embedded; removed chunks are tombstoned."""
+        self.ensure_loaded()
         # Check if URL was already processed
-        content_hash = hash(content)
+        content_hash = fingerprint(content)
         
         if url in self.url_cache and self.url_cache[url] == content_hash:
             print(f"URL {url} already indexed and unchanged. Skipping.")
             return
             
-        # Process the webpage content
-        chunks_data = self.chunk_text(content, url)
-        new_embeddings = []
-        new_metadata = []
-        
-        print(f"Processing {len(chunks_data)} chunks from {url}")
-        
-        for i, chunk_data in enumerate(chunks_data):
-            try:
-                # Get embedding for chunk
-                embedding = self.get_embedding(chunk_data["text"])
-                
-                # If this is the first embedding, set dimension
-                if not self.metadata and self.index.ntotal == 0:
-                    self.dimension = len(embedding)
-                    self.index = faiss.IndexFlatL2(self.dimension)
-                
-                # Append to new data
-                new_embeddings.append(embedding)
-                
-                # Add title to metadata
+        # Diff against the chunks already indexed for this URL
+        with self.lock:
+            existing = {}
+            for chunk_id in self.url_ids.get(url, []):
+                meta = self.metadata[chunk_id]
+                existing.setdefault(meta.get("hash") or fingerprint(self.store.text(meta)), []).append(chunk_id)
+
+        reused = {}  # chunk id → refreshed metadata for chunks whose text is unchanged
+        changed = []
+
+        def changed_texts():
+            # Chunks are split as the embedder asks for texts, so embedding starts on the first one
+            for chunk_data in timed_iter("chunk", self.chunk_text(content, url)):
                 chunk_data["title"] = title
-                new_metadata.append(chunk_data)
-                
-                # Sleep to avoid rate limiting
-                if i < len(chunks_data) - 1:
-                    time.sleep(0.1)
-                    
-            except Exception as e:
-                print(f"Error processing chunk {i} from {url}: {e}")
+                ids = existing.get(chunk_data["hash"])
+                if ids:
+                    reused[ids.pop()] = chunk_data
+                else:
+                    changed.append(chunk_data)
+                    yield chunk_data["text"]
+
+        embeddings, ok = self.get_embeddings(changed_texts())
+        retired = [chunk_id for ids in existing.values() for chunk_id in ids]
+        print(f"Processed {len(changed) + len(reused)} chunks from {url} "
+              f"({len(changed)} changed, {len(reused)} unchanged, {len(retired)} removed)")
+        # Tokenized here, outside the lock; the texts move to the text file on append
+        chunk_terms = [tokenize(chunk["text"]) for chunk, good in zip(changed, ok) if good]
         
-        if new_embeddings:
-            # Add to index
-            embeddings_array = np.stack(new_embeddings)
-            self.index.add(embeddings_array)
-            
-            # Update metadata
-            self.metadata.extend(new_metadata)
-            
-            # Update cache
-            self.url_cache[url] = content_hash
-            
-            # Save everything
-            self.save()
-            self.save_cache()
-            
-            print(f"✅ Added {len(new_embeddings)} chunks from {url} to index")
-        else:
+        for i in np.flatnonzero(~ok):
+            print(f"Error processing chunk {i} from {url}: embedding failed")
+
+        new_embeddings = embeddings[ok]
+        new_metadata = [chunk_data for chunk_data, good in zip(changed, ok) if good]
+        # Unchanged chunks keep their vectors, ids and stored texts; only refresh metadata that moved
+        updates = {
+            chunk_id: {**{key: value for key, value in chunk_data.items() if key != "text"},
+                       "id": chunk_id, "text_span": self.metadata[chunk_id]["text_span"]}
+            for chunk_id, chunk_data in reused.items()
+            if self.metadata[chunk_id]["position"] != chunk_data["position"] or self.metadata[chunk_id].get("title") != title
+        }
+        # Record the page hash only once every chunk made it, so a retry re-embeds just the missing ones
+        complete = bool(ok.all())
+
+        if not (new_metadata or updates or retired or complete):
             print(f"⚠️ No chunks were successfully processed from {url}")
+            return
+
+        self._commit(url, new_embeddings, new_metadata, chunk_terms, updates, retired, content_hash if complete else None)
+        print(f"✅ Added {len(new_metadata)} chunks from {url} to index, kept {len(reused)}, retired {len(retired)}")
+    
+    def add_chunks(self, url: str, chunks: List[Dict[str, Any]], embeddings: np.ndarray, content_hash: str = None):
+        """Add already embedded chunks (metadata with "text") of a page this index does not hold yet,
+        e.g. when moving pages between shards. With content_hash the page counts as fully indexed."""
+        self.ensure_loaded()
+        chunks = [{key: value for key, value in chunk.items() if key not in ("id", "text_span", "retired")}
+                  for chunk in chunks]
+        chunk_terms = [tokenize(chunk["text"]) for chunk in chunks]
+        self._commit(url, np.asarray(embeddings, dtype=np.float32), chunks, chunk_terms, {}, [], content_hash)
+    
+    def _commit(self, url: str, new_embeddings: np.ndarray, new_metadata: List[Dict[str, Any]],
+                chunk_terms: List[List[str]], updates: Dict[int, Dict[str, Any]], retired: List[int],
+                content_hash: str = None):
+        """Log and publish a page's new chunks, metadata updates and retired chunks.
+        content_hash is recorded for the URL only when every chunk made it."""
+        complete = content_hash is not None
+        with timed("add"), self.lock:
+            # If these are the first embeddings, set dimension
+            if new_metadata and self.index.ntotal == 0:
+                self.dimension = new_embeddings.shape[1]
+                self.index = self.create_index(self.dimension)
+                self.store.set_dimension(self.dimension)
+
+            new_ids = np.arange(self.next_id, self.next_id + len(new_metadata), dtype=np.int64)
+            for chunk_id, chunk_data in zip(new_ids.tolist(), new_metadata):
+                chunk_data["id"] = chunk_id
+
+            # Persist to the append log first, then publish in memory
+            self.store.append(new_embeddings, new_metadata, updates=updates, retired=retired,
+                              url=url if complete else None, content_hash=content_hash)
+            self.next_id += len(new_metadata)
+            if new_metadata:
+                self._own_index()
+                with self.index_lock.write():
+                    add_with_ids(self.index, new_embeddings, new_ids)
+            for chunk_data, terms in zip(new_metadata, chunk_terms):
+                self.metadata[chunk_data["id"]] = chunk_data
+                self.terms.add(chunk_data["id"], terms)
+            self.metadata.update(updates)
+            self._retire(retired)
+            live = set(self.url_ids.get(url, [])) - set(retired)
+            self.url_ids[url] = sorted(live) + new_ids.tolist()
+            self._set_chunk_urls(new_ids.tolist(), url)
+            if complete:
+                self.url_cache[url] = content_hash
+
+            if (self.store.pending >= CHECKPOINT_EVERY or self.needs_compaction()
+                    or can_migrate(self.index, INDEX_MODE, INDEX_PARAMS)):
+                self._checkpoint_due.set()
     
     def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Search the index for relevant content with URL deduplication and relevance filtering"""
-        if not self.metadata or self.index.ntotal == 0:
-            return []
+        """Search the index for relevant content with URL deduplication and relevance filtering.
+        In hybrid mode the BM25 and vector rankings are fused with reciprocal-rank fusion, and
+        keyword queries are answered from the term index without embedding the query."""
+        return self.search_many([query], k)[0]
+    
+    def search_many(self, queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Search for several queries at once, returning one result list per query (see search()).
+        The queries that need vector search are embedded together and looked up with a single
+        matrix search, instead of one embedding call and one FAISS call per query."""
+        self.ensure_loaded()
+        results = [[] for _ in queries]
+        if not queries or not self.metadata or self.index.ntotal == 0:
+            return results
             
         try:
-            # Get query embedding
-            query_embedding = self.get_embedding(query)
-            query_embedding = query_embedding.reshape(1, -1)
+            with self.lock:
+                live = len(self.metadata) - len(self.dead_ids)
+            if live == 0:
+                return results
             
-            # Search index - get more results than needed so we can filter
-            max_results = min(k * 5, len(self.metadata))
-            distances, indices = self.index.search(query_embedding, k=max_results)
+            # Get more results than needed so we can filter
+            metric = self.metric
+            max_results = self.max_candidates(k, live)
+            query_terms = [tokenize(query) for query in queries]
+            lexical = [self.lexical_candidates(terms, max_results) for terms in query_terms]
+            with self.lock:
+                keyword = [self._is_keyword_query(terms) for terms in query_terms]
             
-            # Prepare results with URL deduplication and relevance threshold
-            results = []
-            seen_urls = set()
+            vector = {}  # position → vector candidates of the queries not answered by BM25 alone
+            positions = [position for position in range(len(queries))
+                         if SEARCH_MODE != "lexical" and not (keyword[position] and len(lexical[position][0]))]
+            if positions:
+                embeddings, ok = self.embed_queries([queries[position] for position in positions])
+                searched = [position for position, good in zip(positions, ok) if good]
+                found = self.vector_candidates(embeddings[ok], max_results, [query_terms[p] for p in searched])
+                vector = dict(zip(searched, found))
+                for position in positions:
+                    vector.setdefault(position, EMPTY_CANDIDATES)  # Embedding failed: BM25 only
             
-            # Convert distances to similarity scores (closer to 1.0 is better)
-            # L2 distance needs to be converted to similarity
-            max_dist = float(distances[0].max()) if distances[0].size > 0 else 1.0
-            min_dist = float(distances[0].min()) if distances[0].size > 0 else 0.0
-            dist_range = max(0.001, max_dist - min_dist)  # Avoid division by zero
-            
-            for i, idx in enumerate(indices[0]):
-                if idx >= len(self.metadata) or idx < 0:  # Guard against out-of-bounds
-                    continue
-                
-                # Calculate normalized similarity score (0 to 1)
-                # For L2 distance, smaller is better, so we invert it
-                dist = float(distances[0][i])
-                similarity = 1.0 - ((dist - min_dist) / dist_range)
-                
-                # Skip low relevance results
-                if similarity < 0.6:  # Threshold for relevance
-                    continue
-                
-                result = self.metadata[idx].copy()
-                result["score"] = similarity
-                result["distance"] = dist  # Keep the original distance too
-                
-                # Check keyword relevance as additional filter
-                text_lower = result["text"].lower()
-                query_terms = query.lower().split()
-                term_matches = sum(1 for term in query_terms if term in text_lower)
-                
-                # Skip if no query terms match at all
-                if len(query_terms) >= 2 and term_matches == 0:
-                    continue
-                
-                # Only include this result if we haven't seen this URL before
-                url = result.get("url", "")
-                if url and url not in seen_urls:
-                    seen_urls.add(url)
-                    results.append(result)
-                
-                # Stop once we have enough unique URLs
-                if len(results) >= k:
-                    break
-            
-            # Double check we have some results even if they're slightly below threshold
-            if not results and distances.size > 0:
-                # Try again with a lower threshold
-                for i, idx in enumerate(indices[0][:min(5, indices[0].size)]):
-                    if idx >= len(self.metadata) or idx < 0:
-                        continue
-                    
-                    dist = float(distances[0][i])
-                    similarity = 1.0 - ((dist - min_dist) / dist_range)
-                    
-                    result = self.metadata[idx].copy()
-                    result["score"] = similarity
-                    
-                    url = result.get("url", "")
-                    if url and url not in seen_urls:
-                        seen_urls.add(url)
-                        results.append(result)
-                        
-                    if len(results) >= 2:  # Just get a couple of results in this case
-                        break
-                    
+            with timed("post_filter"):
+                for position in range(len(queries)):
+                    results[position] = self._results(*rank_query(lexical[position], vector.get(position), k, metric))
             return results
             
         except Exception as e:
             print(f"Search error: {e}")
+            return [[] for _ in queries]
+    
+    def term_statistics(self, terms: Iterable[str]) -> Tuple[int, int, Dict[str, int]]:
+        """Live chunk count, their total token count and each term's document frequency,
+        which sharded search sums into collection-wide BM25 statistics"""
+        self.ensure_loaded()
+        with self.lock:
+            return (self.terms.doc_count, self.terms.total_length,
+                    {term: self.terms.document_frequency(term) for term in set(terms)})
+    
+    def lexical_candidates(self, query_terms: List[str], max_results: int,
+                           collection: Tuple[int, int, Dict[str, int]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Best live chunks by BM25, best first: ids, scores and URL numbers.
+        collection overrides the index's own BM25 statistics (see term_statistics())."""
+        if SEARCH_MODE == "vector" or not query_terms:
+            return EMPTY_CANDIDATES[:3]
+        with timed("bm25"), self.lock:
+            ids, bm25 = self.terms.bm25(query_terms, collection)
+            alive = self.chunk_urls[ids] >= 0
+            ids, bm25 = top_n(ids[alive], bm25[alive], max_results)
+            return ids, bm25, self.chunk_urls[ids]
+    
+    def vector_candidates(self, embeddings: np.ndarray, max_results: int,
+                          query_terms: List[List[str]]) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Nearest chunks to each query embedding, in one matrix search: ids, distances (L2, or
+        1 - cosine similarity), URL numbers (negative for chunks deleted meanwhile) and the
+        keyword filter of vector mode. A cosine index is range searched: only chunks above
+        MIN_SIMILARITY come back, or the closest few when none is."""
+        if not len(embeddings):
             return []
+        with self.lock:
+            index = self.index
+            params, dead = self._search_params()
+        # Tombstoned chunks are excluded inside FAISS through the search parameters
+        with timed("search"), self.index_lock.read():
+            if index_metric(index) == "cosine":
+                rows = threshold_search(index, embeddings, MIN_SIMILARITY, max_results, FALLBACK_CANDIDATES,
+                                        params, dead)
+            else:
+                rows = zip(*knn_search(index, embeddings, max_results, params, dead))
+        candidates = []
+        with self.lock:
+            for (row_distances, row_indices), terms in zip(rows, query_terms):
+                found = row_indices >= 0
+                ids = row_indices[found]
+                if SEARCH_MODE == "vector" and len(terms) >= 2:
+                    # Keyword relevance as additional filter: at least one query term must occur
+                    matches = self.terms.contains_any(ids, terms)
+                else:
+                    matches = np.ones(len(ids), dtype=bool)
+                candidates.append((ids, row_distances[found], self.chunk_urls[ids], matches))
+        return candidates
+    
+    @property
+    def metric(self) -> str:
+        """Metric of the current index, which decides how distances are scored (see rank_query())"""
+        return index_metric(self.index)
+
+    def max_candidates(self, k: int, live: int) -> int:
+        """Candidates to fetch from each ranking for k results"""
+        return min(k * CANDIDATES_PER_RESULT[self.metric], live)
+
+    def embed_queries(self, queries: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Query embeddings and a mask of the ones that succeeded; up to a batch goes in one request"""
+        if len(queries) > EMBED_BATCH_SIZE:
+            return self.get_embeddings(queries)
+        try:
+            return self.embedder.embed_batch(list(queries)), np.ones(len(queries), dtype=bool)
+        except Exception as e:
+            print(f"Query embedding error: {e}")
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros(len(queries), dtype=bool)
+    
+    def _is_keyword_query(self, query_terms: List[str]) -> bool:
+        if len(query_terms) > KEYWORD_QUERY_MAX_TERMS:
+            return False
+        return is_keyword_query(query_terms, self.terms.doc_count,
+                                {term: self.terms.document_frequency(term) for term in query_terms})
+    
+    def _results(self, ids: np.ndarray, scores: np.ndarray, distance: Dict[int, float] = None,
+                 bm25: Dict[int, float] = None) -> List[Dict[str, Any]]:
+        """Result dicts for the chosen chunks, with their text read from the text file"""
+        with self.lock:
+            metas = [self.metadata.get(chunk_id) for chunk_id in ids.tolist()]
+            # Under the lock: a text compaction moves the spans to another file
+            texts = [self.store.text(meta) if meta is not None else None for meta in metas]
+        results = []
+        for chunk_id, score, meta, text in zip(ids.tolist(), scores.tolist(), metas, texts):
+            if meta is None:  # Compacted away since the search started
+                continue
+            result = meta
+            result["text"] = text
+            del result["text_span"]
+            result["score"] = score
+            if distance and chunk_id in distance:
+                result["distance"] = distance[chunk_id]  # Keep the original distance too
+            if bm25 and chunk_id in bm25:
+                result["bm25"] = bm25[chunk_id]
+            results.append(result)
+        return results
     
     def save(self):
-        """Save index and metadata"""
-        # Save metadata
-        with open(METADATA_FILE, 'w') as f:
-            json.dump(self.metadata, f)
-            
-        # Save index
-        faiss.write_index(self.index, str(INDEX_FILE))
-        
-        print(f"Saved index with {len(self.metadata)} chunks")
+        """Checkpoint index, metadata and URL cache, folding in the append log.
+        Dead chunk texts are dropped from the text file when they make up enough of it;
+        that checkpoint blocks indexing until it is written."""
+        self.ensure_loaded()
+        with timed("save"), self._checkpoint_lock, ExitStack() as locked:
+            # Capture a consistent view, then write it without blocking indexing
+            locked.enter_context(self.lock)
+            keep_from = self.store.rotate()
+            dropped_texts = 0
+            if self.needs_text_compaction():
+                # Log records refer to the new text file from now on: keep the lock until it is checkpointed
+                dropped_texts = self.store.compact_texts(self.metadata, keep_from)
+            index_bytes = faiss.serialize_index(self.index).tobytes()
+            metadata = self.metadata.copy(self.next_id)
+            url_cache = dict(self.url_cache)
+            next_id = self.next_id
+            term_sizes = self.terms.sizes()
+            if not dropped_texts:
+                locked.close()
+
+            ids = metadata.ids()
+            keep = ids[metadata.live(ids)].astype(np.int32)
+            terms_bytes = self.terms.to_bytes(keep, term_sizes, next_id)
+            self.store.checkpoint(index_bytes, metadata.to_bytes(), url_cache, next_id, keep_from, terms_bytes)
+
+        if dropped_texts:
+            print(f"Compacted chunk texts: dropped {dropped_texts / 1e6:.1f} MB of deleted chunks")
+        print(f"Saved index with {len(metadata)} chunks")
+
+    def _checkpoint_loop(self):
+        """Background checkpointing: when the log grows large or periodically"""
+        while not self._closing:
+            self._checkpoint_due.wait(timeout=CHECKPOINT_INTERVAL)
+            self._checkpoint_due.clear()
+            if self._closing:
+                break
+            try:
+                migrated = self.migrate_index()
+                compacted = self.compact()
+                if migrated or compacted or self.store.pending:
+                    self.save()
+            except Exception as e:
+                print(f"Checkpoint error: {e}")
+
+    def close(self):
+        """Stop the checkpointer and take a final checkpoint"""
+        if self._closing or not self._loaded:
+            return
+        self._closing = True
+        self._checkpoint_due.set()
+        self._checkpointer.join()
+        if self.store.pending:
+            self.save()
+        self.store.close()
+        if self._owns_embedder:
+            self.embedder.cache.save()
     
-    def get_highlights(self, query: str, text: str, window_size: int = 100) -> List[Dict[str, Any]]:
-        """Get highlighted sections of text based on query"""
+    def get_highlights(self, query: str, text: str, window_size: int = 100, url: str = None) -> List[Dict[str, Any]]:
+        """Get highlighted sections of text based on query.
+        If the page was indexed with this exact content, the chunk embeddings already in the
+        index are reused and windows inside the relevant chunks are ranked by query term
+        overlap. Otherwise all windows are embedded in one batched call, cached per URL."""
         # Get query embedding
         query_embedding = self.get_embedding(query)
         
@@ -295,48 +734,107 @@ class WebPageIndexer:
                     "end": i + len(window_words) - 1
                 }
             })
+        if not windows:
+            return []
         
-        # Get embeddings for windows
-        window_embeddings = []
-        for window in windows:
-            try:
-                window_embedding = self.get_embedding(window["text"])
-                window_embeddings.append(window_embedding)
-            except Exception:
-                # If embedding fails, skip this window
-                window_embeddings.append(None)
+        scores = None
+        if url is not None:
+            similarity = self._stored_window_similarity(url, text, query_embedding, windows)
+            if similarity is not None:
+                query_terms = set(tokenize(query))
+                overlap = np.array([len(query_terms.intersection(tokenize(window["text"]))) / max(1, len(query_terms))
+                                    for window in windows], dtype=np.float32)
+                scores = (1.0 - HIGHLIGHT_LEXICAL_WEIGHT) * similarity + HIGHLIGHT_LEXICAL_WEIGHT * overlap
+        
+        if scores is None:
+            # Get embeddings for windows; rows whose embedding failed are skipped
+            embeddings, ok = self._window_embeddings(url, text, windows, window_size)
+            similarity = np.full(len(windows), -1.0, dtype=np.float32)
+            if ok.any():
+                # Calculate cosine similarity
+                norms = np.linalg.norm(embeddings[ok], axis=1) * np.linalg.norm(query_embedding)
+                similarity[ok] = embeddings[ok] @ query_embedding / np.maximum(norms, 1e-12)
+            scores = similarity
         
-        # Calculate similarity scores
         highlights = []
-        for i, (window, embedding) in enumerate(zip(windows, window_embeddings)):
-            if embedding is None:
-                continue
-                
-            # Calculate cosine similarity
-            similarity = np.dot(query_embedding, embedding) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(embedding)
-            )
-            
-            if similarity > 0.5:  # Threshold for relevance
-                highlight = window.copy()
-                highlight["score"] = float(similarity)
-                highlights.append(highlight)
+        for i in np.flatnonzero(similarity > HIGHLIGHT_THRESHOLD):  # Threshold for relevance
+            highlight = windows[i].copy()
+            highlight["score"] = float(scores[i])
+            highlights.append(highlight)
         
         # Sort by similarity score
         highlights.sort(key=lambda x: x["score"], reverse=True)
         
         return highlights[:5]  # Return top 5 highlights
+    
+    def _stored_window_similarity(self, url: str, text: str, query_embedding: np.ndarray,
+                                  windows: List[Dict[str, Any]]) -> np.ndarray:
+        """Cosine similarity of each window, taken from the stored embedding of the best chunk
+        covering at least half of it. None unless the indexed version of the page is this text."""
+        self.ensure_loaded()
+        with self.lock:
+            if self.url_cache.get(url) != fingerprint(text) or not self.url_ids.get(url):
+                return None
+            index = self.index
+            ids = list(self.url_ids[url])
+            spans = self.metadata.positions(ids)
+        try:
+            with self.index_lock.read():
+                vectors = index.reconstruct_batch(np.array(ids, dtype=np.int64))
+        except RuntimeError:
+            return None  # IVF index saved without a direct map
+        
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_embedding)
+        chunk_similarity = vectors @ query_embedding / np.maximum(norms, 1e-12)
+        
+        starts = np.array([window["position"]["start"] for window in windows])
+        ends = np.array([window["position"]["end"] for window in windows])
+        overlap = np.minimum(ends[:, None], spans[None, :, 1]) - np.maximum(starts[:, None], spans[None, :, 0]) + 1
+        covers = overlap * 2 >= (ends - starts + 1)[:, None]
+        return np.where(covers, chunk_similarity[None, :], -1.0).max(axis=1)
+    
+    def _window_embeddings(self, url: str, text: str, windows: List[Dict[str, Any]],
+                           window_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Window embeddings for a page, batched and kept in a small per-URL cache"""
+        key = (url, fingerprint(text), window_size)
+        with self._window_lock:
+            cached = self._window_cache.get(key)
+            if cached is not None:
+                self._window_cache.move_to_end(key)
+                return cached
+        
+        embeddings, ok = self.get_embeddings(window["text"] for window in windows)
+        if ok.all():
+            with self._window_lock:
+                # One entry per page: a new version replaces the old one
+                for stale in [cached_key for cached_key in self._window_cache if cached_key[0] == url]:
+                    del self._window_cache[stale]
+                self._window_cache[key] = (embeddings, ok)
+                while len(self._window_cache) > HIGHLIGHT_CACHE_PAGES:
+                    self._window_cache.popitem(last=False)
+        return embeddings, ok
+
 
+def create_indexer():
+    """A WebPageIndexer over INDEX_DIR, or with SHARD_COUNT > 1 a ShardedIndexer whose
+    shards live under INDEX_DIR/shards and share one embedder"""
+    if SHARD_COUNT <= 1:
+        return WebPageIndexer()
+    from sharded_indexer import ShardedIndexer
+    embedder = create_embedder()
+    return ShardedIndexer(INDEX_DIR, SHARD_COUNT, lambda path: WebPageIndexer(path, embedder), embedder,
+                          is_keyword_query, by=SHARD_BY, search_mode=SEARCH_MODE)
 
 # Create an instance that can be imported by other modules
-indexer = WebPageIndexer()
+indexer = create_indexer()
 
 # Example usage
 if __name__ == "__main__":
+    indexer.ensure_loaded()
     print("Web Page Indexer initialized")
     
     # Example search
-    if indexer.metadata:
+    if indexer.stats()["live_vectors"]:
         results = indexer.search("example query", k=3)
         print("\nSearch Results:")
         for i, result in enumerate(results):
@@ -4,6 +4,7 @@ import asyncio
 import yaml
 from core.loop import AgentLoop
 from core.session import MultiMCP
+from modules.model_manager import ModelManager
 
 def log(stage: str, msg: str):
     """Simple timestamped console logger."""
@@ -37,6 +38,9 @@ async def main():
     except Exception as e:
         log("fatal", f"Agent failed: {e}")
         raise
+    finally:
+        await multi_mcp.shutdown()  # Stop the pooled server processes
+        await ModelManager.aclose()  # Close the pooled LLM connections
 
 
 if __name__ == "__main__":
@@ -21,13 +21,20 @@
 
 # core/context.py
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Awaitable, Callable, Tuple
 from modules.memory import MemoryManager, MemoryItem
 from pathlib import Path
+import asyncio
+import json
 import yaml
 import time
 import uuid
 
+LLM_CALL_BUDGET = 12  # LLM calls one task may make (perception and planning)
+TOKEN_BUDGET = 60_000  # Estimated prompt + output tokens one task may spend
+EXPLORE_CANDIDATES = 3  # Plans the explore_all strategy drafts concurrently per step
+CHARS_PER_TOKEN = 4  # Rough estimate; the model clients do not report token counts
+
 class AgentProfile:
     def __init__(self, config_path: str = "config/profiles.yaml"):
         with open(config_path, "r") as f:
@@ -38,6 +45,10 @@ class AgentProfile:
         self.description = config["agent"]["description"]
         self.strategy = config["strategy"]["type"]
         self.max_steps = config["strategy"]["max_steps"]
+        self.explore_candidates = config["strategy"].get("explore_candidates", EXPLORE_CANDIDATES)
+        self.explore_models = config["strategy"].get("explore_models") or [config["llm"]["text_generation"]]
+        self.llm_call_budget = config["strategy"].get("llm_call_budget", LLM_CALL_BUDGET)
+        self.token_budget = config["strategy"].get("token_budget", TOKEN_BUDGET)
 
         self.memory_config = config["memory"]
         self.llm_config = config["llm"]
@@ -52,6 +63,32 @@ class ToolCallTrace:
         self.arguments = arguments
         self.result = result
 
+class TaskBudget:
+    """LLM calls and estimated tokens one task may spend; strategies size their work by what is left"""
+    def __init__(self, max_llm_calls: int, max_tokens: int):
+        self.max_llm_calls = max_llm_calls
+        self.max_tokens = max_tokens
+        self.llm_calls = 0
+        self.tokens = 0
+
+    def charge(self, prompt: str, output: str = ""):
+        self.llm_calls += 1
+        self.tokens += (len(prompt) + len(output)) // CHARS_PER_TOKEN
+
+    def remaining_calls(self) -> int:
+        if self.tokens >= self.max_tokens:
+            return 0
+        return max(self.max_llm_calls - self.llm_calls, 0)
+
+    def exhausted(self) -> bool:
+        return self.remaining_calls() == 0
+
+    def __repr__(self):
+        return f"<TaskBudget calls={self.llm_calls}/{self.max_llm_calls}, tokens~{self.tokens}/{self.max_tokens}>"
+
+def call_key(tool_name: str, arguments: Dict[str, Any]) -> Tuple[str, str]:
+    return tool_name, json.dumps(arguments, sort_keys=True, default=str)
+
 class AgentContext:
     def __init__(self, user_input: str, profile: Optional[AgentProfile] = None):
         self.user_input = user_input
@@ -65,6 +102,8 @@ class AgentContext:
         self.memory_trace: List[MemoryItem] = []
         self.tool_calls: List[ToolCallTrace] = []
         self.final_answer: Optional[str] = None
+        self.budget = TaskBudget(self.agent_profile.llm_call_budget, self.agent_profile.token_budget)
+        self.speculative: Dict[Tuple[str, str], asyncio.Task] = {}
 
     def add_tool_trace(self, name: str, args: Dict[str, Any], result: Any):
         trace = ToolCallTrace(name, args, result)
@@ -74,5 +113,25 @@ class AgentContext:
         self.memory_trace.append(item)
         self.memory.add(item)
 
+    def called(self, name: str, args: Dict[str, Any]) -> bool:
+        return any(call_key(t.tool_name, t.arguments) == call_key(name, args) for t in self.tool_calls)
+
+    def speculate(self, name: str, args: Dict[str, Any], start: Callable[[str, Dict[str, Any]], Awaitable[Any]]):
+        """Start a tool call ahead of the plan that may need it, unless it already ran or is running"""
+        key = call_key(name, args)
+        if key not in self.speculative and not self.called(name, args):
+            self.speculative[key] = asyncio.create_task(start(name, args))
+
+    def take_speculative(self, name: str, args: Dict[str, Any]) -> Optional[asyncio.Task]:
+        return self.speculative.pop(call_key(name, args), None)
+
+    def cancel_speculation(self):
+        for task in self.speculative.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # Retrieved, so an unused failure is not reported at exit
+        self.speculative.clear()
+
     def __repr__(self):
         return f"<AgentContext step={self.step}, session_id={self.session_id}>"
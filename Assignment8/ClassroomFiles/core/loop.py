@@ -5,7 +5,7 @@ from core.context import AgentContext
 from core.session import MultiMCP
 from core.strategy import decide_next_action
 from modules.perception import extract_perception, PerceptionResult
-from modules.action import ToolCallResult, parse_function_call
+from modules.action import ToolCallResult, parse_function_calls
 from modules.memory import MemoryItem
 import json
 
@@ -23,7 +23,33 @@ class AgentLoop:
         parameters = getattr(tool, "parameters", {})
         return list(parameters.keys()) == ["input"]
 
-    
+    async def execute(self, tool_name: str, arguments: dict) -> ToolCallResult:
+        """Runs one tool call through MultiMCP and extracts its text result."""
+        if self.tool_expects_input(tool_name):
+            tool_input = {'input': arguments} if not (isinstance(arguments, dict) and 'input' in arguments) else arguments
+        else:
+            tool_input = arguments
+
+        response = await self.mcp.call_tool(tool_name, tool_input)
+
+        # ✅ Safe TextContent parsing
+        raw = getattr(response.content, 'text', str(response.content))
+        try:
+            result_obj = json.loads(raw) if raw.strip().startswith("{") else raw
+        except json.JSONDecodeError:
+            result_obj = raw
+
+        result_str = result_obj.get("markdown") if isinstance(result_obj, dict) else str(result_obj)
+        return ToolCallResult(tool_name=tool_name, arguments=arguments, result=result_str, raw_response=response)
+
+    async def dispatch(self, tool_name: str, arguments: dict) -> ToolCallResult:
+        """Runs a planned call, reusing its result if the strategy already started it speculatively."""
+        task = self.context.take_speculative(tool_name, arguments)
+        if task is not None:
+            print(f"[action] {tool_name} was started speculatively")
+            return await task
+        return await self.execute(tool_name, arguments)
+
 
     async def run(self) -> str:
         print(f"[agent] Starting session: {self.context.session_id}")
@@ -36,8 +62,12 @@ class AgentLoop:
                 self.context.step = step
                 print(f"[loop] Step {step + 1} of {max_steps}")
 
+                if self.context.budget.exhausted():
+                    print(f"[loop] ⚠️ LLM budget exhausted: {self.context.budget}")
+                    break
+
                 # 🧠 Perception
-                perception_raw = await extract_perception(query)
+                perception_raw = await extract_perception(query, budget=self.context.budget)
 
 
                 # ✅ Exit cleanly on FINAL_ANSWER
@@ -51,7 +81,7 @@ class AgentLoop:
                         break
 
                     # Detect LLM echoing the prompt
-                    if "Your last tool produced this result" in pr_str or "Original user task:" in pr_str:
+                    if "Your last tool" in pr_str or "Original user task:" in pr_str:
                         print("[perception] ⚠️ LLM likely echoed prompt. No actionable plan.")
                         self.context.final_answer = "FINAL_ANSWER: [no result]"
                         break
@@ -95,7 +125,8 @@ class AgentLoop:
                     context=self.context,
                     perception=perception,
                     memory_items=retrieved,
-                    all_tools=self.tools
+                    all_tools=self.tools,
+                    execute=self.execute
                 )
                 print(f"[plan] {plan}")
 
@@ -109,44 +140,59 @@ class AgentLoop:
                     break
 
 
-                # ⚙️ Tool Execution
+                # ⚙️ Tool Execution (independent calls of one plan run concurrently)
                 try:
-                    tool_name, arguments = parse_function_call(plan)
+                    calls = parse_function_calls(plan)
+                    outcomes = await asyncio.gather(
+                        *(self.dispatch(tool_name, arguments) for tool_name, arguments in calls),
+                        return_exceptions=True
+                    )
 
-                    if self.tool_expects_input(tool_name):
-                        tool_input = {'input': arguments} if not (isinstance(arguments, dict) and 'input' in arguments) else arguments
+                    # A call's CancelledError is its own failure, unless the loop itself is being cancelled
+                    for outcome in outcomes:
+                        if isinstance(outcome, asyncio.CancelledError) and asyncio.current_task().cancelling():
+                            raise outcome
+
+                    results = []
+                    for (tool_name, arguments), outcome in zip(calls, outcomes):
+                        if isinstance(outcome, BaseException):
+                            print(f"[error] {tool_name} failed: {outcome}")
+                            result_str = f"[error] {outcome}"
+                        else:
+                            result_str = outcome.result
+                            print(f"[action] {tool_name} → {result_str}")
+                        self.context.add_tool_trace(tool_name, arguments, result_str)
+                        results.append((tool_name, arguments, result_str))
+
+                    if all(isinstance(outcome, BaseException) for outcome in outcomes):
+                        first = outcomes[0]
+                        raise first if isinstance(first, Exception) else RuntimeError(f"{calls[0][0]} was cancelled")
+
+                    # 🧠 Add memory, once the whole batch is back
+                    for tool_name, arguments, result_str in results:
+                        memory_item = MemoryItem(
+                            text=f"{tool_name}({arguments}) → {result_str}",
+                            type="tool_output",
+                            tool_name=tool_name,
+                            user_query=query,
+                            tags=[tool_name],
+                            session_id=self.context.session_id
+                        )
+                        self.context.add_memory(memory_item)
+
+                    if len(results) == 1:
+                        heading, result_text = "Your last tool produced this result", results[0][2]
                     else:
-                        tool_input = arguments
-
-                    response = await self.mcp.call_tool(tool_name, tool_input)
-
-                    # ✅ Safe TextContent parsing
-                    raw = getattr(response.content, 'text', str(response.content))
-                    try:
-                        result_obj = json.loads(raw) if raw.strip().startswith("{") else raw
-                    except json.JSONDecodeError:
-                        result_obj = raw
-
-                    result_str = result_obj.get("markdown") if isinstance(result_obj, dict) else str(result_obj)
-                    print(f"[action] {tool_name} → {result_str}")
-
-                    # 🧠 Add memory
-                    memory_item = MemoryItem(
-                        text=f"{tool_name}({arguments}) → {result_str}",
-                        type="tool_output",
-                        tool_name=tool_name,
-                        user_query=query,
-                        tags=[tool_name],
-                        session_id=self.context.session_id
-                    )
-                    self.context.add_memory(memory_item)
+                        heading = "Your last tool calls produced these results"
+                        result_text = "\n\n".join(f"{tool_name}({arguments}) → {result_str}"
+                                                   for tool_name, arguments, result_str in results)
 
                     # 🔁 Next query
                     query = f"""Original user task: {self.context.user_input}
 
-    Your last tool produced this result:
+    {heading}:
 
-    {result_str}
+    {result_text}
 
     If this fully answers the task, return:
     FINAL_ANSWER: your answer
@@ -159,6 +205,9 @@ class AgentLoop:
         except Exception as e:
             print(f"[agent] Session failed: {e}")
 
+        finally:
+            self.context.cancel_speculation()
+
         return self.context.final_answer or "FINAL_ANSWER: [no result]"
 
 
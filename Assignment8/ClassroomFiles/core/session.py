@@ -2,9 +2,33 @@
 
 import os
 import sys
+import json
+import time
+import asyncio
+import hashlib
+from pathlib import Path
 from typing import Optional, Any, List, Dict
+
+import anyio
+import mcp.types
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import Tool
+
+SESSION_START_TIMEOUT = 60.0  # Seconds to spawn a server and finish the initialize handshake
+SESSION_STOP_TIMEOUT = 5.0  # Seconds to wait for a server to exit before killing its session task
+SESSION_IDLE_TIMEOUT = 300.0  # Seconds without calls before a server process is stopped
+IDLE_CHECK_INTERVAL = 30.0
+CALL_TIMEOUT = 120.0  # Seconds a tool call may take
+MAX_IN_FLIGHT_CALLS = 4  # Concurrent tool calls per server
+HEALTH_CHECK_AFTER = 30.0  # A session unused this long is pinged before it is reused
+HEALTH_CHECK_TIMEOUT = 5.0
+# McpError code newer SDKs give pending requests when the connection closes; older ones (1.6) have none
+CONNECTION_CLOSED = getattr(mcp.types, "CONNECTION_CLOSED", None)
+DISCOVERY_TIMEOUT = 30.0  # Seconds for one server to start and list its tools at startup
+# Tools listed by each server script, keyed by the script's content hash, so warm starts spawn nothing
+TOOL_CATALOG_FILE = Path(os.getenv("MCP_TOOL_CATALOG", ".cache/mcp_tool_catalog.json"))
 
 
 class MCP:
@@ -47,61 +71,282 @@ class MCP:
                 return await session.call_tool(tool_name, arguments=arguments)
 
 
+class ServerSession:
+    """
+    One long-lived stdio session to an MCP server, reused across tool calls.
+    The server process is started on first use, pinged before reuse after sitting idle,
+    restarted when it crashes and stopped after idle_timeout seconds without calls.
+    At most max_in_flight calls run on it at once. A call the connection broke under is
+    only sent again on the new process when the server's config says `idempotent: true`.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.name = config.get("id") or config["script"]
+        self.params = server_params(config)
+        self.idle_timeout = float(config.get("idle_timeout", SESSION_IDLE_TIMEOUT))
+        self.call_timeout = float(config.get("call_timeout", CALL_TIMEOUT))
+        self.idempotent = bool(config.get("idempotent", False))
+        self.session: Optional[ClientSession] = None
+        self.in_flight = 0
+        self.last_used = 0.0
+        self.restarts = 0
+        self._suspect = False  # A call timed out: ping before the next one
+        self._calls = asyncio.Semaphore(int(config.get("max_in_flight", MAX_IN_FLIGHT_CALLS)))
+        self._start_lock = asyncio.Lock()
+        self._owner: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    async def _own(self, ready: asyncio.Future, stop: asyncio.Event):
+        """Hold the server process and session open until stop is set.
+        stdio_client and ClientSession must be exited by the task that entered them, hence a task per session."""
+        try:
+            async with stdio_client(self.params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    ready.set_result(session)
+                    await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"⚠️ MCP server {self.name} exited: {e}")
+        finally:
+            if not ready.done():
+                ready.set_exception(ConnectionError(f"MCP server {self.name} stopped while starting"))
+
+    async def _start(self):
+        print(f"→ Starting MCP server {self.name}: {self.config['script']} in {self.params.cwd}")
+        ready = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._owner = asyncio.create_task(self._own(ready, self._stop), name=f"mcp-session-{self.name}")
+        try:
+            self.session = await asyncio.wait_for(ready, SESSION_START_TIMEOUT)
+        except BaseException:
+            # Possibly cancelled by a caller's timeout: don't wait for the process, it exits in the background
+            self._owner.cancel()
+            self._owner = None
+            raise
+        self.last_used = time.monotonic()
+        self._suspect = False
+
+    async def _stop_owner(self):
+        self.session = None
+        if self._owner is None:
+            return
+        self._stop.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._owner), SESSION_STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._owner.cancel()
+        except Exception:
+            pass
+        self._owner = None
+
+    async def _healthy(self) -> bool:
+        try:
+            await asyncio.wait_for(self.session.send_ping(), HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception as e:
+            print(f"⚠️ MCP server {self.name} failed its health check: {e}")
+            return False
+
+    async def acquire(self) -> ClientSession:
+        """The live session, started, checked or restarted as needed"""
+        async with self._start_lock:
+            if self.session is not None and self._owner.done():
+                print(f"⚠️ MCP server {self.name} is gone, restarting")
+                self.restarts += 1
+                await self._stop_owner()
+            elif (self.session is not None and not self.in_flight
+                  and (self._suspect or time.monotonic() - self.last_used > HEALTH_CHECK_AFTER)):
+                self._suspect = False
+                if not await self._healthy():
+                    self.restarts += 1
+                    await self._stop_owner()
+            if self.session is None:
+                await self._start()
+            return self.session
+
+    async def _discard(self, session: ClientSession):
+        """Drop a session whose connection broke, unless another call already replaced it"""
+        async with self._start_lock:
+            if self.session is session:
+                self.restarts += 1
+                await self._stop_owner()
+
+    async def call_tool(self, tool_name: str, arguments: dict) -> Any:
+        """Call a tool. When the server dies under the call it is restarted, and the call is
+        retried once if the server is idempotent; otherwise the error is raised, since the
+        server may have run the tool before the connection broke."""
+        async with self._calls:
+            for attempt in range(2):
+                session = await self.acquire()
+                self.in_flight += 1
+                try:
+                    return await asyncio.wait_for(session.call_tool(tool_name, arguments), self.call_timeout)
+                except asyncio.TimeoutError:
+                    self._suspect = True  # A dead server never answers: it fails the ping before the next call
+                    raise
+                except Exception as e:
+                    if not is_connection_error(e):
+                        raise
+                    print(f"⚠️ Lost MCP server {self.name} during {tool_name} ({e!r}), restarting")
+                    await self._discard(session)
+                    if attempt or not self.idempotent:
+                        try:
+                            await self.acquire()
+                        except Exception as restart_error:
+                            print(f"⚠️ Could not restart MCP server {self.name}: {restart_error}")
+                        raise
+                finally:
+                    self.in_flight -= 1
+                    self.last_used = time.monotonic()
+
+    async def list_tools(self) -> List[Any]:
+        session = await self.acquire()
+        return (await session.list_tools()).tools
+
+    async def close_if_idle(self):
+        if self.session is not None and not self.in_flight and time.monotonic() - self.last_used > self.idle_timeout:
+            async with self._start_lock:
+                if self.session is not None and not self.in_flight:
+                    print(f"→ Stopping idle MCP server {self.name}")
+                    await self._stop_owner()
+
+    async def close(self):
+        async with self._start_lock:
+            await self._stop_owner()
+
+
+def server_params(config: dict) -> StdioServerParameters:
+    return StdioServerParameters(
+        command=sys.executable,
+        args=[config["script"]],
+        cwd=config.get("cwd", os.getcwd())
+    )
+
+
+def script_path(config: dict) -> Path:
+    return Path(config.get("cwd", os.getcwd())) / config["script"]
+
+
+def script_hash(config: dict) -> Optional[str]:
+    """Content hash of a server's script, or None when it cannot be read"""
+    try:
+        return hashlib.sha256(script_path(config).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+class ToolCatalog:
+    """Persisted tool lists of server scripts, valid while the script's content hash is unchanged"""
+
+    def __init__(self, path: Path = TOOL_CATALOG_FILE):
+        self.path = Path(path)
+        try:
+            self.entries: Dict[str, Dict[str, Any]] = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, config: dict, digest: Optional[str]) -> Optional[List[Tool]]:
+        entry = self.entries.get(str(script_path(config)))
+        if digest is None or not entry or entry.get("hash") != digest:
+            return None
+        try:
+            return [Tool.model_validate(tool) for tool in entry["tools"]]
+        except Exception:
+            return None
+
+    def put(self, config: dict, digest: Optional[str], tools: List[Tool]):
+        if digest is not None:
+            self.entries[str(script_path(config))] = {"hash": digest, "tools": [tool.model_dump(mode="json") for tool in tools]}
+
+    def save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(self.entries, indent=2), encoding="utf-8")
+            os.replace(temporary, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save the MCP tool catalog: {e}")
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Whether a call failed because the server process or its pipes went away"""
+    if isinstance(error, McpError):
+        return CONNECTION_CLOSED is not None and error.error.code == CONNECTION_CLOSED
+    return isinstance(error, (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream,
+                              BrokenPipeError, ConnectionError))
+
+
 class MultiMCP:
     """
-    Stateless version: discovers tools from multiple MCP servers, but reconnects per tool call.
-    Each call_tool() uses a fresh session based on tool-to-server mapping.
+    Discovers tools from multiple MCP servers and routes each call to its server's pooled session.
+    Server processes stay up between calls and steps (see ServerSession); call shutdown() when done.
     """
 
-    def __init__(self, server_configs: List[dict]):
+    def __init__(self, server_configs: List[dict], catalog: Optional[ToolCatalog] = None):
         self.server_configs = server_configs
+        self.catalog = catalog if catalog is not None else ToolCatalog()
         self.tool_map: Dict[str, Dict[str, Any]] = {}  # tool_name → {config, tool}
+        self.sessions: Dict[str, ServerSession] = {}  # server id → its pooled session
+        self._reaper: Optional[asyncio.Task] = None
+
+    def session(self, config: dict) -> ServerSession:
+        name = config.get("id") or config["script"]
+        if name not in self.sessions:
+            self.sessions[name] = ServerSession(config)
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_idle(), name="mcp-idle-reaper")
+        return self.sessions[name]
+
+    async def _reap_idle(self):
+        """Stop servers that have not been called for their idle timeout"""
+        while True:
+            await asyncio.sleep(IDLE_CHECK_INTERVAL)
+            for session in list(self.sessions.values()):
+                await session.close_if_idle()
 
     async def initialize(self):
+        """Discover the tools of all servers concurrently. Servers whose script is unchanged since
+        the cataloged discovery are not started (they start on their first call); a server that
+        fails or exceeds its discovery_timeout is skipped and the others are still used."""
         print("in MultiMCP initialize")
-        for config in self.server_configs:
-            try:
-                params = StdioServerParameters(
-                    command=sys.executable,
-                    args=[config["script"]],
-                    cwd=config.get("cwd", os.getcwd())
-                )
-                print(f"→ Scanning tools from: {config['script']} in {params.cwd}")
-                async with stdio_client(params) as (read, write):
-                    print("Connection established, creating session...")
-                    try:
-                        async with ClientSession(read, write) as session:
-                            print("[agent] Session created, initializing...")
-                            await session.initialize()
-                            print("[agent] MCP session initialized")
-                            tools = await session.list_tools()
-                            print(f"→ Tools received: {[tool.name for tool in tools.tools]}")
-                            for tool in tools.tools:
-                                self.tool_map[tool.name] = {
-                                    "config": config,
-                                    "tool": tool
-                                }
-                    except Exception as se:
-                        print(f"❌ Session error: {se}")
-            except Exception as e:
-                print(f"❌ Error initializing MCP server {config['script']}: {e}")
+        found = await asyncio.gather(*(self._discover(config) for config in self.server_configs))
+        for config, tools in zip(self.server_configs, found):
+            for tool in tools:
+                self.tool_map[tool.name] = {
+                    "config": config,
+                    "tool": tool
+                }
+        self.catalog.save()
+
+    async def _discover(self, config: dict) -> List[Tool]:
+        digest = script_hash(config)
+        tools = self.catalog.get(config, digest)
+        if tools is not None:
+            print(f"→ Tools of {config['script']} from the catalog: {[tool.name for tool in tools]}")
+            return tools
+        session = self.session(config)
+        try:
+            tools = await asyncio.wait_for(session.list_tools(), float(config.get("discovery_timeout", DISCOVERY_TIMEOUT)))
+        except asyncio.TimeoutError:
+            print(f"❌ MCP server {config['script']} did not list its tools in time, skipping it")
+            await session.close()
+            return []
+        except Exception as e:
+            print(f"❌ Error initializing MCP server {config['script']}: {e}")
+            return []
+        print(f"→ Tools received from {config['script']}: {[tool.name for tool in tools]}")
+        self.catalog.put(config, digest, tools)
+        return tools
 
     async def call_tool(self, tool_name: str, arguments: dict) -> Any:
         entry = self.tool_map.get(tool_name)
         if not entry:
             raise ValueError(f"Tool '{tool_name}' not found on any server.")
-
-        config = entry["config"]
-        params = StdioServerParameters(
-            command=sys.executable,
-            args=[config["script"]],
-            cwd=config.get("cwd", os.getcwd())
-        )
-
-        async with stdio_client(params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                return await session.call_tool(tool_name, arguments)
+        return await self.session(entry["config"]).call_tool(tool_name, arguments)
 
     async def list_all_tools(self) -> List[str]:
         return list(self.tool_map.keys())
@@ -110,4 +355,8 @@ class MultiMCP:
         return [entry["tool"] for entry in self.tool_map.values()]
 
     async def shutdown(self):
-        pass  # no persistent sessions to close
\ No newline at end of file
+        """Stop every server process"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await asyncio.gather(*(session.close() for session in self.sessions.values()), return_exceptions=True)
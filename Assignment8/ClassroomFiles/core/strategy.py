@@ -27,8 +27,21 @@ from modules.perception import PerceptionResult
 from modules.memory import MemoryItem
 from modules.tools import summarize_tools, filter_tools_by_hint
 from modules.decision import generate_plan
-from core.context import AgentContext
-from typing import Any
+from modules.action import parse_function_calls
+from modules.model_manager import ModelManager
+from core.context import AgentContext, call_key
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+
+SPECULATIVE_CANDIDATES = 2  # Best-scoring explore_all plans whose tool calls start before the loop asks for them
+
+_models: Dict[str, ModelManager] = {}
+
+
+def model_for(key: str) -> ModelManager:
+    if key not in _models:
+        _models[key] = ModelManager(key)
+    return _models[key]
 
 
 async def decide_next_action(
@@ -37,10 +50,12 @@ async def decide_next_action(
     memory_items: list[MemoryItem],
     all_tools: list[Any],
     last_result: str = "",
+    execute: Optional[Callable[[str, Dict[str, Any]], Awaitable[Any]]] = None,
 ) -> str:
     """
     Decides what to do next using the planning strategy defined in agent profile.
     Wraps around the `generate_plan()` logic with strategy-aware control.
+    `execute` runs a tool call; explore_all uses it to start likely calls speculatively.
     """
 
     strategy = context.agent_profile.strategy
@@ -48,6 +63,13 @@ async def decide_next_action(
     max_steps = context.agent_profile.max_steps
     tool_hint = perception.tool_hint
 
+    if context.budget.exhausted():
+        print(f"[strategy] ⚠️ LLM budget exhausted: {context.budget}")
+        return "FINAL_ANSWER: [unknown]"
+
+    if strategy == "explore_all":
+        return await explore_all(context, perception, memory_items, all_tools, step, max_steps, execute)
+
     # Step 1: Try hint-based filtered tools first
     filtered_tools = filter_tools_by_hint(all_tools, hint=tool_hint)
     filtered_summary = summarize_tools(filtered_tools)
@@ -58,22 +80,122 @@ async def decide_next_action(
         tool_descriptions=filtered_summary,
         step_num=step,
         max_steps=max_steps,
+        budget=context.budget,
     )
 
     # Strategy enforcement
     if strategy == "conservative":
         return plan
 
-    if strategy == "retry_once" and "unknown" in plan.lower():
+    if strategy == "retry_once" and "unknown" in plan.lower() and not context.budget.exhausted():
         # Retry with all tools if hint-based filtering failed
         full_summary = summarize_tools(all_tools)
-        return generate_plan(
+        return await generate_plan(
             perception=perception,
             memory_items=memory_items,
             tool_descriptions=full_summary,
             step_num=step,
             max_steps=max_steps,
+            budget=context.budget,
         )
 
-    # Placeholder for future "explore_all" parallel planner
     return plan
+
+
+async def explore_all(
+    context: AgentContext,
+    perception: PerceptionResult,
+    memory_items: list[MemoryItem],
+    all_tools: list[Any],
+    step: int,
+    max_steps: int,
+    execute: Optional[Callable[[str, Dict[str, Any]], Awaitable[Any]]] = None,
+) -> str:
+    """
+    Drafts several plans concurrently, each from a different tool subset or model,
+    scores them without further LLM calls and commits to the best one.
+    The tool calls of the best SPECULATIVE_CANDIDATES plans are started right away,
+    so a runner-up's calls are ready if a later step needs them.
+    """
+    profile = context.agent_profile
+    count = min(profile.explore_candidates, context.budget.remaining_calls())
+
+    # Hint-filtered and full tool lists, for every configured model
+    summaries = [summarize_tools(filter_tools_by_hint(all_tools, hint=perception.tool_hint)),
+                 summarize_tools(all_tools)]
+    summaries = list(dict.fromkeys(summaries))
+    variants = [(summary, key) for key in profile.explore_models for summary in summaries]
+    variants = [variants[i % len(variants)] for i in range(count)]
+
+    plans = await asyncio.gather(*(
+        generate_plan(
+            perception=perception,
+            memory_items=memory_items,
+            tool_descriptions=summary,
+            step_num=step,
+            max_steps=max_steps,
+            llm=model_for(key),
+            budget=context.budget,
+        )
+        for summary, key in variants
+    ))
+
+    tool_names = {tool.name for tool in all_tools}
+    signatures = [plan_signature(plan) for plan in plans]
+    ranked = sorted(
+        ((score_plan(plan, signatures.count(signature) - 1, perception, context, tool_names), -i, plan)
+         for i, (plan, signature) in enumerate(zip(plans, signatures))),
+        reverse=True
+    )
+    for score, _, plan in ranked:
+        print(f"[strategy] {score:+.1f} {' + '.join(plan.splitlines())}")
+    print(f"[strategy] {context.budget}")
+
+    if execute is not None:
+        top = [plan for score, _, plan in ranked if score > 0 and plan.startswith("FUNCTION_CALL:")]
+        for plan in list(dict.fromkeys(top))[:SPECULATIVE_CANDIDATES]:
+            for tool_name, arguments in parse_function_calls(plan):
+                context.speculate(tool_name, arguments, execute)
+
+    return ranked[0][2]
+
+
+def plan_signature(plan: str) -> Any:
+    if not plan.startswith("FUNCTION_CALL:"):
+        return plan.strip()
+    try:
+        return frozenset(call_key(name, args) for name, args in parse_function_calls(plan))
+    except Exception:
+        return plan.strip()
+
+
+def score_plan(
+    plan: str,
+    agreeing: int,
+    perception: PerceptionResult,
+    context: AgentContext,
+    tool_names: set,
+) -> float:
+    """
+    Cheap heuristic score of one candidate plan, no LLM involved:
+    invalid plans and unknown tools lose, each `agreeing` candidate with the same calls
+    or answer adds a point, the hinted tool helps, and calls that already ran count against it.
+    """
+    if plan.startswith("FINAL_ANSWER:"):
+        if "unknown" in plan.lower():
+            return 0.0
+        # An answer backed by tool results beats another lookup
+        score = 2.0 if context.tool_calls else 0.5
+    else:
+        try:
+            calls = parse_function_calls(plan)
+        except Exception:
+            return -1.0
+        if any(name not in tool_names for name, _ in calls):
+            return -1.0
+        score = 1.0
+        if perception.tool_hint and any(name == perception.tool_hint for name, _ in calls):
+            score += 0.5
+        score -= 2.0 * sum(context.called(name, args) for name, args in calls) / len(calls)
+
+    return score + agreeing
@@ -38,6 +38,18 @@ CHUNK_OVERLAP = 40
 MAX_CHUNK_LENGTH = 512  # characters
 TOP_K = 3  # FAISS top-K matches
 ROOT = Path(__file__).parent.resolve()
+# How the document index stores vectors: none (float32), fp16, sq8 (8-bit scalar) or pq (product
+# quantization, PQ_BYTES bytes per vector). Set it and run `python mcp_server_2.py quantize` to
+# re-encode an existing index; new documents are then added in the same encoding. Indexing only
+# switches to sq8 or pq once min_training_vectors() chunks are indexed to train them on.
+INDEX_QUANTIZATION = os.getenv("INDEX_QUANTIZATION", "none")
+PQ_BYTES = int(os.getenv("INDEX_PQ_BYTES", "192"))  # Sub-quantizers of 8 bits; must divide the dimension
+PQ_NBITS = 8
+QUANTIZERS = {"none": "Flat", "fp16": "SQfp16", "sq8": "SQ8", "pq": "PQ{pq_bytes}x{pq_nbits}"}
+# Training sizes as in Assignment7's index_factory.py: k-means in FAISS wants this many points per centroid...
+MIN_POINTS_PER_CENTROID = 39
+# ...and SQ8 learns each dimension's value range from its training vectors, clipping later ones outside it
+MIN_SQ8_TRAINING = 1000
 
 
 def get_embedding(text: str) -> np.ndarray:
@@ -372,6 +384,10 @@ def process_documents():
                     dim = len(embeddings_for_file[0])
                     index = faiss.IndexFlatL2(dim)
                 index.add(np.stack(embeddings_for_file))
+                if index_quantization(index) != INDEX_QUANTIZATION and index.ntotal >= max(
+                        min_training_vectors(INDEX_QUANTIZATION), 1):
+                    # Trained on what is indexed so far; later documents are encoded with it
+                    index = quantized_index(index.reconstruct_n(0, index.ntotal), INDEX_QUANTIZATION)
                 metadata.extend(new_metadata)
                 CACHE_META[file.name] = fhash
 
@@ -386,6 +402,76 @@ def process_documents():
 
 
 
+def index_quantization(index) -> str:
+    """The INDEX_QUANTIZATION value an index was built with"""
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "pq" if isinstance(index, faiss.IndexPQ) else "none"
+
+
+def min_training_vectors(mode: str) -> int:
+    """Number of vectors an index in this encoding should be trained on"""
+    if mode == "pq":
+        return 2 ** PQ_NBITS * MIN_POINTS_PER_CENTROID
+    if mode == "sq8":
+        return MIN_SQ8_TRAINING
+    return 0
+
+
+def can_train(mode: str, count: int) -> bool:
+    """Whether count vectors can train the encoding at all, if not as well as
+    min_training_vectors() of them: k-means needs a point per centroid, SQ8 a value range"""
+    return count >= {"pq": 2 ** PQ_NBITS, "sq8": 1}.get(mode, 0)
+
+
+def quantized_index(vectors: np.ndarray, mode: str):
+    """L2 index in the given encoding, trained on and holding the vectors, in their order"""
+    if mode not in QUANTIZERS:
+        raise ValueError(f"Unknown INDEX_QUANTIZATION '{mode}', expected one of {list(QUANTIZERS)}")
+    needed = min_training_vectors(mode)
+    if not can_train(mode, len(vectors)):
+        raise ValueError(f"{mode} cannot be trained on {len(vectors)} vectors, {needed} are recommended")
+    if len(vectors) < needed:
+        mcp_log("WARN", f"Training {mode} on {len(vectors)} vectors, {needed} are recommended; recall will suffer")
+    index = faiss.index_factory(vectors.shape[1], QUANTIZERS[mode].format(pq_bytes=PQ_BYTES, pq_nbits=PQ_NBITS))
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def quantize_index(mode: str = INDEX_QUANTIZATION, k: int = 5) -> dict:
+    """Re-encode the saved document index offline, keeping the vector order metadata.json refers to.
+    Reports the size before and after, and recall@k against exact search over the stored vectors
+    (queried with the vectors themselves). Vectors read back from sq8 and pq are approximations."""
+    index_file = ROOT / "faiss_index" / "index.bin"
+    index = faiss.read_index(str(index_file))
+    source = index_quantization(index)
+    if source in ("sq8", "pq"):
+        mcp_log("WARN", f"Re-encoding approximate vectors from a {source} index")
+    vectors = index.reconstruct_n(0, index.ntotal)
+    quantized = quantized_index(vectors, mode)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    queries = vectors[np.random.default_rng(0).permutation(len(vectors))[:500]]
+    k = min(k, len(vectors))
+    _, truth = exact.search(queries, k)
+    _, found = quantized.search(queries, k)
+    report = {
+        "from": source,
+        "to": mode,
+        "vectors": int(index.ntotal),
+        "bytes_per_vector": int(quantized.sa_code_size()),
+        "mb_before": faiss.serialize_index(index).nbytes / 1e6,
+        "mb_after": faiss.serialize_index(quantized).nbytes / 1e6,
+        f"recall@{k}": sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist())) / truth.size,
+    }
+    faiss.write_index(quantized, str(index_file))
+    mcp_log("SAVE", f"Re-encoded index: {report}")
+    return report
+
+
 def ensure_faiss_ready():
     from pathlib import Path
     index_path = ROOT / "faiss_index" / "index.bin"
@@ -402,6 +488,9 @@ if __name__ == "__main__":
 
     if len(sys.argv) > 1 and sys.argv[1] == "dev":
         mcp.run() # Run without transport for dev server
+    elif len(sys.argv) > 1 and sys.argv[1] == "quantize":
+        # python mcp_server_2.py quantize [none|fp16|sq8|pq]
+        print(json.dumps(quantize_index(sys.argv[2] if len(sys.argv) > 2 else INDEX_QUANTIZATION), indent=2))
     else:
         # Start the server in a separate thread
         import threading
@@ -11,6 +11,16 @@ from datetime import datetime, timedelta
 import time
 import re
 
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # lxml comes with trafilatura; BeautifulSoup is the fallback
+    lxml = None
+
+# Elements dropped before extracting page text
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "nav", "header", "footer"]
+MAX_CONTENT_CHARS = 8000
+
 
 @dataclass
 class SearchResult:
@@ -145,6 +155,29 @@ class DuckDuckGoSearcher:
             return []
 
 
+def extract_page_text(html: str) -> str:
+    """Visible text of a page without scripts, styles and navigation.
+    Parses with lxml (C) when available, else with BeautifulSoup's html.parser."""
+    if lxml is not None:
+        try:
+            # Bytes, so pages with an XML encoding declaration parse too
+            root = lxml.html.document_fromstring(html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+        except etree.ParserError:
+            return ""
+        # Document order reversed: descendants go before their ancestors
+        for element in reversed(root.xpath(" | ".join(f"//{tag}" for tag in BOILERPLATE_TAGS))):
+            element.drop_tree()
+        text = "".join(root.itertext())
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+        for element in soup(BOILERPLATE_TAGS):
+            element.decompose()
+        text = soup.get_text()
+
+    # Remove extra whitespace
+    return re.sub(r"\s+", " ", text).strip()
+
+
 class WebContentFetcher:
     def __init__(self):
         self.rate_limiter = RateLimiter(requests_per_minute=20)
@@ -167,27 +200,12 @@ class WebContentFetcher:
                 )
                 response.raise_for_status()
 
-            # Parse the HTML
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Remove script and style elements
-            for element in soup(["script", "style", "nav", "header", "footer"]):
-                element.decompose()
-
-            # Get the text content
-            text = soup.get_text()
-
-            # Clean up the text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = " ".join(chunk for chunk in chunks if chunk)
-
-            # Remove extra whitespace
-            text = re.sub(r"\s+", " ", text).strip()
+            # Parse off the event loop so other tool calls keep running
+            text = await asyncio.to_thread(extract_page_text, response.text)
 
             # Truncate if too long
-            if len(text) > 8000:
-                text = text[:8000] + "... [content truncated]"
+            if len(text) > MAX_CONTENT_CHARS:
+                text = text[:MAX_CONTENT_CHARS] + "... [content truncated]"
 
             await ctx.info(
                 f"Successfully fetched and parsed content ({len(text)} characters)"
@@ -1,6 +1,6 @@
 # modules/action.py
 
-from typing import Dict, Any, Union
+from typing import Dict, Any, List, Union
 from pydantic import BaseModel
 import ast
 
@@ -13,6 +13,8 @@ except ImportError:
         now = datetime.datetime.now().strftime("%H:%M:%S")
         print(f"[{now}] [{stage}] {msg}")
 
+MAX_PARALLEL_CALLS = 4  # Independent FUNCTION_CALLs one plan may batch into a step
+
 
 class ToolCallResult(BaseModel):
     tool_name: str
@@ -60,3 +62,27 @@ def parse_function_call(response: str) -> tuple[str, Dict[str, Any]]:
     except Exception as e:
         log("parser", f"❌ Parse failed: {e}")
         raise
+
+
+def parse_function_calls(response: str) -> List[tuple[str, Dict[str, Any]]]:
+    """
+    Parses a plan of one or more independent calls, one per line:
+    "FUNCTION_CALL: search_documents|query=Cricket"
+    "FUNCTION_CALL: search_documents|query=Sachin Tendulkar"
+    Into a list of (tool name, arguments), in plan order, without duplicates.
+    """
+    calls = []
+    for line in response.splitlines():
+        line = line.strip()
+        if not line.startswith("FUNCTION_CALL:"):
+            continue
+        call = parse_function_call(line)
+        if call not in calls:
+            calls.append(call)
+
+    if not calls:
+        log("parser", "❌ Parse failed: no FUNCTION_CALL in plan")
+        raise ValueError("Invalid function call format.")
+    if len(calls) > MAX_PARALLEL_CALLS:
+        log("parser", f"⚠️ Plan has {len(calls)} calls, keeping the first {MAX_PARALLEL_CALLS}")
+    return calls[:MAX_PARALLEL_CALLS]
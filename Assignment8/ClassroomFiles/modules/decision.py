@@ -1,11 +1,13 @@
-from typing import List, Optional
+from typing import Any, List, Optional
 from modules.perception import PerceptionResult
 from modules.memory import MemoryItem
 from modules.model_manager import ModelManager
+from modules.action import MAX_PARALLEL_CALLS
 from dotenv import load_dotenv
 from google import genai
 import os
 import asyncio
+from contextlib import aclosing
 
 # Optional: import logger if available
 try:
@@ -19,14 +21,34 @@ except ImportError:
 model = ModelManager()
 
 
+def plan_decided(raw: str) -> bool:
+    """Whether the complete lines streamed so far already fix the plan (a FINAL_ANSWER, or the
+    batch of FUNCTION_CALLs once it is full or another line follows it), so generation can stop"""
+    calls = 0
+    for line in raw.split("\n")[:-1]:  # The last piece may still be growing
+        line = line.strip()
+        if line.startswith("FINAL_ANSWER:"):
+            return True
+        if line.startswith("FUNCTION_CALL:"):
+            calls += 1
+            if calls == MAX_PARALLEL_CALLS:
+                return True
+        elif line and calls:
+            return True
+    return False
+
+
 async def generate_plan(
     perception: PerceptionResult,
     memory_items: List[MemoryItem],
     tool_descriptions: Optional[str] = None,
     step_num: int = 1,
-    max_steps: int = 3
+    max_steps: int = 3,
+    llm: Optional[ModelManager] = None,
+    budget: Optional[Any] = None
 ) -> str:
-    """Generates the next step plan for the agent: either tool usage or final answer."""
+    """Generates the next step plan for the agent: either tool usage or final answer.
+    Uses `llm` instead of the profile's model when given, and charges the call to the task `budget`."""
 
     memory_texts = "\n".join(f"- {m.text}" for m in memory_items) or "None"
     tool_context = f"\nYou have access to the following tools:\n{tool_descriptions}" if tool_descriptions else ""
@@ -40,6 +62,8 @@ Respond in **exactly one line** using one of the following formats:
 - FUNCTION_CALL: tool_name|param1=value1|param2=value2
 - FINAL_ANSWER: [your final result] *(Not description, but actual final answer)
 
+Only when you need several calls that do NOT depend on each other's results (e.g. searching two different entities), you may instead respond with up to {MAX_PARALLEL_CALLS} FUNCTION_CALL lines, one per line. They run at the same time and you get all their results in the next step.
+
 🧠 Context:
 - Step: {step_num} of {max_steps}
 - Memory: 
@@ -58,6 +82,13 @@ Respond in **exactly one line** using one of the following formats:
 - FUNCTION_CALL: int_list_to_exponential_sum|input.int_list=[73,78,68,73,65]
 - FINAL_ANSWER: [42] → Always mention final answer to the query, not that some other description.
 
+✅ Example of independent calls in one step:
+- User asks: "Compare the populations of France and Japan"
+  - FUNCTION_CALL: search_documents|query="population of France"
+    FUNCTION_CALL: search_documents|query="population of Japan"
+  - [receives both results]
+  - FINAL_ANSWER: [France has about 68 million people and Japan about 124 million, so Japan's population is larger.]
+
 ✅ Examples:
 - User asks: "What’s the relationship between Cricket and Sachin Tendulkar"
   - FUNCTION_CALL: search_documents|query="relationship between Cricket and Sachin Tendulkar"
@@ -74,6 +105,7 @@ Respond in **exactly one line** using one of the following formats:
 - 🔁 Analyze that whether you have already got a good factual result from a tool, do NOT search again — summarize and respond with FINAL_ANSWER.
 - ❌ NEVER repeat tool calls with the same parameters unless the result was empty. When searching rely on first reponse from tools, as that is the best response probably.
 - ❌ NEVER output explanation text — only structured FUNCTION_CALL or FINAL_ANSWER.
+- 🔀 NEVER batch a call that needs another call's result; put it in the next step. NEVER mix FUNCTION_CALL and FINAL_ANSWER lines.
 - ✅ Use nested keys like `input.string` or `input.int_list`, and square brackets for lists.
 - 💡 If no tool fits or you're unsure, end with: FINAL_ANSWER: [unknown]
 - ⏳ You have 3 attempts. Final attempt must end with FINAL_ANSWER.
@@ -81,13 +113,25 @@ Respond in **exactly one line** using one of the following formats:
 
 
 
+    raw = ""
     try:
-        raw = (await model.generate_text(prompt)).strip()
+        # Streamed, so the model stops as soon as the plan is decided instead of finishing its output
+        async with aclosing((llm or model).stream_text(prompt)) as stream:
+            async for chunk in stream:
+                raw += chunk
+                if plan_decided(raw):
+                    break
+        raw = raw.strip()
         log("plan", f"LLM output: {raw}")
 
-        for line in raw.splitlines():
-            if line.strip().startswith("FUNCTION_CALL:") or line.strip().startswith("FINAL_ANSWER:"):
-                return line.strip()
+        # A FINAL_ANSWER first wins; otherwise every FUNCTION_CALL line is one call of the batch
+        lines = [line.strip() for line in raw.splitlines()]
+        for line in lines:
+            if line.startswith("FINAL_ANSWER:"):
+                return line
+            if line.startswith("FUNCTION_CALL:"):
+                calls = [call for call in lines if call.startswith("FUNCTION_CALL:")]
+                return "\n".join(calls[:MAX_PARALLEL_CALLS])
 
         return "FINAL_ANSWER: [unknown]"
 
@@ -95,3 +139,7 @@ Respond in **exactly one line** using one of the following formats:
         log("plan", f"⚠️ Planning failed: {e}")
         return "FINAL_ANSWER: [unknown]"
 
+    finally:
+        if budget is not None:
+            budget.charge(prompt, raw)
+
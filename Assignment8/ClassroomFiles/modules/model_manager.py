@@ -1,8 +1,11 @@
 import os
 import json
 import yaml
-import requests
+import asyncio
+import weakref
+import httpx
 from pathlib import Path
+from typing import AsyncIterator, Optional
 from google import genai
 from dotenv import load_dotenv
 
@@ -12,31 +15,88 @@ ROOT = Path(__file__).parent.parent
 MODELS_JSON = ROOT / "config" / "models.json"
 PROFILE_YAML = ROOT / "config" / "profiles.yaml"
 
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # Seconds one generation may take; a model's "timeout" in models.json overrides it
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8"))  # Generations in flight per process, across all managers
+
 class ModelManager:
-    def __init__(self):
+    # Shared by every manager in the process: event loop → (limiter, pooled Ollama client)
+    _shared_by_loop = weakref.WeakKeyDictionary()
+
+    def __init__(self, model_key: str = None):
         self.config = json.loads(MODELS_JSON.read_text())
         self.profile = yaml.safe_load(PROFILE_YAML.read_text())
 
-        self.text_model_key = self.profile["llm"]["text_generation"]
+        self.text_model_key = model_key or self.profile["llm"]["text_generation"]
         self.model_info = self.config["models"][self.text_model_key]
         self.model_type = self.model_info["type"]
+        self.timeout = float(self.model_info.get("timeout", LLM_TIMEOUT))
 
         # ✅ Gemini initialization (your style)
         if self.model_type == "gemini":
             api_key = os.getenv("GEMINI_API_KEY")
             self.client = genai.Client(api_key=api_key)
 
-    async def generate_text(self, prompt: str) -> str:
-        if self.model_type == "gemini":
-            return self._gemini_generate(prompt)
+    @classmethod
+    def _shared(cls) -> tuple[asyncio.Semaphore, httpx.AsyncClient]:
+        """The concurrency limiter and the pooled Ollama HTTP client of the running loop, made on first use"""
+        loop = asyncio.get_running_loop()
+        shared = cls._shared_by_loop.get(loop)
+        if shared is None:
+            shared = cls._shared_by_loop[loop] = (
+                asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS),
+                httpx.AsyncClient(
+                    timeout=None,  # Calls are bounded by their own deadline
+                    limits=httpx.Limits(max_connections=MAX_CONCURRENT_LLM_CALLS,
+                                        max_keepalive_connections=MAX_CONCURRENT_LLM_CALLS)
+                )
+            )
+        return shared
+
+    @classmethod
+    async def aclose(cls):
+        """Close the running loop's pooled HTTP connections (at shutdown; each loop closes its own)"""
+        shared = cls._shared_by_loop.pop(asyncio.get_running_loop(), None)
+        if shared is not None:
+            await shared[1].aclose()
+
+    async def generate_text(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """Full completion for the prompt; raises TimeoutError after `timeout` (or the model's) seconds of generation"""
+        if self.model_type not in ("gemini", "ollama"):
+            raise NotImplementedError(f"Unsupported model type: {self.model_type}")
+
+        limiter, http = self._shared()
+        async with limiter:
+            async with asyncio.timeout(timeout or self.timeout):
+                if self.model_type == "gemini":
+                    return await self._gemini_generate(prompt)
+                return await self._ollama_generate(prompt, http)
+
+    async def stream_text(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Yields the completion as the model produces it; the whole stream shares one deadline"""
+        if self.model_type not in ("gemini", "ollama"):
+            raise NotImplementedError(f"Unsupported model type: {self.model_type}")
 
-        elif self.model_type == "ollama":
-            return self._ollama_generate(prompt)
+        limiter, http = self._shared()
+        async with limiter:
+            if self.model_type == "gemini":
+                chunks = self._gemini_stream(prompt)
+            else:
+                chunks = self._ollama_stream(prompt, http)
 
-        raise NotImplementedError(f"Unsupported model type: {self.model_type}")
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + (timeout or self.timeout)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), max(deadline - loop.time(), 0))
+                    except StopAsyncIteration:
+                        return
+                    yield chunk
+            finally:
+                await chunks.aclose()
 
-    def _gemini_generate(self, prompt: str) -> str:
-        response = self.client.models.generate_content(
+    async def _gemini_generate(self, prompt: str) -> str:
+        response = await self.client.aio.models.generate_content(
             model=self.model_info["model"],
             contents=prompt
         )
@@ -50,10 +110,36 @@ class ModelManager:
             except Exception:
                 return str(response)
 
-    def _ollama_generate(self, prompt: str) -> str:
-        response = requests.post(
+    async def _gemini_stream(self, prompt: str) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model_info["model"],
+            contents=prompt
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    async def _ollama_generate(self, prompt: str, http: httpx.AsyncClient) -> str:
+        response = await http.post(
             self.model_info["url"]["generate"],
             json={"model": self.model_info["model"], "prompt": prompt, "stream": False}
         )
         response.raise_for_status()
         return response.json()["response"].strip()
+
+    async def _ollama_stream(self, prompt: str, http: httpx.AsyncClient) -> AsyncIterator[str]:
+        async with http.stream(
+            "POST",
+            self.model_info["url"]["generate"],
+            json={"model": self.model_info["model"], "prompt": prompt, "stream": True}
+        ) as response:
+            response.raise_for_status()
+            # ✅ One JSON object per line, the last one marked done
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
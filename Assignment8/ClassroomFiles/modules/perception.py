@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Any, List, Optional
 from pydantic import BaseModel
 import os
 import re
@@ -18,12 +18,13 @@ class PerceptionResult(BaseModel):
     tool_hint: Optional[str] = None
 
 
-async def extract_perception(user_input: str) -> PerceptionResult:
+async def extract_perception(user_input: str, budget: Optional[Any] = None) -> PerceptionResult:
     """
     Uses LLMs to extract structured info:
     - intent: user’s high-level goal
     - entities: keywords or values
     - tool_hint: likely MCP tool name (optional)
+    The LLM call is charged to the task `budget`, when given, even if it fails.
     """
 
     prompt = f"""
@@ -42,6 +43,7 @@ Return the response as a Python dictionary with keys:
 Output only the dictionary on a single line. Do NOT wrap it in ```json or other formatting. Ensure `entities` is a list of strings, not a dictionary.
 """
 
+    response = ""
     try:
         response = await model.generate_text(prompt)
 
@@ -78,3 +80,7 @@ Output only the dictionary on a single line. Do NOT wrap it in ```json or other
     except Exception as e:
         print(f"[perception] ⚠️ LLM perception failed: {e}")
         return PerceptionResult(user_input=user_input)
+
+    finally:
+        if budget is not None:
+            budget.charge(prompt, response)